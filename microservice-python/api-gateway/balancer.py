@@ -0,0 +1,137 @@
+import os
+import time
+import random
+import logging
+from typing import Dict, Any, List, Optional, Collection
+
+from health import health_prober
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("least_outstanding", "p2c")
+
+
+def parse_instances(value: str) -> List[str]:
+    """Split a comma-separated list of service URLs"""
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+class NoHealthyInstance(Exception):
+    """Every instance of a service is ejected or failing health probes"""
+
+
+class Instance:
+    """One upstream instance with its load and passive-health state"""
+
+    def __init__(self, service_name: str, url: str):
+        self.service_name = service_name
+        self.url = url
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ewma_latency: Optional[float] = None
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def is_ejected(self, now: float) -> bool:
+        return now < self.ejected_until
+
+    def score(self) -> float:
+        # Outstanding requests weighted by observed latency; unknown latency counts as fast
+        latency = self.ewma_latency if self.ewma_latency is not None else 0.001
+        return (self.in_flight + 1) * latency
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 3) if self.ewma_latency is not None else None,
+            "ejected": self.is_ejected(now),
+            "ejected_for_s": round(max(0.0, self.ejected_until - now), 1),
+            "ejections": self.ejections,
+            "probe_down": health_prober.is_instance_down(self.service_name, self.url)
+        }
+
+
+class LoadBalancer:
+    """Spread requests across service instances and eject failing ones"""
+
+    def __init__(self):
+        strategy = os.getenv("GATEWAY_LB_STRATEGY", "least_outstanding").strip().lower()
+        if strategy not in STRATEGIES:
+            logger.warning(f"⚠️ Unknown GATEWAY_LB_STRATEGY '{strategy}' - using least_outstanding")
+            strategy = "least_outstanding"
+        self.strategy = strategy
+        self.ewma_alpha = float(os.getenv("GATEWAY_LB_EWMA_ALPHA", 0.3))
+        self.eject_failures = int(os.getenv("GATEWAY_LB_EJECT_FAILURES", 3))
+        self.eject_seconds = float(os.getenv("GATEWAY_LB_EJECT_SECONDS", 10.0))
+        self.max_eject_seconds = float(os.getenv("GATEWAY_LB_MAX_EJECT_SECONDS", 300.0))
+        self.services: Dict[str, List[Instance]] = {}
+
+    def configure(self, services: Dict[str, List[str]]):
+        for service_name, urls in services.items():
+            self.services[service_name] = [Instance(service_name, url) for url in urls]
+
+    def candidates(self, service_name: str, exclude: Collection[Instance] = ()) -> List[Instance]:
+        """Instances that may take traffic right now"""
+        now = time.monotonic()
+        instances = self.services.get(service_name, [])
+        return [
+            instance for instance in instances
+            if instance not in exclude
+            and not instance.is_ejected(now)
+            and not health_prober.is_instance_down(service_name, instance.url)
+        ]
+
+    def pick(self, service_name: str, exclude: Collection[Instance] = ()) -> Instance:
+        candidates = self.candidates(service_name, exclude)
+        if not candidates:
+            raise NoHealthyInstance(service_name)
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == "p2c":
+            first, second = random.sample(candidates, 2)
+            return first if first.score() <= second.score() else second
+        return min(candidates, key=lambda instance: (instance.in_flight, instance.score()))
+
+    def record_success(self, instance: Instance, latency: float):
+        if instance.ewma_latency is None:
+            instance.ewma_latency = latency
+        else:
+            instance.ewma_latency += self.ewma_alpha * (latency - instance.ewma_latency)
+        if instance.ejections:
+            logger.info(f"✅ Re-admitted {instance.service_name} instance {instance.url}")
+        instance.consecutive_failures = 0
+        instance.ejections = 0
+
+    def record_failure(self, instance: Instance):
+        instance.failures += 1
+        if instance.is_ejected(time.monotonic()):
+            # Late failures from requests sent before the ejection
+            return
+        instance.consecutive_failures += 1
+        if instance.consecutive_failures >= self.eject_failures:
+            # Back off exponentially for instances that keep failing after re-admission
+            duration = min(self.eject_seconds * (2 ** instance.ejections), self.max_eject_seconds)
+            instance.ejected_until = time.monotonic() + duration
+            instance.ejections += 1
+            instance.consecutive_failures = 0
+            logger.warning(f"🚫 Ejected {instance.service_name} instance {instance.url} for {duration:.0f}s")
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "strategy": self.strategy,
+            "services": {
+                service_name: [instance.to_dict(now) for instance in instances]
+                for service_name, instances in self.services.items()
+            }
+        }
+
+
+# Singleton instance
+load_balancer = LoadBalancer()
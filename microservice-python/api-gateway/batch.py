@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import base64
+import asyncio
+import logging
+from urllib.parse import urlencode, parse_qsl
+from typing import Dict, Any, List, Optional, Awaitable, Callable
+
+from fastapi import Request, Response
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+BATCH_PATH = "/api/batch"
+BATCH_METHODS = {"GET", "POST", "PUT", "DELETE", "PATCH"}
+
+# Parent headers that describe the batch envelope itself, not a sub-request
+ENVELOPE_HEADERS = {"content-length", "content-type", "transfer-encoding", "accept-encoding", "if-none-match", "expect"}
+# Response headers that only make sense on the wire
+DROPPED_RESPONSE_HEADERS = {"content-length", "transfer-encoding", "content-encoding", "connection", "keep-alive"}
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str
+    query: Optional[Dict[str, Any]] = None
+    headers: Optional[Dict[str, str]] = None
+    body: Optional[Any] = None
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem] = Field(default_factory=list)
+
+
+class BatchError(Exception):
+    """A sub-request that cannot be routed; reported as that item's status"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def _sub_request(parent: Request, item: BatchItem, path: str, query: List) -> Request:
+    """Build a request for one batch item that inherits the caller's identity headers"""
+    headers = [
+        (name, value) for name, value in parent.headers.raw
+        if name.decode("latin-1").lower() not in ENVELOPE_HEADERS
+    ]
+    # Ask upstreams for identity encoding so bodies can be embedded in the envelope
+    headers.append((b"accept-encoding", b"identity"))
+
+    body = b""
+    if item.body is not None:
+        body = json.dumps(item.body).encode("utf-8")
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    for name, value in (item.headers or {}).items():
+        lowered = name.lower()
+        if lowered in ("content-length", "host"):
+            continue
+        headers = [(key, existing) for key, existing in headers if key.decode("latin-1").lower() != lowered]
+        headers.append((lowered.encode("latin-1"), value.encode("latin-1")))
+
+    scope = {
+        "type": "http",
+        "asgi": parent.scope.get("asgi", {"version": "3.0"}),
+        "http_version": parent.scope.get("http_version", "1.1"),
+        "method": item.method.upper(),
+        "scheme": parent.scope.get("scheme", "http"),
+        "server": parent.scope.get("server"),
+        "client": parent.scope.get("client"),
+        "root_path": parent.scope.get("root_path", ""),
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": urlencode(query, doseq=True).encode("latin-1"),
+        "headers": headers,
+        "app": parent.scope.get("app"),
+        "state": {},
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    return Request(scope, receive)
+
+
+async def _read_body(response: Response) -> bytes:
+    """Collect a (possibly streaming) response and release its upstream connection"""
+    iterator = getattr(response, "body_iterator", None)
+    if iterator is None:
+        return response.body
+    chunks = []
+    try:
+        async for chunk in iterator:
+            chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode(response.charset))
+    finally:
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+        if response.background is not None:
+            await response.background()
+    return b"".join(chunks)
+
+
+def _decode_body(content_type: str, content: bytes) -> Dict[str, Any]:
+    if not content:
+        return {"body": None}
+    if "json" in content_type:
+        try:
+            return {"body": json.loads(content)}
+        except ValueError:
+            pass
+    if content_type.startswith("text/") or "json" in content_type or not content_type:
+        return {"body": content.decode("utf-8", errors="replace")}
+    return {"body": base64.b64encode(content).decode("ascii"), "body_encoding": "base64"}
+
+
+class BatchExecutor:
+    """Fan batch sub-requests out through the normal gateway forwarding path"""
+
+    def __init__(self):
+        self.max_items = int(os.getenv("GATEWAY_BATCH_MAX_ITEMS", 20))
+        self.concurrency = int(os.getenv("GATEWAY_BATCH_CONCURRENCY", 5))
+        self.timeout = float(os.getenv("GATEWAY_BATCH_TIMEOUT", 10.0))
+        self.stats = {"batches": 0, "items": 0, "timeouts": 0}
+
+    @staticmethod
+    def resolve(item: BatchItem, routes: Dict[str, str]):
+        """Return (service, path, query) for an item or raise BatchError"""
+        method = item.method.upper()
+        if method not in BATCH_METHODS:
+            raise BatchError(405, f"Method {item.method} not allowed in a batch")
+
+        path, _, inline_query = item.path.partition("?")
+        if not path.startswith("/") or "//" in path or any(segment in (".", "..") for segment in path.split("/")):
+            raise BatchError(400, "Invalid path")
+        if path.rstrip("/") == BATCH_PATH:
+            raise BatchError(400, "Nested batches are not allowed")
+
+        for prefix, service_name in routes.items():
+            if path.startswith(prefix):
+                query = parse_qsl(inline_query, keep_blank_values=True)
+                for name, value in (item.query or {}).items():
+                    values = value if isinstance(value, list) else [value]
+                    query.extend((name, str(entry)) for entry in values)
+                return service_name, path, query
+        raise BatchError(404, "Endpoint not found")
+
+    async def run(
+        self,
+        batch: BatchRequest,
+        request: Request,
+        routes: Dict[str, str],
+        forward: Callable[[str, str, str, Request], Awaitable[Response]]
+    ) -> List[Dict[str, Any]]:
+        """Execute every item concurrently (bounded) and return results in request order"""
+        self.stats["batches"] += 1
+        self.stats["items"] += len(batch.requests)
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def execute(index: int, item: BatchItem) -> Dict[str, Any]:
+            result: Dict[str, Any] = {"id": item.id if item.id is not None else str(index)}
+            try:
+                service_name, path, query = self.resolve(item, routes)
+            except BatchError as error:
+                result.update(status=error.status_code, headers={}, body={"success": False, "message": error.message})
+                return result
+
+            async with semaphore:
+                started = time.perf_counter()
+                sub_request = _sub_request(request, item, path, query)
+                response = await forward(service_name, path, item.method.upper(), sub_request)
+                content = await _read_body(response)
+
+            headers = {
+                name.decode("latin-1"): value.decode("latin-1")
+                for name, value in response.raw_headers
+                if name.decode("latin-1").lower() not in DROPPED_RESPONSE_HEADERS
+            }
+            result.update(
+                status=response.status_code,
+                headers=headers,
+                duration_ms=round((time.perf_counter() - started) * 1000, 3),
+                **_decode_body(headers.get("content-type", ""), content)
+            )
+            return result
+
+        tasks = [asyncio.create_task(execute(index, item)) for index, item in enumerate(batch.requests)]
+        if tasks:
+            await asyncio.wait(tasks, timeout=self.timeout)
+
+        results = []
+        for index, task in enumerate(tasks):
+            item_id = batch.requests[index].id if batch.requests[index].id is not None else str(index)
+            if not task.done():
+                task.cancel()
+                self.stats["timeouts"] += 1
+                results.append({"id": item_id, "status": 504, "headers": {},
+                                "body": {"success": False, "message": "Batch timeout"}})
+            elif task.exception() is not None:
+                logger.error(f"Batch item {item_id} failed: {task.exception()}")
+                results.append({"id": item_id, "status": 500, "headers": {},
+                                "body": {"success": False, "message": "Gateway error"}})
+            else:
+                results.append(task.result())
+
+        # Let cancelled items release their upstream connections
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return results
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_items": self.max_items,
+            "concurrency": self.concurrency,
+            "timeout": self.timeout,
+            **self.stats
+        }
+
+
+# Singleton instance
+batch_executor = BatchExecutor()
@@ -0,0 +1,179 @@
+import os
+import time
+import logging
+from collections import deque
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamRejected(Exception):
+    """A call was refused before reaching the upstream (breaker open or bulkhead full)"""
+
+    def __init__(self, service_name: str, reason: str, retry_after: int):
+        super().__init__(f"{service_name}: {reason}")
+        self.service_name = service_name
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class BreakerSettings:
+    """Circuit breaker and bulkhead thresholds (read from environment)"""
+
+    def __init__(self):
+        self.window_seconds = float(os.getenv("GATEWAY_BREAKER_WINDOW", 30.0))
+        self.min_requests = int(os.getenv("GATEWAY_BREAKER_MIN_REQUESTS", 20))
+        self.error_rate = float(os.getenv("GATEWAY_BREAKER_ERROR_RATE", 0.5))
+        self.slow_call_seconds = float(os.getenv("GATEWAY_BREAKER_SLOW_CALL", 5.0))
+        self.slow_call_rate = float(os.getenv("GATEWAY_BREAKER_SLOW_CALL_RATE", 0.8))
+        self.open_seconds = float(os.getenv("GATEWAY_BREAKER_OPEN_SECONDS", 15.0))
+        self.half_open_probes = int(os.getenv("GATEWAY_BREAKER_HALF_OPEN_PROBES", 3))
+        self.max_concurrent = int(os.getenv("GATEWAY_BULKHEAD_MAX_CONCURRENT", 100))
+
+
+class CircuitBreaker:
+    """Per-upstream breaker (closed/open/half-open) with a bulkhead on in-flight calls"""
+
+    def __init__(self, service_name: str, settings: BreakerSettings):
+        self.service_name = service_name
+        self.settings = settings
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # (finished_at, failed, slow) for calls inside the rolling window
+        self.outcomes: deque = deque()
+        # Running counts over self.outcomes, so recording a call never rescans the window
+        self.failures = 0
+        self.slow_calls = 0
+        self.in_flight = 0
+        self.half_open_in_flight = 0
+        self.half_open_successes = 0
+        self.rejected = {"open": 0, "bulkhead": 0}
+        self.transitions = 0
+
+    def acquire(self):
+        """Admit one call or raise UpstreamRejected"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < self.settings.open_seconds:
+                self.rejected["open"] += 1
+                raise UpstreamRejected(self.service_name, "circuit_open", self._retry_after(now))
+            self._transition(HALF_OPEN)
+
+        if self.state == HALF_OPEN and self.half_open_in_flight >= self.settings.half_open_probes:
+            self.rejected["open"] += 1
+            raise UpstreamRejected(self.service_name, "circuit_half_open", 1)
+
+        if self.in_flight >= self.settings.max_concurrent:
+            self.rejected["bulkhead"] += 1
+            raise UpstreamRejected(self.service_name, "bulkhead_full", 1)
+
+        self.in_flight += 1
+        if self.state == HALF_OPEN:
+            self.half_open_in_flight += 1
+
+    def release(self):
+        """Free the bulkhead slot of an admitted call once its response is closed"""
+        self.in_flight -= 1
+
+    def abandon(self):
+        """Forget an admitted call that ended without an outcome (e.g. cancelled)"""
+        if self.state == HALF_OPEN:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+
+    def record(self, failed: bool, duration: float):
+        """Record the outcome of an admitted call (known once response headers arrive)"""
+        now = time.monotonic()
+        slow = duration >= self.settings.slow_call_seconds
+
+        if self.state == HALF_OPEN:
+            self.half_open_in_flight = max(0, self.half_open_in_flight - 1)
+            if failed or slow:
+                self._open(now)
+                return
+            self.half_open_successes += 1
+            if self.half_open_successes >= self.settings.half_open_probes:
+                self._transition(CLOSED)
+            return
+
+        if self.state != CLOSED:
+            return
+
+        self.outcomes.append((now, failed, slow))
+        self.failures += failed
+        self.slow_calls += slow
+        self._trim(now)
+        total = len(self.outcomes)
+        if total < self.settings.min_requests:
+            return
+        if self.failures / total >= self.settings.error_rate or self.slow_calls / total >= self.settings.slow_call_rate:
+            self._open(now)
+
+    def _trim(self, now: float):
+        horizon = now - self.settings.window_seconds
+        while self.outcomes and self.outcomes[0][0] < horizon:
+            _, failed, slow = self.outcomes.popleft()
+            self.failures -= failed
+            self.slow_calls -= slow
+
+    def _open(self, now: float):
+        self.opened_at = now
+        self._transition(OPEN)
+        logger.warning(f"🔴 Circuit opened for {self.service_name} service ({self.settings.open_seconds:.0f}s)")
+
+    def _transition(self, state: str):
+        self.state = state
+        self.transitions += 1
+        self.outcomes.clear()
+        self.failures = 0
+        self.slow_calls = 0
+        self.half_open_in_flight = 0
+        self.half_open_successes = 0
+        if state == CLOSED:
+            logger.info(f"🟢 Circuit closed for {self.service_name} service")
+
+    def _retry_after(self, now: float) -> int:
+        return max(1, int(self.settings.open_seconds - (now - self.opened_at) + 0.999))
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._trim(now)
+        total = len(self.outcomes)
+        return {
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "max_concurrent": self.settings.max_concurrent,
+            "window_calls": total,
+            "window_error_rate": round(self.failures / total, 4) if total else 0.0,
+            "retry_after": self._retry_after(now) if self.state == OPEN else 0,
+            "rejected": dict(self.rejected),
+            "transitions": self.transitions
+        }
+
+
+class BreakerRegistry:
+    """Circuit breakers keyed by upstream service"""
+
+    def __init__(self):
+        self.settings = BreakerSettings()
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+    def configure(self, service_names: List[str]):
+        for service_name in service_names:
+            self.get(service_name)
+
+    def get(self, service_name: str) -> CircuitBreaker:
+        breaker = self.breakers.get(service_name)
+        if breaker is None:
+            breaker = self.breakers[service_name] = CircuitBreaker(service_name, self.settings)
+        return breaker
+
+    def status(self) -> Dict[str, Any]:
+        return {service_name: breaker.to_dict() for service_name, breaker in self.breakers.items()}
+
+
+# Singleton instance
+circuit_breakers = BreakerRegistry()
@@ -0,0 +1,242 @@
+import os
+import re
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from config import env_bool
+
+logger = logging.getLogger(__name__)
+
+
+class CachePolicy:
+    """Caching rule for one public GET route"""
+
+    def __init__(self, name: str, pattern: str, ttl: float, vary: Optional[List[str]] = None):
+        self.name = name
+        self.pattern = re.compile(pattern)
+        self.ttl = ttl
+        self.vary = [header.lower() for header in (vary or ["accept-encoding"])]
+
+    def matches(self, path: str) -> bool:
+        return self.pattern.match(path) is not None
+
+
+# Public, rate-limited voucher-service GETs. Order matters: the first match wins,
+# so the catch-all voucher-by-id rule comes last.
+CACHE_POLICIES = [
+    CachePolicy("all_vouchers", r"^/api/vouchers/getAllVoucher$", ttl=30),
+    CachePolicy("valid_vouchers", r"^/api/vouchers/getValidVouchers$", ttl=15),
+    CachePolicy("categories", r"^/api/vouchers/categories/$", ttl=300),
+    CachePolicy("category_vouchers", r"^/api/vouchers/category/[^/]+$", ttl=30),
+    CachePolicy("voucher_by_id", r"^/api/vouchers/[^/]+$", ttl=30),
+]
+
+# Path prefixes whose cached entries are invalidated by a successful write
+INVALIDATION_PREFIXES = {
+    "voucher": "/api/vouchers/",
+}
+
+# Upstream headers that must not be replayed from the cache
+UNCACHED_HEADERS = {b"content-length", b"set-cookie", b"date", b"etag", b"cache-control", b"age"}
+
+
+class CacheEntry:
+    """A stored upstream response"""
+
+    __slots__ = ("path", "status_code", "headers", "body", "etag", "stored_at", "expires_at", "size")
+
+    def __init__(self, path: str, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes, etag: str, ttl: float):
+        self.path = path
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.stored_at = time.monotonic()
+        self.expires_at = self.stored_at + ttl
+        self.size = len(body) + sum(len(name) + len(value) for name, value in headers)
+
+    def is_fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+class ResponseCache:
+    """In-memory TTL response cache with LRU eviction under a byte budget"""
+
+    def __init__(self, policies: Optional[List[CachePolicy]] = None):
+        self.enabled = env_bool("GATEWAY_CACHE_ENABLED", True)
+        self.max_bytes = int(os.getenv("GATEWAY_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+        self.max_entry_bytes = int(os.getenv("GATEWAY_CACHE_MAX_ENTRY_BYTES", 1024 * 1024))
+        self.policies = policies if policies is not None else CACHE_POLICIES
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "not_modified": 0,
+            "evictions": 0,
+            "expired": 0,
+            "purged": 0,
+            "too_large": 0
+        }
+
+    def policy_for(self, method: str, path: str) -> Optional[CachePolicy]:
+        """Return the cache policy for a request, or None if it is not cacheable"""
+        if not self.enabled or method != "GET":
+            return None
+        for policy in self.policies:
+            if policy.matches(path):
+                return policy
+        return None
+
+    @staticmethod
+    def make_key(path: str, request: Request, policy: CachePolicy) -> str:
+        """Cache key: path + normalized query string + varying request headers"""
+        query = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+        varying = "|".join(request.headers.get(header, "") for header in policy.vary)
+        return f"{path}?{query}#{varying}"
+
+    @staticmethod
+    def make_etag(body: bytes) -> str:
+        """Strong validator derived from the response body"""
+        return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if not entry.is_fresh():
+            self._remove(key)
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def store(self, key: str, path: str, policy: CachePolicy, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes) -> CacheEntry:
+        """Build an entry for an upstream response and keep it if it is cacheable"""
+        existing = self.entries.get(key)
+        if existing is not None and existing.is_fresh() and existing.body == body:
+            # Coalesced requests all hand back the same reply; keep the first copy
+            return existing
+
+        kept_headers = [(name, value) for name, value in headers if name.lower() not in UNCACHED_HEADERS]
+        entry = CacheEntry(path, status_code, kept_headers, body, self.make_etag(body), policy.ttl)
+
+        if status_code != 200 or self._forbids_storing(headers):
+            return entry
+        if entry.size > self.max_entry_bytes or entry.size > self.max_bytes:
+            self.stats["too_large"] += 1
+            return entry
+
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = entry
+        self.total_bytes += entry.size
+        self.stats["stores"] += 1
+
+        while self.total_bytes > self.max_bytes and self.entries:
+            oldest_key = next(iter(self.entries))
+            self._remove(oldest_key)
+            self.stats["evictions"] += 1
+
+        return entry
+
+    @staticmethod
+    def _forbids_storing(headers: List[Tuple[bytes, bytes]]) -> bool:
+        for name, value in headers:
+            name = name.lower()
+            if name == b"set-cookie":
+                return True
+            if name == b"cache-control" and (b"no-store" in value or b"private" in value):
+                return True
+        return False
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def purge(self, prefix: Optional[str] = None) -> int:
+        """Drop all entries, or only those whose path starts with prefix"""
+        if prefix is None:
+            removed = len(self.entries)
+            self.entries.clear()
+            self.total_bytes = 0
+        else:
+            keys = [key for key, entry in self.entries.items() if entry.path.startswith(prefix)]
+            for key in keys:
+                self._remove(key)
+            removed = len(keys)
+        self.stats["purged"] += removed
+        if removed:
+            logger.info(f"🧹 Purged {removed} cached responses (prefix: {prefix or '*'})")
+        return removed
+
+    def invalidate_service(self, service_name: str) -> int:
+        """Purge cached reads of a service after a successful write to it"""
+        prefix = INVALIDATION_PREFIXES.get(service_name)
+        if prefix is None or not self.entries:
+            return 0
+        return self.purge(prefix)
+
+    def build_response(self, entry: CacheEntry, request: Request, policy: CachePolicy, hit: bool) -> Response:
+        """Serve an entry, answering 304 when the client already holds it"""
+        age = int(time.monotonic() - entry.stored_at) if hit else 0
+        validators = [
+            (b"etag", entry.etag.encode("latin-1")),
+            (b"cache-control", f"public, max-age={int(policy.ttl)}".encode("latin-1")),
+            (b"age", str(age).encode("latin-1")),
+            (b"x-cache", b"HIT" if hit else b"MISS"),
+        ]
+        if policy.vary:
+            validators.append((b"vary", ", ".join(policy.vary).encode("latin-1")))
+
+        if entry.status_code == 200 and self._etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.stats["not_modified"] += 1
+            response = Response(status_code=304)
+            response.raw_headers = validators
+            return response
+
+        response = Response(content=entry.body, status_code=entry.status_code)
+        response.raw_headers = [
+            (name, value) for name, value in entry.headers if name.lower() != b"vary"
+        ] + validators + [(b"content-length", str(len(entry.body)).encode("latin-1"))]
+        return response
+
+    @staticmethod
+    def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        for candidate in if_none_match.split(","):
+            candidate = candidate.strip()
+            if candidate.startswith("W/"):
+                candidate = candidate[2:]
+            if candidate == etag:
+                return True
+        return False
+
+    def status(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            "policies": {policy.name: policy.ttl for policy in self.policies},
+            **self.stats
+        }
+
+
+# Singleton instance
+response_cache = ResponseCache()
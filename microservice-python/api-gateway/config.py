@@ -0,0 +1,9 @@
+import os
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    """Read a boolean flag from the environment"""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
@@ -0,0 +1,147 @@
+import os
+import re
+import logging
+from typing import Dict, Any, Optional
+
+import jwt
+from fastapi import Request
+
+from config import env_bool
+from shared.rbac import RBACManager
+from shared.identity import internal_identity
+from shared.token_blacklist import token_blacklist
+
+logger = logging.getLogger(__name__)
+
+# Routes reachable without a token. Everything else is rejected at the edge
+# when edge authentication is enabled.
+PUBLIC_ROUTES = [
+    (None, re.compile(r"^/api/auth/(register|login|refresh|verify|logout|status)$")),
+    (None, re.compile(r"^/api/auth/oauth/[^/]+$")),
+    ({"GET"}, re.compile(r"^/api/vouchers/(getAllVoucher|getValidVouchers|search/|categories/|category/[^/]+|[^/]+)$")),
+]
+
+LOGOUT_PATH = "/api/auth/logout"
+
+
+class EdgeAuthError(Exception):
+    """Request rejected at the gateway before reaching any service"""
+
+    def __init__(self, detail: Dict[str, Any]):
+        super().__init__(detail.get("message"))
+        self.detail = detail
+
+
+class EdgeAuthenticator:
+    """Verify the bearer token once at the gateway and forward a signed identity"""
+
+    def __init__(self):
+        self.enabled = env_bool("GATEWAY_EDGE_AUTH", False)
+        self.jwt_secret = os.getenv("JWT_ACCESS_KEY", "your-secret-key")
+        self.jwt_algorithm = "HS256"
+        # Logouts seen at the gateway, plus (TOKEN_BLACKLIST_BACKEND=redis) those published by the services
+        self.revoked = token_blacklist
+        self.stats = {"verified": 0, "rejected": 0, "revoked": 0}
+
+        if self.enabled and not internal_identity.configured:
+            logger.warning("⚠️ GATEWAY_EDGE_AUTH is enabled but INTERNAL_IDENTITY_KEY is not set - edge auth disabled")
+            self.enabled = False
+
+    @staticmethod
+    def is_public(method: str, path: str) -> bool:
+        for methods, pattern in PUBLIC_ROUTES:
+            if (methods is None or method in methods) and pattern.match(path):
+                return True
+        return False
+
+    @staticmethod
+    def bearer_token(request: Request) -> Optional[str]:
+        auth_header = request.headers.get("authorization")
+        if auth_header and auth_header.startswith("Bearer "):
+            return auth_header[7:].strip() or None
+        return None
+
+    async def authenticate(self, method: str, path: str, request: Request) -> Optional[str]:
+        """Return the internal identity header for this request, or raise EdgeAuthError"""
+        if not self.enabled:
+            return None
+
+        public = self.is_public(method, path)
+        token = self.bearer_token(request)
+        if token is None:
+            if public:
+                return None
+            self.stats["rejected"] += 1
+            raise EdgeAuthError({
+                "success": False,
+                "message": "Token required"
+            })
+
+        try:
+            if await self.is_revoked(token):
+                raise EdgeAuthError({
+                    "success": False,
+                    "message": "Token đã bị thu hồi! Vui lòng đăng nhập lại.",
+                    "error_code": "TOKEN_REVOKED",
+                    "action_required": "LOGIN_AGAIN"
+                })
+            try:
+                payload = jwt.decode(token, self.jwt_secret, algorithms=[self.jwt_algorithm])
+            except jwt.ExpiredSignatureError:
+                raise EdgeAuthError({
+                    "success": False,
+                    "message": "Phiên đăng nhập đã hết hạn! Vui lòng đăng nhập lại.",
+                    "error_code": "TOKEN_EXPIRED",
+                    "session_expired": True,
+                    "action_required": "LOGIN_AGAIN"
+                })
+            except jwt.InvalidTokenError:
+                raise EdgeAuthError({
+                    "success": False,
+                    "message": "Token không hợp lệ! Vui lòng đăng nhập lại.",
+                    "error_code": "INVALID_TOKEN",
+                    "action_required": "LOGIN_AGAIN"
+                })
+        except EdgeAuthError:
+            # Public routes still work without a usable token
+            if public:
+                return None
+            self.stats["rejected"] += 1
+            raise
+
+        user = {"rbac_role": payload.get("rbac_role", "USER")}
+        role = RBACManager.get_user_role(user)
+        self.stats["verified"] += 1
+        return internal_identity.encode(
+            payload.get("user_id"),
+            payload.get("username"),
+            role.value,
+            RBACManager.get_permission_mask(user),
+            payload.get("exp")
+        )
+
+    async def is_revoked(self, token: str) -> bool:
+        return await self.revoked.is_revoked(token)
+
+    async def revoke(self, token: str):
+        """Remember a logged-out token until it would have expired anyway"""
+        if await self.revoked.revoke(token):
+            self.stats["revoked"] += 1
+
+    async def observe(self, method: str, path: str, status_code: int, request: Request):
+        """Track successful logouts passing through the gateway"""
+        if method == "POST" and path == LOGOUT_PATH and status_code < 400:
+            token = self.bearer_token(request)
+            if token:
+                await self.revoke(token)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "token_blacklist": self.revoked.status(),
+            **self.stats
+        }
+
+
+# Singleton instance
+edge_auth = EdgeAuthenticator()
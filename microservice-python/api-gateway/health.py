@@ -0,0 +1,148 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from config import env_bool
+from upstream import upstream_pool
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceHealth:
+    """Cached probe results for one upstream instance"""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.healthy: Optional[bool] = None  # None until the first probe completes
+        self.latency_ms: Optional[float] = None
+        self.last_checked: Optional[datetime] = None
+        self.last_success: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self.consecutive_failures = 0
+        self.consecutive_successes = 0
+
+    def record_success(self, latency: float):
+        self.healthy = True
+        self.latency_ms = round(latency * 1000, 3)
+        self.last_checked = self.last_success = datetime.utcnow()
+        self.last_error = None
+        self.consecutive_failures = 0
+        self.consecutive_successes += 1
+
+    def record_failure(self, latency: float, error: str):
+        self.healthy = False
+        self.latency_ms = round(latency * 1000, 3)
+        self.last_checked = datetime.utcnow()
+        self.last_error = error
+        self.consecutive_successes = 0
+        self.consecutive_failures += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": bool(self.healthy),
+            "latency_ms": self.latency_ms,
+            "last_checked": self.last_checked.isoformat() if self.last_checked else None,
+            "last_success": self.last_success.isoformat() if self.last_success else None,
+            "last_error": self.last_error,
+            "consecutive_failures": self.consecutive_failures,
+            "consecutive_successes": self.consecutive_successes
+        }
+
+
+class HealthProber:
+    """Background task probing every upstream concurrently on an interval"""
+
+    def __init__(self):
+        self.interval = float(os.getenv("GATEWAY_HEALTH_INTERVAL", 5.0))
+        self.timeout = float(os.getenv("GATEWAY_HEALTH_TIMEOUT", 2.0))
+        self.failure_threshold = int(os.getenv("GATEWAY_HEALTH_FAILURE_THRESHOLD", 3))
+        self.skip_dead = env_bool("GATEWAY_HEALTH_SKIP_DEAD", True)
+        self.services: Dict[str, Dict[str, ServiceHealth]] = {}
+        self.task: Optional[asyncio.Task] = None
+
+    async def start(self, services: Dict[str, List[str]]):
+        """Run a first probe round, then keep probing in the background"""
+        for service_name, urls in services.items():
+            self.services[service_name] = {url: ServiceHealth(url) for url in urls}
+        await self.probe_all()
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"🩺 Health prober started (interval: {self.interval}s, timeout: {self.timeout}s)")
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+            logger.info("🩺 Health prober stopped")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.probe_all()
+            except Exception as e:
+                logger.error(f"❌ Health probe round failed: {e}")
+
+    async def probe_all(self):
+        await asyncio.gather(*[
+            self.probe(service_name, health)
+            for service_name, instances in self.services.items()
+            for health in instances.values()
+        ])
+
+    async def probe(self, service_name: str, health: ServiceHealth):
+        started = time.perf_counter()
+        was_healthy = health.healthy
+        try:
+            client = upstream_pool.get_client(service_name)
+            response = await client.get(f"{health.url}/health", timeout=self.timeout)
+            if response.status_code == 200:
+                health.record_success(time.perf_counter() - started)
+            else:
+                health.record_failure(time.perf_counter() - started, f"HTTP {response.status_code}")
+        except Exception as e:
+            health.record_failure(time.perf_counter() - started, type(e).__name__)
+
+        if was_healthy is not None and was_healthy != health.healthy:
+            if health.healthy:
+                logger.info(f"✅ {service_name} instance {health.url} is healthy again")
+            else:
+                logger.warning(f"🚨 {service_name} instance {health.url} failed health check: {health.last_error}")
+
+    def is_instance_down(self, service_name: str, url: str) -> bool:
+        """True when routing should skip an instance that keeps failing probes"""
+        if not self.skip_dead:
+            return False
+        health = self.services.get(service_name, {}).get(url)
+        return health is not None and health.consecutive_failures >= self.failure_threshold
+
+    def is_down(self, service_name: str) -> bool:
+        """True when every instance of a service keeps failing probes"""
+        instances = self.services.get(service_name)
+        if not instances:
+            return False
+        return all(self.is_instance_down(service_name, url) for url in instances)
+
+    def health_map(self) -> Dict[str, bool]:
+        """A service is healthy while at least one of its instances is"""
+        return {
+            service_name: any(health.healthy for health in instances.values())
+            for service_name, instances in self.services.items()
+        }
+
+    def details(self) -> Dict[str, Any]:
+        return {
+            service_name: [health.to_dict() for health in instances.values()]
+            for service_name, instances in self.services.items()
+        }
+
+
+# Singleton instance
+health_prober = HealthProber()
@@ -0,0 +1,203 @@
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, List, Awaitable, Callable, Optional, Set
+
+import httpx
+
+from config import env_bool
+from upstream import UpstreamCall
+
+logger = logging.getLogger(__name__)
+
+# Only these methods may be sent upstream more than once
+HEDGEABLE_METHODS = {"GET", "HEAD"}
+
+
+class RetryBudget:
+    """Global token bucket: every request earns a fraction of a retry, every hedge or retry spends one"""
+
+    def __init__(self):
+        self.ratio = float(os.getenv("GATEWAY_RETRY_BUDGET_RATIO", 0.1))
+        self.max_tokens = float(os.getenv("GATEWAY_RETRY_BUDGET_MAX_TOKENS", 10))
+        self.tokens = self.max_tokens
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1.0:
+            return False
+        self.tokens -= 1.0
+        return True
+
+
+class LatencyWindow:
+    """Recent upstream latencies for one service, used to derive the hedge delay"""
+
+    def __init__(self, size: int):
+        self.samples: deque = deque(maxlen=size)
+        self.cached: Optional[float] = None
+
+    def add(self, latency: float):
+        self.samples.append(latency)
+        self.cached = None
+
+    def percentile(self, quantile: float) -> float:
+        if self.cached is None:
+            ordered = sorted(self.samples)
+            self.cached = ordered[min(len(ordered) - 1, int(quantile * len(ordered)))]
+        return self.cached
+
+
+class Hedger:
+    """Hedge slow idempotent requests and retry failed ones within a global budget"""
+
+    def __init__(self):
+        self.enabled = env_bool("GATEWAY_HEDGING_ENABLED", False)
+        prefixes = os.getenv("GATEWAY_HEDGE_PREFIXES", "/api/vouchers/")
+        self.prefixes = tuple(prefix.strip() for prefix in prefixes.split(",") if prefix.strip())
+        self.max_attempts = max(1, int(os.getenv("GATEWAY_HEDGE_MAX_ATTEMPTS", 2)))
+        self.quantile = float(os.getenv("GATEWAY_HEDGE_PERCENTILE", 0.95))
+        self.default_delay = float(os.getenv("GATEWAY_HEDGE_DEFAULT_DELAY", 0.1))
+        self.min_delay = float(os.getenv("GATEWAY_HEDGE_MIN_DELAY", 0.01))
+        self.max_delay = float(os.getenv("GATEWAY_HEDGE_MAX_DELAY", 1.0))
+        self.min_samples = int(os.getenv("GATEWAY_HEDGE_MIN_SAMPLES", 20))
+        self.window_size = int(os.getenv("GATEWAY_HEDGE_WINDOW", 200))
+        self.budget = RetryBudget()
+        self.latencies: Dict[str, LatencyWindow] = {}
+        self.stats = {
+            "requests": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "retries": 0,
+            "budget_exhausted": 0
+        }
+
+    def applies(self, method: str, path: str) -> bool:
+        return self.enabled and method in HEDGEABLE_METHODS and path.startswith(self.prefixes)
+
+    def observe(self, service_name: str, latency: float):
+        """Record how long a successful upstream call took to return headers"""
+        window = self.latencies.get(service_name)
+        if window is None:
+            window = self.latencies[service_name] = LatencyWindow(self.window_size)
+        window.add(latency)
+
+    def delay_for(self, service_name: str) -> float:
+        window = self.latencies.get(service_name)
+        if window is None or len(window.samples) < self.min_samples:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, window.percentile(self.quantile)))
+
+    def _spend(self) -> bool:
+        if self.budget.withdraw():
+            return True
+        self.stats["budget_exhausted"] += 1
+        return False
+
+    async def call(self, service_name: str, attempt: Callable[[List[Any]], Awaitable[UpstreamCall]]) -> UpstreamCall:
+        """Run attempt(tried) until one answers; tried collects the instances already used"""
+        self.stats["requests"] += 1
+        self.budget.deposit()
+        delay = self.delay_for(service_name)
+        tried: List[Any] = []
+        pending: Set[asyncio.Task] = set()
+        unconsumed: Set[asyncio.Task] = set()
+        hedges: Set[asyncio.Task] = set()
+        attempts = 0
+        can_hedge = True
+        can_retry = True
+        last_error: Optional[BaseException] = None
+
+        def launch(kind: Optional[str] = None):
+            nonlocal attempts
+            attempts += 1
+            task = asyncio.create_task(attempt(tried))
+            pending.add(task)
+            if kind is not None:
+                self.stats[kind] += 1
+            if kind == "hedges":
+                hedges.add(task)
+
+        launch()
+        try:
+            while pending:
+                hedge_timeout = delay if can_hedge and attempts < self.max_attempts else None
+                done, pending = await asyncio.wait(pending, timeout=hedge_timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    # No answer within the hedge delay: race a second attempt if the budget allows
+                    can_hedge = self._spend()
+                    if can_hedge:
+                        launch("hedges")
+                    continue
+
+                unconsumed = set(done)
+                for task in done:
+                    unconsumed.discard(task)
+                    try:
+                        call = task.result()
+                    except httpx.TransportError as error:
+                        last_error = error
+                        continue
+                    except Exception as error:
+                        # Refused before reaching an upstream (open circuit, no instance...): do not retry
+                        last_error = error
+                        can_retry = False
+                        continue
+                    failed = call.response.status_code >= 500
+                    if failed and pending:
+                        # Another attempt is still running and may succeed
+                        await call.close()
+                        continue
+                    if failed and can_retry and attempts < self.max_attempts and self._spend():
+                        await call.close()
+                        launch("retries")
+                        continue
+                    if task in hedges:
+                        self.stats["hedge_wins"] += 1
+                    return call
+
+                # Every attempt so far raised: retry on another instance if allowed
+                if not pending and can_retry and attempts < self.max_attempts and self._spend():
+                    launch("retries")
+
+            raise last_error or RuntimeError(f"{service_name}: all attempts failed")
+        finally:
+            await self._discard(pending | unconsumed)
+
+    @staticmethod
+    async def _discard(tasks: Set[asyncio.Task]):
+        """Cancel losing attempts and release any call that completed anyway"""
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                call = await task
+            except BaseException:
+                continue
+            await call.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "prefixes": list(self.prefixes),
+            "max_attempts": self.max_attempts,
+            "percentile": self.quantile,
+            "delay_ms": {
+                service_name: round(self.delay_for(service_name) * 1000, 3)
+                for service_name in self.latencies
+            },
+            "retry_budget": {
+                "tokens": round(self.budget.tokens, 2),
+                "max_tokens": self.budget.max_tokens,
+                "ratio": self.budget.ratio
+            },
+            **self.stats
+        }
+
+
+# Singleton instance
+hedger = Hedger()
@@ -1,12 +1,23 @@
 from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from contextlib import asynccontextmanager
 import httpx
+import hmac
 import os
+import sys
+import time
 import logging
-from typing import Dict, Any
+from datetime import timedelta
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 
+# Add current directory to path for imports
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+sys.path.insert(0, os.path.dirname(current_dir))  # Add parent dir (shared modules)
+
 # Load environment variables
 load_dotenv()
 
@@ -14,11 +25,81 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+from config import env_bool
+from upstream import upstream_pool, UpstreamCall
+from cache import response_cache
+from singleflight import singleflight
+from health import health_prober
+from balancer import load_balancer, parse_instances, NoHealthyInstance
+from breaker import circuit_breakers, UpstreamRejected
+from edge_auth import edge_auth, EdgeAuthError
+from hedging import hedger
+from batch import batch_executor, BatchRequest
+from shared.identity import INTERNAL_IDENTITY_HEADER
+from shared.metrics import metrics
+from shared.token_blacklist import token_blacklist
+from proxy import filter_request_headers, filter_response_headers, UpstreamReply, STREAM_CHUNK_SIZE
+
+# Service URLs (each may list several comma-separated instances)
+SERVICES = {
+    "auth": parse_instances(os.getenv("AUTH_SERVICE_URL", "http://localhost:3001")),
+    "user": parse_instances(os.getenv("USER_SERVICE_URL", "http://localhost:3002")),
+    "voucher": parse_instances(os.getenv("VOUCHER_SERVICE_URL", "http://localhost:3003")),
+    "cart": parse_instances(os.getenv("CART_SERVICE_URL", "http://localhost:3004")),
+}
+
+# Path prefixes served by each service (also used to route batch sub-requests)
+SERVICE_ROUTES = {
+    "/api/auth/": "auth",
+    "/api/users/": "user",
+    "/api/vouchers/": "voucher",
+    "/api/cart/": "cart",
+}
+
+# Stream request/response bodies through the gateway instead of buffering them
+STREAM_PROXY = env_bool("GATEWAY_STREAM_PROXY", True)
+
+# Gateway-specific metrics (served on /metrics next to the shared HTTP/runtime ones)
+BREAKER_STATES = {"closed": 0, "half_open": 1, "open": 2}
+upstream_latency = metrics.histogram(
+    "gateway_upstream_duration_seconds", "Time until upstream response headers arrived", ("service",))
+upstream_errors = metrics.counter(
+    "gateway_upstream_errors_total", "Upstream calls that failed or were refused", ("service", "reason"))
+metrics.gauge(
+    "gateway_upstream_in_flight", "Open upstream calls per service", ("service",),
+    callback=lambda: {(name,): upstream_pool.get_stats(name).in_flight for name in SERVICES})
+metrics.gauge(
+    "gateway_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("service",),
+    callback=lambda: {(name,): BREAKER_STATES[breaker.state] for name, breaker in circuit_breakers.breakers.items()})
+
+# Upstream connection pool lifespan
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup
+    logger.info("🚀 Starting API Gateway...")
+    await upstream_pool.start(SERVICES)
+    load_balancer.configure(SERVICES)
+    circuit_breakers.configure(list(SERVICES))
+    await health_prober.start(SERVICES)
+    metrics.start_loop_monitor()
+    token_blacklist.start()
+    logger.info("✅ API Gateway started successfully")
+    
+    yield
+    
+    # Shutdown
+    logger.info("🛑 Shutting down API Gateway...")
+    await metrics.stop_loop_monitor()
+    await token_blacklist.stop()
+    await health_prober.stop()
+    await upstream_pool.close()
+
 # Create FastAPI app
 app = FastAPI(
     title="Voux API Gateway",
     description="Central API Gateway for Voux Microservices Platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -34,54 +115,205 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
-# Service URLs
-SERVICES = {
-    "auth": os.getenv("AUTH_SERVICE_URL", "http://localhost:3001"),
-    "user": os.getenv("USER_SERVICE_URL", "http://localhost:3002"),
-    "voucher": os.getenv("VOUCHER_SERVICE_URL", "http://localhost:3003"),
-    "cart": os.getenv("CART_SERVICE_URL", "http://localhost:3004"),
-}
+# Prometheus metrics (/metrics)
+metrics.setup(app, "api-gateway")
 
-# Service health status
-service_health: Dict[str, bool] = {}
-
-async def forward_request(service_url: str, path: str, method: str, request: Request) -> Response:
-    """Forward request to microservice"""
+async def open_upstream(service_name: str, path: str, method: str, request: Request, tried: Optional[List] = None) -> UpstreamCall:
+    """Send a request upstream and return once the response headers have arrived"""
+    # Shed load early: an open circuit or a full bulkhead rejects without touching the upstream
+    breaker = circuit_breakers.get(service_name)
+    breaker.acquire()
+    try:
+        try:
+            # Hedges and retries prefer an instance that has not been tried yet
+            instance = load_balancer.pick(service_name, exclude=tried or ())
+        except NoHealthyInstance:
+            if not tried:
+                raise
+            instance = load_balancer.pick(service_name)
+    except NoHealthyInstance:
+        upstream_errors.labels(service_name, "no_healthy_instance").inc()
+        breaker.abandon()
+        breaker.release()
+        raise
+    if tried is not None:
+        tried.append(instance)
+    call = upstream_pool.begin_call(service_name, instance, breaker)
+    started = time.perf_counter()
     try:
-        # Prepare request data
-        headers = dict(request.headers)
-        # Remove host header to avoid conflicts
-        headers.pop("host", None)
+        # Prepare request data (hop-by-hop and host headers are not forwarded)
+        headers = filter_request_headers(request.headers.items())
+        identity = getattr(request.state, "internal_identity", None)
+        if identity:
+            headers.append((INTERNAL_IDENTITY_HEADER, identity))
         
-        # Get request body if present
+        # Pass request body through chunk by chunk instead of buffering it
         body = None
         if method in ["POST", "PUT", "PATCH"]:
-            body = await request.body()
+            body = request.stream()
         
         # Get query parameters
-        params = dict(request.query_params)
+        params = list(request.query_params.multi_items())
         
         # Construct target URL
-        target_url = f"{service_url}{path}"
+        target_url = f"{instance.url}{path}"
         
-        # Forward request
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.request(
-                method=method,
-                url=target_url,
-                headers=headers,
-                content=body,
-                params=params
-            )
-            
-            # Return response
-            return Response(
-                content=response.content,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.headers.get("content-type")
-            )
+        # Forward request (keep-alive connection from the shared pool)
+        client = upstream_pool.get_client(service_name)
+        upstream_request = client.build_request(
+            method=method,
+            url=target_url,
+            headers=headers,
+            content=body,
+            params=params,
+            extensions={"trace": upstream_pool.trace_hook(service_name)}
+        )
+        call.response = await client.send(upstream_request, stream=True)
+    except httpx.TransportError as error:
+        upstream_errors.labels(service_name, type(error).__name__).inc()
+        load_balancer.record_failure(instance)
+        breaker.record(True, time.perf_counter() - started)
+        await call.close()
+        raise
+    except BaseException:
+        breaker.abandon()
+        await call.close()
+        raise
+    
+    # Passive health: server errors count against the instance, anything else feeds its latency EWMA
+    elapsed = time.perf_counter() - started
+    upstream_latency.labels(service_name).observe(elapsed)
+    failed = call.response.status_code >= 500
+    if failed:
+        upstream_errors.labels(service_name, "http_5xx").inc()
+        load_balancer.record_failure(instance)
+    else:
+        load_balancer.record_success(instance, elapsed)
+        hedger.observe(service_name, elapsed)
+    breaker.record(failed, elapsed)
+    
+    await edge_auth.observe(method, path, call.response.status_code, request)
+    
+    # A successful write makes cached reads of that service stale
+    if method != "GET" and call.response.status_code < 400:
+        response_cache.invalidate_service(service_name)
+    
+    return call
+
+async def open_upstream_call(service_name: str, path: str, method: str, request: Request) -> UpstreamCall:
+    """Open an upstream call, hedged and retried when the route opts in"""
+    if hedger.applies(method, path):
+        return await hedger.call(
+            service_name, lambda tried: open_upstream(service_name, path, method, request, tried)
+        )
+    return await open_upstream(service_name, path, method, request)
+
+async def read_upstream(service_name: str, path: str, method: str, request: Request) -> UpstreamReply:
+    """Send a request upstream and read the whole (raw) response body"""
+    call = await open_upstream_call(service_name, path, method, request)
+    try:
+        content = b"".join([chunk async for chunk in call.response.aiter_raw(STREAM_CHUNK_SIZE)])
+    finally:
+        await call.close()
+    
+    return UpstreamReply(
+        call.response.status_code,
+        filter_response_headers(call.response.headers.raw),
+        content
+    )
+
+async def forward_request(service_name: str, path: str, method: str, request: Request) -> Response:
+    """Forward request to microservice over the shared upstream pool"""
+    service_url = ", ".join(SERVICES[service_name])
+    
+    # Verify the caller once at the edge and hand services a signed identity
+    try:
+        request.state.internal_identity = await edge_auth.authenticate(method, path, request)
+    except EdgeAuthError as error:
+        return JSONResponse(status_code=401, content=error.detail)
+    
+    # Serve public voucher reads from the response cache when possible
+    cache_policy = response_cache.policy_for(method, path)
+    if cache_policy is not None:
+        cache_key = response_cache.make_key(path, request, cache_policy)
+        entry = response_cache.get(cache_key)
+        if entry is not None:
+            return response_cache.build_response(entry, request, cache_policy, hit=True)
+    
+    try:
+        # Identical concurrent GETs share a single upstream call
+        flight_key = singleflight.key_for(method, path, request)
+        if cache_policy is not None or flight_key is not None:
+            if flight_key is not None:
+                reply = await singleflight.do(
+                    flight_key, lambda: read_upstream(service_name, path, method, request)
+                )
+            else:
+                reply = await read_upstream(service_name, path, method, request)
             
+            if cache_policy is not None:
+                entry = response_cache.store(cache_key, path, cache_policy, reply.status_code, reply.headers, reply.body)
+                return response_cache.build_response(entry, request, cache_policy, hit=False)
+            return reply.to_response()
+        
+        if not STREAM_PROXY:
+            reply = await read_upstream(service_name, path, method, request)
+            return reply.to_response()
+        
+        # Relay raw (still encoded) upstream chunks; the connection goes back
+        # to the pool once the last chunk is sent or the client goes away
+        call = await open_upstream_call(service_name, path, method, request)
+        
+        async def relay():
+            try:
+                async for chunk in call.response.aiter_raw(STREAM_CHUNK_SIZE):
+                    yield chunk
+            finally:
+                await call.close()
+        
+        proxied = StreamingResponse(
+            relay(),
+            status_code=call.response.status_code,
+            background=BackgroundTask(call.close)
+        )
+        proxied.raw_headers = filter_response_headers(call.response.headers.raw)
+        return proxied
+        
+    except UpstreamRejected as rejection:
+        upstream_errors.labels(service_name, rejection.reason).inc()
+        logger.warning(f"Rejected {method} {path} to {service_name}: {rejection.reason}")
+        return JSONResponse(
+            status_code=503,
+            content={
+                "success": False,
+                "message": "Service temporarily unavailable",
+                "service": service_url,
+                "reason": rejection.reason,
+                "retry_after": rejection.retry_after
+            },
+            headers={"Retry-After": str(rejection.retry_after)}
+        )
+    except NoHealthyInstance:
+        # Fail fast instead of waiting on instances that are ejected or failing probes
+        logger.error(f"No healthy instance for {method} {path} ({service_name})")
+        return JSONResponse(
+            status_code=503,
+            content={
+                "success": False,
+                "message": "Service unavailable",
+                "service": service_url
+            }
+        )
+    except httpx.PoolTimeout:
+        logger.error(f"Connection pool exhausted forwarding {method} {path} to {service_url}")
+        return JSONResponse(
+            status_code=503,
+            content={
+                "success": False,
+                "message": "Service busy",
+                "service": service_url
+            }
+        )
     except httpx.TimeoutException:
         logger.error(f"Timeout forwarding {method} {path} to {service_url}")
         return JSONResponse(
@@ -113,48 +345,55 @@ async def forward_request(service_url: str, path: str, method: str, request: Req
             }
         )
 
+# Batch endpoint: several sub-requests in one round trip
+@app.post("/api/batch")
+async def batch_requests(batch: BatchRequest, request: Request):
+    """Forward sub-requests concurrently and return every response in one envelope"""
+    if len(batch.requests) > batch_executor.max_items:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "success": False,
+                "message": f"A batch may contain at most {batch_executor.max_items} requests"
+            }
+        )
+    
+    responses = await batch_executor.run(batch, request, SERVICE_ROUTES, forward_request)
+    return {
+        "success": True,
+        "count": len(responses),
+        "responses": responses
+    }
+
 # Auth Service Routes
 @app.api_route("/api/auth/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def auth_service(path: str, request: Request):
     """Forward to Auth Service"""
-    return await forward_request(SERVICES["auth"], f"/api/auth/{path}", request.method, request)
+    return await forward_request("auth", f"/api/auth/{path}", request.method, request)
 
 # User Service Routes
 @app.api_route("/api/users/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def user_service(path: str, request: Request):
     """Forward to User Service"""
-    return await forward_request(SERVICES["user"], f"/api/users/{path}", request.method, request)
+    return await forward_request("user", f"/api/users/{path}", request.method, request)
 
 # Voucher Service Routes
 @app.api_route("/api/vouchers/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def voucher_service(path: str, request: Request):
     """Forward to Voucher Service"""
-    return await forward_request(SERVICES["voucher"], f"/api/vouchers/{path}", request.method, request)
+    return await forward_request("voucher", f"/api/vouchers/{path}", request.method, request)
 
 # Cart Service Routes
 @app.api_route("/api/cart/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def cart_service(path: str, request: Request):
     """Forward to Cart Service"""
-    return await forward_request(SERVICES["cart"], f"/api/cart/{path}", request.method, request)
-
-# Health check for individual services
-async def check_service_health(service_name: str, service_url: str) -> bool:
-    """Check if a service is healthy"""
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{service_url}/health")
-            return response.status_code == 200
-    except:
-        return False
+    return await forward_request("cart", f"/api/cart/{path}", request.method, request)
 
 # Gateway health check
 @app.get("/health")
 async def health_check():
-    """Gateway health check"""
-    # Check all services
-    for service_name, service_url in SERVICES.items():
-        service_health[service_name] = await check_service_health(service_name, service_url)
-    
+    """Gateway health check (answered from the background prober's cached state)"""
+    service_health = health_prober.health_map()
     all_healthy = all(service_health.values())
     
     return {
@@ -162,9 +401,31 @@ async def health_check():
         "timestamp": "2024-01-01T00:00:00Z",
         "services": service_health,
         "all_services_healthy": all_healthy,
+        "details": health_prober.details(),
         "gateway_version": "1.0.0"
     }
 
+# Response cache purge (admin)
+@app.delete("/cache")
+async def purge_cache(request: Request, prefix: Optional[str] = None):
+    """Purge cached responses, optionally only paths starting with prefix"""
+    admin_key = os.getenv("GATEWAY_ADMIN_KEY")
+    if not admin_key or not hmac.compare_digest(request.headers.get("x-admin-key", ""), admin_key):
+        return JSONResponse(
+            status_code=403,
+            content={
+                "success": False,
+                "message": "Admin key required"
+            }
+        )
+    
+    removed = response_cache.purge(prefix)
+    return {
+        "success": True,
+        "purged": removed,
+        "prefix": prefix
+    }
+
 # Service discovery endpoint
 @app.get("/services")
 async def service_discovery():
@@ -177,7 +438,8 @@ async def service_discovery():
             "/api/auth/*",
             "/api/users/*", 
             "/api/vouchers/*",
-            "/api/cart/*"
+            "/api/cart/*",
+            "/api/batch"
         ]
     }
 
@@ -185,10 +447,7 @@ async def service_discovery():
 @app.get("/status")
 async def gateway_status():
     """Get gateway status and metrics"""
-    # Check all services
-    for service_name, service_url in SERVICES.items():
-        service_health[service_name] = await check_service_health(service_name, service_url)
-    
+    service_health = health_prober.health_map()
     healthy_services = sum(1 for status in service_health.values() if status)
     total_services = len(SERVICES)
     
@@ -197,19 +456,37 @@ async def gateway_status():
         "gateway": {
             "status": "running",
             "version": "1.0.0",
-            "uptime": "N/A"  # Could implement actual uptime tracking
+            "uptime": str(timedelta(seconds=int(metrics.uptime_seconds()))),
+            "uptime_seconds": round(metrics.uptime_seconds(), 1)
         },
         "services": {
             "total": total_services,
             "healthy": healthy_services,
             "unhealthy": total_services - healthy_services,
-            "health_status": service_health
+            "health_status": service_health,
+            "health_details": health_prober.details()
         },
+        "load_balancing": load_balancer.status(),
+        "circuit_breakers": circuit_breakers.status(),
+        "hedging": hedger.status(),
+        "batching": batch_executor.status(),
+        "edge_auth": edge_auth.status(),
+        "connection_pools": upstream_pool.pool_status(),
+        "response_cache": response_cache.status(),
+        "request_coalescing": singleflight.status(),
         "features": [
             "Request Forwarding",
+            "Connection Pooling",
+            "Response Caching",
+            "Request Coalescing",
             "Service Discovery", 
-            "Health Monitoring",
+            "Background Health Monitoring",
             "Load Balancing",
+            "Circuit Breaking",
+            "Request Hedging",
+            "Request Batching",
+            "Edge Authentication",
+            "Prometheus Metrics",
             "Error Handling"
         ]
     }
@@ -225,7 +502,8 @@ async def root():
         "docs": "/docs",
         "health": "/health",
         "services": "/services",
-        "status_page": "/status"
+        "status_page": "/status",
+        "metrics": "/metrics"
     }
 
 # Error handlers
@@ -242,7 +520,8 @@ async def not_found_handler(request: Request, exc: HTTPException):
                 "/api/auth/*",
                 "/api/users/*", 
                 "/api/vouchers/*",
-                "/api/cart/*"
+                "/api/cart/*",
+                "/api/batch"
             ]
         }
     )
@@ -0,0 +1,67 @@
+from typing import Iterable, List, Tuple, Set
+
+from fastapi import Response
+
+# Hop-by-hop headers (RFC 9110 section 7.6.1) apply to a single connection
+# and must not be forwarded by a proxy
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "proxy-connection",
+    "te",
+    "trailer",
+    "transfer-encoding",
+    "upgrade",
+}
+
+# Trusted internal headers only the gateway may set
+INTERNAL_HEADERS = {
+    "x-internal-identity",
+}
+
+# Read request/response bodies in chunks of this size when streaming
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _connection_tokens(headers: Iterable[Tuple[str, str]]) -> Set[str]:
+    """Header names listed in Connection are also hop-by-hop"""
+    tokens = set()
+    for name, value in headers:
+        if name.lower() == "connection":
+            tokens.update(token.strip().lower() for token in value.split(",") if token.strip())
+    return tokens
+
+
+def filter_request_headers(headers: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """Drop hop-by-hop, host and client-supplied internal headers before forwarding upstream"""
+    headers = list(headers)
+    excluded = HOP_BY_HOP_HEADERS | INTERNAL_HEADERS | _connection_tokens(headers) | {"host"}
+    return [(name, value) for name, value in headers if name.lower() not in excluded]
+
+
+def filter_response_headers(headers: Iterable[Tuple[bytes, bytes]]) -> List[Tuple[bytes, bytes]]:
+    """Drop hop-by-hop headers from an upstream response, keeping duplicates such as Set-Cookie"""
+    headers = list(headers)
+    decoded = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in headers]
+    excluded = HOP_BY_HOP_HEADERS | _connection_tokens(decoded)
+    return [(name.lower(), value) for name, value in headers if name.decode("latin-1").lower() not in excluded]
+
+
+class UpstreamReply:
+    """A fully read upstream response that can be shared or replayed"""
+
+    __slots__ = ("status_code", "headers", "body")
+
+    def __init__(self, status_code: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+
+    def to_response(self) -> Response:
+        response = Response(content=self.body, status_code=self.status_code)
+        response.raw_headers = [
+            (name, value) for name, value in self.headers if name != b"content-length"
+        ] + [(b"content-length", str(len(self.body)).encode("latin-1"))]
+        return response
@@ -0,0 +1,103 @@
+import os
+import asyncio
+import logging
+from typing import Dict, Any, Awaitable, Callable, Optional, TypeVar
+
+from fastapi import Request
+
+from config import env_bool
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Methods that are safe to collapse into one upstream call
+IDEMPOTENT_METHODS = {"GET", "HEAD"}
+
+
+def default_flight_key(method: str, path: str, request: Request) -> str:
+    """Requests are identical when path, query and caller-specific headers all match"""
+    query = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+    headers = request.headers
+    return "|".join([
+        method,
+        f"{path}?{query}",
+        headers.get("accept-encoding", ""),
+        headers.get("authorization", ""),
+        headers.get("cookie", ""),
+    ])
+
+
+class Flight:
+    """An upstream call in progress and the number of requests waiting on it"""
+
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Collapse concurrent identical idempotent requests into one upstream call"""
+
+    def __init__(self, key_func: Optional[Callable[[str, str, Request], Optional[str]]] = None, max_waiters: Optional[int] = None):
+        self.enabled = env_bool("GATEWAY_SINGLEFLIGHT_ENABLED", True)
+        self.key_func = key_func or default_flight_key
+        self.max_waiters = max_waiters if max_waiters is not None else int(os.getenv("GATEWAY_SINGLEFLIGHT_MAX_WAITERS", 1000))
+        prefixes = os.getenv("GATEWAY_SINGLEFLIGHT_PREFIXES", "/api/vouchers/")
+        self.prefixes = tuple(prefix.strip() for prefix in prefixes.split(",") if prefix.strip())
+        self.flights: Dict[str, Flight] = {}
+        self.stats = {
+            "leaders": 0,
+            "collapsed": 0,
+            "overflow": 0,
+            "errors": 0
+        }
+
+    def key_for(self, method: str, path: str, request: Request) -> Optional[str]:
+        """Return the coalescing key for a request, or None if it must not be coalesced"""
+        if not self.enabled or method not in IDEMPOTENT_METHODS:
+            return None
+        if not path.startswith(self.prefixes):
+            return None
+        return self.key_func(method, path, request)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn once per key; concurrent callers with the same key share its result"""
+        flight = self.flights.get(key)
+        if flight is not None:
+            if flight.waiters < self.max_waiters:
+                flight.waiters += 1
+                self.stats["collapsed"] += 1
+                return await asyncio.shield(flight.task)
+            # Too many waiters on one flight - let this request go upstream on its own
+            self.stats["overflow"] += 1
+            return await fn()
+
+        task = asyncio.create_task(fn())
+        flight = Flight(task)
+        self.flights[key] = flight
+        self.stats["leaders"] += 1
+        task.add_done_callback(lambda finished: self._land(key, flight, finished))
+        # The shared call keeps running even if the leading client disconnects
+        return await asyncio.shield(task)
+
+    def _land(self, key: str, flight: Flight, task: asyncio.Task):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self.flights),
+            "max_waiters": self.max_waiters,
+            "prefixes": list(self.prefixes),
+            **self.stats
+        }
+
+
+# Singleton instance
+singleflight = SingleFlight()
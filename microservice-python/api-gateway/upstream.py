@@ -0,0 +1,206 @@
+import os
+import time
+import logging
+from typing import Dict, Any, Optional
+
+import httpx
+
+from config import env_bool
+
+logger = logging.getLogger(__name__)
+
+
+class PoolSettings:
+    """Connection pool settings for upstream clients (read from environment)"""
+
+    def __init__(self):
+        self.max_connections = int(os.getenv("GATEWAY_MAX_CONNECTIONS", 100))
+        self.max_keepalive_connections = int(os.getenv("GATEWAY_MAX_KEEPALIVE_CONNECTIONS", 20))
+        self.keepalive_expiry = float(os.getenv("GATEWAY_KEEPALIVE_EXPIRY", 30.0))
+        self.connect_timeout = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", 5.0))
+        self.timeout = float(os.getenv("GATEWAY_UPSTREAM_TIMEOUT", 30.0))
+        self.pool_timeout = float(os.getenv("GATEWAY_POOL_TIMEOUT", 10.0))
+        self.http2 = env_bool("GATEWAY_HTTP2", False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "connect_timeout": self.connect_timeout,
+            "timeout": self.timeout,
+            "pool_timeout": self.pool_timeout,
+            "http2": self.http2
+        }
+
+
+class UpstreamStats:
+    """Request and connection-acquisition counters for one upstream"""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.wait_samples = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_wait(self, seconds: float):
+        self.wait_samples += 1
+        self.wait_total += seconds
+        if seconds > self.wait_max:
+            self.wait_max = seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        avg = self.wait_total / self.wait_samples if self.wait_samples else 0.0
+        return {
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "wait_time_ms": {
+                "avg": round(avg * 1000, 3),
+                "max": round(self.wait_max * 1000, 3)
+            }
+        }
+
+
+class UpstreamCall:
+    """One upstream call, counted as in flight until its response is closed"""
+
+    def __init__(self, stats: UpstreamStats, instance: Optional[Any] = None, breaker: Optional[Any] = None):
+        self.stats = stats
+        self.instance = instance
+        self.breaker = breaker
+        self.response: Optional[httpx.Response] = None
+        self.closed = False
+        stats.requests += 1
+        stats.in_flight += 1
+        if instance is not None:
+            instance.requests += 1
+            instance.in_flight += 1
+
+    async def close(self):
+        if self.response is not None:
+            await self.response.aclose()
+        if not self.closed:
+            self.closed = True
+            self.stats.in_flight -= 1
+            if self.instance is not None:
+                self.instance.in_flight -= 1
+            if self.breaker is not None:
+                self.breaker.release()
+
+
+class UpstreamPool:
+    """Long-lived, pooled httpx clients - one per upstream service"""
+
+    def __init__(self, settings: Optional[PoolSettings] = None):
+        self.settings = settings or PoolSettings()
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.stats: Dict[str, UpstreamStats] = {}
+
+    def _build_client(self) -> httpx.AsyncClient:
+        settings = self.settings
+        http2 = settings.http2
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                logger.warning("⚠️ GATEWAY_HTTP2 is enabled but the 'h2' package is missing - using HTTP/1.1")
+                http2 = False
+
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_keepalive_connections,
+                keepalive_expiry=settings.keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                settings.timeout,
+                connect=settings.connect_timeout,
+                pool=settings.pool_timeout
+            ),
+            http2=http2,
+            follow_redirects=False
+        )
+
+    async def start(self, services: Dict[str, Any]):
+        """Open one client per upstream service"""
+        for service_name in services:
+            if service_name not in self.clients:
+                self.clients[service_name] = self._build_client()
+                self.stats[service_name] = UpstreamStats()
+        logger.info(f"🔗 Upstream pools ready for: {', '.join(self.clients)}")
+
+    async def close(self):
+        """Close all upstream clients"""
+        for service_name, client in self.clients.items():
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"⚠️ Error closing upstream pool for {service_name}: {e}")
+        self.clients.clear()
+        logger.info("🔌 Upstream pools closed")
+
+    def get_client(self, service_name: str) -> httpx.AsyncClient:
+        """Return the shared client for a service, creating it lazily if needed"""
+        client = self.clients.get(service_name)
+        if client is None or client.is_closed:
+            client = self._build_client()
+            self.clients[service_name] = client
+            self.stats.setdefault(service_name, UpstreamStats())
+        return client
+
+    def get_stats(self, service_name: str) -> UpstreamStats:
+        return self.stats.setdefault(service_name, UpstreamStats())
+
+    def begin_call(self, service_name: str, instance: Optional[Any] = None, breaker: Optional[Any] = None) -> UpstreamCall:
+        return UpstreamCall(self.get_stats(service_name), instance, breaker)
+
+    def trace_hook(self, service_name: str):
+        """Build an httpcore trace callback measuring connection acquisition time"""
+        stats = self.get_stats(service_name)
+        started = time.perf_counter()
+        recorded = False
+
+        async def trace(event_name: str, info: Dict[str, Any]):
+            nonlocal recorded
+            # Request headers are sent once a connection has been acquired
+            # from the pool (or newly opened), so this marks the end of the wait.
+            if not recorded and event_name.endswith("send_request_headers.started"):
+                recorded = True
+                stats.record_wait(time.perf_counter() - started)
+
+        return trace
+
+    @staticmethod
+    def _connection_counts(client: httpx.AsyncClient) -> Dict[str, int]:
+        # httpx does not expose pool state publicly; read it from the transport defensively
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        connections = list(getattr(pool, "connections", []) or [])
+        idle = 0
+        for connection in connections:
+            try:
+                if connection.is_idle():
+                    idle += 1
+            except Exception:
+                pass
+        return {
+            "open": len(connections),
+            "idle": idle,
+            "in_use": len(connections) - idle
+        }
+
+    def pool_status(self) -> Dict[str, Any]:
+        """Pool statistics per upstream (connections in use, idle, wait time)"""
+        upstreams = {}
+        for service_name, client in self.clients.items():
+            status = self._connection_counts(client)
+            status.update(self.get_stats(service_name).to_dict())
+            upstreams[service_name] = status
+        return {
+            "settings": self.settings.to_dict(),
+            "upstreams": upstreams
+        }
+
+
+# Singleton instance
+upstream_pool = UpstreamPool()
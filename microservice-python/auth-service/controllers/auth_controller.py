@@ -1,4 +1,3 @@
-import bcrypt
 import logging
 from typing import Dict, Any, Optional
 from fastapi import HTTPException, status, Request
@@ -16,17 +15,21 @@ try:
     from ...shared.models.user import User, UserCreate, UserResponse
     from ...shared.database import AuthDatabase
     from ...shared.middleware import AuthMiddleware
-    from ...shared.session_manager import session_manager
+    from ...shared.session_manager import session_manager, session_lifetimes, ACCESS_TOKEN_TTL, SESSION_PROMPT_SECONDS
     from ...shared.rbac import RBACManager, Permission
     from ...shared.event_manager import event_manager
+    from ...shared.password_hasher import password_hasher
+    from ...shared.login_guard import login_guard
 except ImportError:
     # Fallback to absolute imports (when running directly)
     from shared.models.user import User, UserCreate, UserResponse
     from shared.database import AuthDatabase
     from shared.middleware import AuthMiddleware
-    from shared.session_manager import session_manager
+    from shared.session_manager import session_manager, session_lifetimes, ACCESS_TOKEN_TTL, SESSION_PROMPT_SECONDS
     from shared.rbac import RBACManager, Permission
     from shared.event_manager import event_manager
+    from shared.password_hasher import password_hasher
+    from shared.login_guard import login_guard
 
 logger = logging.getLogger(__name__)
 
@@ -88,15 +91,14 @@ class AuthController:
                     }
                 )
             
-            # Hash password with salt
-            salt = bcrypt.gensalt(rounds=12)
-            hashed_password = bcrypt.hashpw(user_data.password.encode('utf-8'), salt)
+            # Hash password with salt (off the event loop)
+            hashed_password = await password_hasher.hash_password(user_data.password)
             
             # Create new user with default role
             user_dict = {
                 "username": user_data.username,
                 "email": user_data.email,
-                "password": hashed_password.decode('utf-8'),
+                "password": hashed_password,
                 "admin": False,
                 "roles": ["user"],  # Default role
                 "created_at": datetime.utcnow(),
@@ -159,12 +161,28 @@ class AuthController:
         try:
             logger.info(f"Login attempt for user: {login_data.username}")
             
+            # Backing off after repeated failures: reject before the user lookup and bcrypt
+            client_ip = request.client.host if request.client else "unknown"
+            retry_after = await login_guard.check(login_data.username, client_ip)
+            if retry_after:
+                logger.warning(f"Login rejected - too many failures for user {login_data.username} / {client_ip}")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail={
+                        "success": False,
+                        "message": "Đăng nhập sai quá nhiều lần! Vui lòng thử lại sau.",
+                        "retry_after": retry_after
+                    },
+                    headers={"Retry-After": str(retry_after)}
+                )
+            
             # Authenticate user
             users_collection = AuthDatabase.get_collection("users")
             user = await users_collection.find_one({"username": login_data.username})
             
             if not user:
                 logger.warning(f"Login failed - user not found: {login_data.username}")
+                await login_guard.record_failure(login_data.username, client_ip)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail={
@@ -174,8 +192,9 @@ class AuthController:
                 )
             
             # Verify password
-            if not bcrypt.checkpw(login_data.password.encode('utf-8'), user["password"].encode('utf-8')):
+            if not await password_hasher.verify_password(login_data.password, user["password"]):
                 logger.warning(f"Login failed - wrong password for user: {login_data.username}")
+                await login_guard.record_failure(login_data.username, client_ip)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail={
@@ -184,6 +203,19 @@ class AuthController:
                     }
                 )
             
+            await login_guard.record_success(login_data.username)
+            
+            # Upgrade hashes made with outdated bcrypt parameters, off the request path.
+            # Matching on the old hash keeps a concurrent password change from being overwritten.
+            if password_hasher.needs_rehash(user["password"]):
+                password_hasher.rehash_in_background(
+                    login_data.password,
+                    lambda new_hash: users_collection.update_one(
+                        {"_id": user["_id"], "password": user["password"]},
+                        {"$set": {"password": new_hash}}
+                    )
+                )
+            
             # Update login statistics
             try:
                 await users_collection.update_one(
@@ -206,11 +238,11 @@ class AuthController:
                 "rbac_role": user.get("rbac_role", "USER")
             }
             
-            # Generate access token (45 seconds: 30s session + 15s grace period for user decision)
+            # Generate access token (SESSION_PROMPT_SECONDS session + grace period for user decision)
             try:
                 access_token = self.auth_middleware.generate_jwt_token(
                     token_data, 
-                    expires_delta=timedelta(seconds=45)
+                    expires_delta=timedelta(seconds=ACCESS_TOKEN_TTL)
                 )
                 logger.info(f"Generated access token for user: {login_data.username}")
             except Exception as e:
@@ -230,7 +262,9 @@ class AuthController:
                 refresh_token = await session_manager.create_refresh_token(
                     user_id,
                     device_info=request.headers.get("user-agent"),
-                    ip_address=request.client.host if hasattr(request, 'client') and request.client else None
+                    ip_address=request.client.host if hasattr(request, 'client') and request.client else None,
+                    username=user["username"],
+                    rbac_role=user.get("rbac_role", "USER")
                 )
                 logger.info(f"Successfully created refresh token for user: {login_data.username}")
             except Exception as e:
@@ -256,7 +290,7 @@ class AuthController:
             # Add RBAC information
             try:
                 rbac_role = RBACManager.get_user_role(token_data)
-                permissions = list(RBACManager.get_user_permissions(token_data))
+                permissions = RBACManager.get_user_permission_list(token_data)
             except Exception as e:
                 logger.warning(f"RBAC error for user {login_data.username}: {e}")
                 rbac_role = None
@@ -266,16 +300,15 @@ class AuthController:
             
             return {
                 "success": True,
-                "message": "Đăng nhập thành công! 🎉 (Phiên làm việc: 30 giây)",
+                "message": f"Đăng nhập thành công! 🎉 (Phiên làm việc: {SESSION_PROMPT_SECONDS} giây)",
                 "user": secure_user_info,
                 "access_token": access_token,
                 "refresh_token": refresh_token,
                 "token_type": "Bearer",
-                "expires_in": 30,  # Client sees 30 seconds, but token valid for 45s
-                "actual_token_expiry": 45,  # Actual backend expiry
-                "refresh_expires_in": 600,  # 10 minutes (600 seconds)
+                # expires_in is what the client sees, actual_token_expiry the backend one; refresh_in is jittered
+                **session_lifetimes(),
                 "auth_type": "jwt_with_refresh",
-                "session_warning": "⚠️ Bạn sẽ được hỏi có muốn tiếp tục sau 30 giây!",
+                "session_warning": f"⚠️ Bạn sẽ được hỏi có muốn tiếp tục sau {SESSION_PROMPT_SECONDS} giây!",
                 "rbac": {
                     "role": rbac_role.value if rbac_role else "user",
                     "permissions": permissions
@@ -305,7 +338,7 @@ class AuthController:
             auth_header = request.headers.get("authorization")
             if auth_header and auth_header.startswith("Bearer "):
                 access_token = auth_header.split(" ")[1]
-                session_manager.blacklist_access_token(access_token)
+                await session_manager.blacklist_access_token(access_token)
                 logger.info(f"Blacklisted access token for user: {user_id}")
             
             logout_all = False
@@ -354,8 +387,12 @@ class AuthController:
     async def refresh_token(self, refresh_request: RefreshTokenRequest, request: Request) -> Dict[str, Any]:
         """Refresh access token using refresh token"""
         try:
-            # Validate refresh token
-            user_data = await session_manager.validate_refresh_token(refresh_request.refresh_token)
+            # Validate, revoke and reissue the refresh token in one atomic database operation
+            user_data = await session_manager.rotate_refresh_token(
+                refresh_request.refresh_token,
+                device_info=request.headers.get("user-agent"),
+                ip_address=request.client.host if request.client else None
+            )
             
             if not user_data:
                 raise HTTPException(
@@ -375,29 +412,20 @@ class AuthController:
             
             new_access_token = self.auth_middleware.generate_jwt_token(
                 token_data,
-                expires_delta=timedelta(seconds=45)
+                expires_delta=timedelta(seconds=ACCESS_TOKEN_TTL)
             )
-            
-            # Optionally rotate refresh token (security best practice)
-            new_refresh_token = await session_manager.create_refresh_token(
-                user_data.get("user_id"),
-                device_info=request.headers.get("user-agent"),
-                ip_address=request.client.host
-            )
-            
-            # Revoke old refresh token
-            await session_manager.revoke_refresh_token(refresh_request.refresh_token)
+            new_refresh_token = user_data["refresh_token"]
             
             return {
                 "success": True,
-                "message": "Token đã được refresh! (Phiên mới: 30 giây)",
+                "message": f"Token đã được refresh! (Phiên mới: {SESSION_PROMPT_SECONDS} giây)",
                 "access_token": new_access_token,
                 "refresh_token": new_refresh_token,
                 "token_type": "Bearer",
-                "expires_in": 30,  # Client sees 30 seconds, but token valid for 45s
-                "actual_token_expiry": 45,  # Actual backend expiry
-                "refresh_expires_in": 600,  # 10 minutes (600 seconds)
-                "session_warning": "⚠️ Bạn sẽ được hỏi có muốn tiếp tục sau 30 giây!"
+                **session_lifetimes(),
+                # True when another request rotated this refresh token moments ago and its successor was reused
+                "refresh_reused": user_data["grace"],
+                "session_warning": f"⚠️ Bạn sẽ được hỏi có muốn tiếp tục sau {SESSION_PROMPT_SECONDS} giây!"
             }
             
         except HTTPException:
@@ -450,7 +478,7 @@ class AuthController:
             
             # Add RBAC information
             rbac_role = RBACManager.get_user_role(current_user)
-            permissions = list(RBACManager.get_user_permissions(current_user))
+            permissions = RBACManager.get_user_permission_list(current_user)
             
             return {
                 "success": True,
@@ -490,7 +518,7 @@ class AuthController:
                 )
             
             # Verify current password
-            if not bcrypt.checkpw(password_request.current_password.encode('utf-8'), user["password"].encode('utf-8')):
+            if not await password_hasher.verify_password(password_request.current_password, user["password"]):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail={
@@ -510,15 +538,14 @@ class AuthController:
                 )
             
             # Hash new password
-            salt = bcrypt.gensalt(rounds=12)
-            hashed_password = bcrypt.hashpw(password_request.new_password.encode('utf-8'), salt)
+            hashed_password = await password_hasher.hash_password(password_request.new_password)
             
             # Update password
             await users_collection.update_one(
                 {"_id": ObjectId(current_user.get("id"))},
                 {
                     "$set": {
-                        "password": hashed_password.decode('utf-8'),
+                        "password": hashed_password,
                         "updated_at": datetime.utcnow()
                     }
                 }
@@ -566,11 +593,11 @@ class AuthController:
                 }
             )
     
-    def verify_token(self, token: str) -> Dict[str, Any]:
+    async def verify_token(self, token: str) -> Dict[str, Any]:
         """Verify JWT token"""
         try:
             # Check if token is blacklisted
-            if session_manager.is_access_token_blacklisted(token):
+            if await session_manager.is_access_token_blacklisted(token):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail={
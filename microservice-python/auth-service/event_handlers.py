@@ -0,0 +1,76 @@
+import logging
+from typing import Dict, Any
+
+# Flexible imports
+try:
+    from ..shared.session_manager import session_manager
+    from ..shared.event_manager import event_manager
+except ImportError:
+    try:
+        from shared.session_manager import session_manager
+        from shared.event_manager import event_manager
+    except ImportError:
+        import sys
+        import os
+        current_dir = os.path.dirname(os.path.abspath(__file__))
+        parent_dir = os.path.dirname(current_dir)
+        sys.path.append(parent_dir)
+
+        from shared.session_manager import session_manager
+        from shared.event_manager import event_manager
+
+logger = logging.getLogger(__name__)
+
+class AuthEventHandler:
+    """Keep refresh-token sessions in line with user changes made by other services"""
+
+    async def handle_user_deleted(self, event_data: Dict[str, Any]):
+        """Handle user.deleted event - revoke every session so the account cannot refresh again"""
+        user_id = event_data["event_data"]["user_id"]
+        logger.info(f"🗑️ Processing user.deleted event for user: {user_id}")
+
+        if not await session_manager.revoke_all_user_tokens(user_id):
+            # Re-raise để message được requeue
+            raise Exception(f"Could not revoke sessions of deleted user {user_id}")
+
+        logger.info(f"✅ Revoked all sessions of deleted user {user_id}")
+
+    async def handle_user_updated(self, event_data: Dict[str, Any]):
+        """Handle user.updated event - refresh the role embedded in the user's sessions"""
+        user_data = event_data["event_data"]
+        if "rbac_role" not in user_data:
+            return
+
+        if not await session_manager.update_session_user(user_data["user_id"], rbac_role=user_data["rbac_role"]):
+            raise Exception(f"Could not update sessions of user {user_data['user_id']}")
+
+        logger.info(f"✅ Sessions of user {user_data['user_id']} now carry role {user_data['rbac_role']}")
+
+    async def process_event(self, message_body: Dict[str, Any]):
+        """Route events to appropriate handlers"""
+        event_type = message_body.get("event_type")
+
+        if message_body.get("source_service") == "auth-service":
+            return
+
+        if event_type == "user.deleted":
+            await self.handle_user_deleted(message_body)
+        elif event_type == "user.updated":
+            await self.handle_user_updated(message_body)
+        else:
+            logger.warning(f"⚠️ Unknown event type: {event_type}")
+
+# Singleton instance
+auth_event_handler = AuthEventHandler()
+
+async def start_event_consumer():
+    """Start consuming user events from RabbitMQ (durable queue: events wait while the service is down)"""
+    try:
+        await event_manager.consume_events(
+            queue_name="auth_service_queue",
+            routing_keys=["user.deleted", "user.updated"],
+            callback=auth_event_handler.process_event
+        )
+    except Exception as e:
+        logger.error(f"❌ Auth Service event consumer failed: {e}")
+        logger.info("⚠️ Deleted users' sessions will not be revoked until the consumer runs")
@@ -21,16 +21,32 @@ try:
     # Try relative imports first (when running as module)
     from .controllers.auth_controller import auth_controller
     from .routes.auth_routes import router as auth_router
+    from .event_handlers import start_event_consumer
     from ..shared.database import AuthDatabase
-    from ..shared.middleware import SecurityMiddleware, AuditMiddleware
+    from ..shared.middleware import SecurityASGIMiddleware, AuditASGIMiddleware
+    from ..shared.metrics import metrics
+    from ..shared.audit import audit_pipeline
+    from ..shared.token_blacklist import token_blacklist
+    from ..shared.rate_limiter import rate_limit_backend
+    from ..shared.password_hasher import password_hasher
+    from ..shared.login_guard import login_guard
+    from ..shared.session_manager import session_manager
     from ..shared.event_manager import event_manager
 except ImportError:
     try:
         # Try absolute imports from microservice-python directory
         from auth_service.controllers.auth_controller import auth_controller
         from auth_service.routes.auth_routes import router as auth_router
+        from auth_service.event_handlers import start_event_consumer
         from shared.database import AuthDatabase
-        from shared.middleware import SecurityMiddleware, AuditMiddleware
+        from shared.middleware import SecurityASGIMiddleware, AuditASGIMiddleware
+        from shared.metrics import metrics
+        from shared.audit import audit_pipeline
+        from shared.token_blacklist import token_blacklist
+        from shared.rate_limiter import rate_limit_backend
+        from shared.password_hasher import password_hasher
+        from shared.login_guard import login_guard
+        from shared.session_manager import session_manager
         from shared.event_manager import event_manager
     except ImportError:
         # Final fallback - direct imports
@@ -40,8 +56,16 @@ except ImportError:
         
         from controllers.auth_controller import auth_controller
         from routes.auth_routes import router as auth_router
+        from event_handlers import start_event_consumer
         from shared.database import AuthDatabase
-        from shared.middleware import SecurityMiddleware, AuditMiddleware
+        from shared.middleware import SecurityASGIMiddleware, AuditASGIMiddleware
+        from shared.metrics import metrics
+        from shared.audit import audit_pipeline
+        from shared.token_blacklist import token_blacklist
+        from shared.rate_limiter import rate_limit_backend
+        from shared.password_hasher import password_hasher
+        from shared.login_guard import login_guard
+        from shared.session_manager import session_manager
         from shared.event_manager import event_manager
 
 # Setup logging
@@ -59,24 +83,37 @@ async def lifespan(app: FastAPI):
     if not success:
         logger.error("❌ Failed to connect to database")
         raise Exception("Database connection failed")
+    await session_manager.ensure_indexes()
     
     # Connect to RabbitMQ for event publishing (non-blocking)
     try:
         rabbitmq_connected = await event_manager.connect()
         if rabbitmq_connected:
             logger.info("✅ RabbitMQ connected for event publishing")
+            # user.deleted / user.updated from User Service revoke or update refresh-token sessions
+            await start_event_consumer()
         else:
             logger.warning("⚠️ RabbitMQ connection failed - events will be skipped")
     except Exception as e:
         logger.error(f"⚠️ RabbitMQ connection error: {e}")
         logger.info("🚀 Auth Service will continue without event publishing")
     
+    await password_hasher.start()
+    metrics.start_loop_monitor()
+    audit_pipeline.start("auth")
+    token_blacklist.start()
     logger.info("✅ Auth Service started successfully")
     
     yield
     
     # Shutdown
     logger.info("🛑 Shutting down Auth Service...")
+    await metrics.stop_loop_monitor()
+    await audit_pipeline.stop()
+    await token_blacklist.stop()
+    await rate_limit_backend.close()
+    await password_hasher.stop()
+    await login_guard.close()
     try:
         await event_manager.disconnect()
     except Exception as e:
@@ -105,8 +142,11 @@ app.add_middleware(
 )
 
 # Security middleware
-app.middleware("http")(SecurityMiddleware.add_security_headers)
-app.middleware("http")(AuditMiddleware.audit_logger)
+app.add_middleware(SecurityASGIMiddleware)
+app.add_middleware(AuditASGIMiddleware)
+
+# Prometheus metrics (/metrics)
+metrics.setup(app, "auth")
 
 # Include routers
 app.include_router(auth_router, prefix="/api/auth", tags=["authentication"])
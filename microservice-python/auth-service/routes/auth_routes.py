@@ -24,6 +24,9 @@ try:
         auth_rate_limit
     )
     from ...shared.rbac import Permission
+    from ...shared.token_blacklist import token_blacklist
+    from ...shared.password_hasher import password_hasher
+    from ...shared.login_guard import login_guard
 except ImportError:
     # Fallback to absolute imports (when running directly)
     from controllers.auth_controller import (
@@ -44,6 +47,9 @@ except ImportError:
         auth_rate_limit
     )
     from shared.rbac import Permission
+    from shared.token_blacklist import token_blacklist
+    from shared.password_hasher import password_hasher
+    from shared.login_guard import login_guard
 
 router = APIRouter()
 
@@ -111,7 +117,7 @@ async def refresh_token(request: Request, response: Response):
         response.set_cookie(
             key="refresh_token",
             value=result["refresh_token"],
-            max_age=600,  # 10 minutes (same as refresh_expires_in)
+            max_age=result.get("refresh_expires_in", 600),
             httponly=True,
             secure=SECURE_COOKIES,
             samesite="strict"
@@ -128,7 +134,7 @@ async def refresh_token(request: Request, response: Response):
 @router.post("/verify", dependencies=[Depends(normal_rate_limit)])
 async def verify_token(token: str):
     """Verify JWT token validity"""
-    return auth_controller.verify_token(token)
+    return await auth_controller.verify_token(token)
 
 # Protected endpoints (require authentication)
 
@@ -305,6 +311,9 @@ async def auth_status():
             "rbac_enabled": True,
             "token_blacklisting": True
         },
+        "token_blacklist": token_blacklist.status(),
+        "password_hashing": password_hasher.status(),
+        "login_guard": login_guard.status(),
         "available_features": {
             "registration": True,
             "login": True,
@@ -336,7 +345,7 @@ async def rbac_info(current_user: dict = Depends(get_current_user)):
     from ...shared.rbac import RBACManager, Role, Permission
     
     user_role = RBACManager.get_user_role(current_user)
-    user_permissions = list(RBACManager.get_user_permissions(current_user))
+    user_permissions = RBACManager.get_user_permission_list(current_user)
     
     return {
         "success": True,
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Run Auth Service standalone
+
+Production settings by default (reload off, uvloop/httptools when installed).
+Tune with WORKERS, REUSE_PORT, GRACEFUL_TIMEOUT, MAX_REQUESTS...; send SIGHUP
+for a rolling worker restart. ENVIRONMENT=development (or RELOAD=true)
+runs a single auto-reloading process instead.
+"""
+
+import os
+import sys
+
+# Add current directory to Python path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, current_dir)
+
+from shared.launcher import run_service
+
+if __name__ == "__main__":
+    run_service("auth-service", port=int(os.getenv("AUTH_SERVICE_PORT", 3001)))
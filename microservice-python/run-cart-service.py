@@ -1,26 +1,21 @@
 #!/usr/bin/env python3
 """
 Run Cart Service standalone
+
+Production settings by default (reload off, uvloop/httptools when installed).
+Tune with WORKERS, REUSE_PORT, GRACEFUL_TIMEOUT, MAX_REQUESTS...; send SIGHUP
+for a rolling worker restart. ENVIRONMENT=development (or RELOAD=true)
+runs a single auto-reloading process instead.
 """
 
 import os
 import sys
-import uvicorn
 
 # Add current directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-# Set working directory to cart-service
-cart_service_dir = os.path.join(current_dir, "cart-service")
-os.chdir(cart_service_dir)
+from shared.launcher import run_service
 
 if __name__ == "__main__":
-    # Run with proper module path
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=3004,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+    run_service("cart-service", port=int(os.getenv("CART_SERVICE_PORT", 3004)))
@@ -1,26 +1,21 @@
 #!/usr/bin/env python3
 """
 Run Voucher Service standalone
+
+Production settings by default (reload off, uvloop/httptools when installed).
+Tune with WORKERS, REUSE_PORT, GRACEFUL_TIMEOUT, MAX_REQUESTS...; send SIGHUP
+for a rolling worker restart. ENVIRONMENT=development (or RELOAD=true)
+runs a single auto-reloading process instead.
 """
 
 import os
 import sys
-import uvicorn
 
 # Add current directory to Python path
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, current_dir)
 
-# Set working directory to voucher-service
-voucher_service_dir = os.path.join(current_dir, "voucher-service")
-os.chdir(voucher_service_dir)
+from shared.launcher import run_service
 
 if __name__ == "__main__":
-    # Run with proper module path
-    uvicorn.run(
-        "main:app",
-        host="0.0.0.0",
-        port=3003,
-        reload=True,
-        log_level="info"
-    ) 
\ No newline at end of file
+    run_service("voucher-service", port=int(os.getenv("VOUCHER_SERVICE_PORT", 3003)))
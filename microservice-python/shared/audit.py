@@ -0,0 +1,266 @@
+import os
+import sys
+import random
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+import orjson
+
+from .metrics import metrics
+from .database import Database
+
+logger = logging.getLogger(__name__)
+
+AUDIT_ENABLED = os.getenv("AUDIT_ENABLED", "true").lower() == "true"
+# Comma-separated: stdout, file, mongodb
+AUDIT_SINKS = os.getenv("AUDIT_SINKS", "stdout")
+# Events waiting to be flushed; new events are dropped (and counted) beyond this
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", 10000))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", 500))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", 1.0))
+# Fraction of 2xx/3xx responses recorded; 4xx/5xx are always recorded
+AUDIT_SUCCESS_SAMPLE_RATE = float(os.getenv("AUDIT_SUCCESS_SAMPLE_RATE", 1.0))
+AUDIT_FILE_PATH = os.getenv("AUDIT_FILE_PATH", "logs/audit.jsonl")
+AUDIT_FILE_MAX_BYTES = int(os.getenv("AUDIT_FILE_MAX_BYTES", 50 * 1024 * 1024))
+AUDIT_FILE_BACKUPS = int(os.getenv("AUDIT_FILE_BACKUPS", 5))
+AUDIT_MONGO_COLLECTION = os.getenv("AUDIT_MONGO_COLLECTION", "audit_logs")
+
+audit_events = metrics.counter(
+    "audit_events_total", "Audit events by outcome", ("result",))
+audit_flushes = metrics.counter(
+    "audit_sink_batches_total", "Audit batches written per sink", ("sink", "result"))
+
+
+def _serialize(events: List[Dict[str, Any]]) -> bytes:
+    """One JSON document per line"""
+    return b"".join(orjson.dumps(event, default=str, option=orjson.OPT_APPEND_NEWLINE) for event in events)
+
+
+class StdoutSink:
+    """JSON lines on standard output"""
+
+    name = "stdout"
+
+    async def write(self, events: List[Dict[str, Any]], payload: bytes):
+        await asyncio.to_thread(self._write, payload)
+
+    @staticmethod
+    def _write(payload: bytes):
+        sys.stdout.buffer.write(payload)
+        sys.stdout.buffer.flush()
+
+    async def close(self):
+        pass
+
+
+class RotatingFileSink:
+    """JSON lines in a size-rotated file (audit.jsonl, audit.jsonl.1, ...)"""
+
+    name = "file"
+
+    def __init__(self, path: str = AUDIT_FILE_PATH, max_bytes: int = AUDIT_FILE_MAX_BYTES, backups: int = AUDIT_FILE_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.stream = None
+        self.size = 0
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.stream = open(self.path, "ab")
+        self.size = self.stream.tell()
+
+    def _rotate(self):
+        self.stream.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+    def _write(self, payload: bytes):
+        if self.stream is None:
+            self._open()
+        if self.max_bytes and self.size and self.size + len(payload) > self.max_bytes:
+            self._rotate()
+        self.stream.write(payload)
+        self.stream.flush()
+        self.size += len(payload)
+
+    async def write(self, events: List[Dict[str, Any]], payload: bytes):
+        await asyncio.to_thread(self._write, payload)
+
+    async def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+
+class MongoSink:
+    """Documents in the service's own database via insert_many"""
+
+    name = "mongodb"
+
+    def __init__(self, collection_name: str = AUDIT_MONGO_COLLECTION):
+        self.collection_name = collection_name
+        self.service_name: Optional[str] = None
+
+    async def write(self, events: List[Dict[str, Any]], payload: bytes):
+        database = Database.get_database(self.service_name) if self.service_name else None
+        if database is None:
+            raise RuntimeError("database not connected")
+        # insert_many adds _id to each document; hand it copies
+        await database[self.collection_name].insert_many([dict(event) for event in events], ordered=False)
+
+    async def close(self):
+        pass
+
+
+SINK_TYPES = {"stdout": StdoutSink, "file": RotatingFileSink, "mongodb": MongoSink}
+
+
+class AuditPipeline:
+    """Bounded queue of audit events flushed in batches to the configured sinks by a background task"""
+
+    def __init__(self):
+        self.enabled = AUDIT_ENABLED
+        self.max_queue = AUDIT_QUEUE_SIZE
+        self.batch_size = max(1, AUDIT_BATCH_SIZE)
+        self.flush_interval = AUDIT_FLUSH_INTERVAL
+        self.sample_rate = AUDIT_SUCCESS_SAMPLE_RATE
+        self.sinks = []
+        for name in (sink.strip().lower() for sink in AUDIT_SINKS.split(",")):
+            if name in SINK_TYPES:
+                self.sinks.append(SINK_TYPES[name]())
+            elif name:
+                logger.warning(f"⚠️ Unknown audit sink '{name}' - ignored")
+        self.service_name: Optional[str] = None
+        self.queue: deque = deque()
+        self.wakeup: Optional[asyncio.Event] = None
+        self.task: Optional[asyncio.Task] = None
+        # Set by stop(): the flush task finishes the batch in hand, drains the queue and exits
+        self.stopping = False
+        self.stats = {"queued": 0, "sampled_out": 0, "dropped": 0, "written": 0, "sink_errors": 0}
+        metrics.gauge("audit_queue_depth", "Audit events waiting to be flushed",
+                      callback=lambda: {(): len(self.queue)})
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def sampled(self, status_code: int) -> bool:
+        """Errors are always kept; successful responses are kept at the configured rate"""
+        return status_code >= 400 or self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def admit(self, status_code: int) -> bool:
+        """Whether an event for this response will be kept; check before building it (counts sampled-out and dropped events)"""
+        if not self.enabled:
+            return False
+        if not self.running:
+            # Logged inline by enqueue()
+            return True
+        if not self.sampled(status_code):
+            self.stats["sampled_out"] += 1
+            audit_events.labels("sampled_out").inc()
+            return False
+        if len(self.queue) >= self.max_queue:
+            self.stats["dropped"] += 1
+            audit_events.labels("dropped").inc()
+            return False
+        return True
+
+    def enqueue(self, event: Dict[str, Any]):
+        """Queue an event that admit() accepted, without blocking the request"""
+        if not self.running:
+            # No flush task (app used without its lifespan): log inline as before
+            if event.get("status_code", 0) >= 400:
+                logger.warning(f"🚨 [AUDIT] {event}")
+            else:
+                logger.info(f"📝 [AUDIT] {event}")
+            return
+        event["service"] = self.service_name
+        self.queue.append(event)
+        self.stats["queued"] += 1
+        audit_events.labels("queued").inc()
+        if self.wakeup is not None and len(self.queue) >= self.batch_size:
+            self.wakeup.set()
+
+    def start(self, service_name: str):
+        """Start the flush task (call from the service lifespan once the database is connected)"""
+        if not self.enabled or self.running:
+            return
+        self.service_name = service_name
+        for sink in self.sinks:
+            if isinstance(sink, MongoSink):
+                sink.service_name = service_name
+        self.stopping = False
+        self.wakeup = asyncio.Event()
+        self.task = asyncio.create_task(self._run())
+        logger.info(f"📝 Audit pipeline started (sinks: {', '.join(sink.name for sink in self.sinks) or 'none'})")
+
+    async def stop(self):
+        """Stop the flush task and write out everything still queued"""
+        if self.task is not None:
+            # Not cancelled: a batch already taken off the queue would be lost mid-write
+            self.stopping = True
+            self.wakeup.set()
+            try:
+                await self.task
+            except Exception as e:
+                logger.error(f"❌ Audit flush task failed: {e}")
+            self.task = None
+        while self.queue:
+            await self.flush()
+        for sink in self.sinks:
+            await sink.close()
+
+    async def _run(self):
+        while not self.stopping:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            while self.queue:
+                await self.flush()
+
+    async def flush(self):
+        """Write up to one batch to every sink; a failing sink does not block the others"""
+        count = min(len(self.queue), self.batch_size)
+        batch = [self.queue.popleft() for _ in range(count)]
+        if not batch:
+            return
+        payload = _serialize(batch)
+        for sink in self.sinks:
+            try:
+                await sink.write(batch, payload)
+                audit_flushes.labels(sink.name, "success").inc()
+            except Exception as e:
+                self.stats["sink_errors"] += 1
+                audit_flushes.labels(sink.name, "error").inc()
+                logger.error(f"❌ Audit sink {sink.name} failed to write {len(batch)} events: {e}")
+        self.stats["written"] += len(batch)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "sinks": [sink.name for sink in self.sinks],
+            "queue_depth": len(self.queue),
+            "max_queue": self.max_queue,
+            "batch_size": self.batch_size,
+            "success_sample_rate": self.sample_rate,
+            **self.stats
+        }
+
+
+# Singleton instance
+audit_pipeline = AuditPipeline()
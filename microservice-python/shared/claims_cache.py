@@ -0,0 +1,98 @@
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Verified access tokens kept per worker; least recently used entries are dropped first
+JWT_CLAIMS_CACHE_SIZE = int(os.getenv("JWT_CLAIMS_CACHE_SIZE", 10000))
+# Upper bound on how long an entry lives when the token has no (or a very distant) exp
+JWT_CLAIMS_CACHE_MAX_TTL = float(os.getenv("JWT_CLAIMS_CACHE_MAX_TTL", 300))
+
+cache_lookups = metrics.counter(
+    "jwt_claims_cache_lookups_total", "Verified-claims cache lookups", ("result",))
+
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode("utf-8")).digest()
+
+
+class ClaimsCache:
+    """Bounded LRU of token digest -> verified user data, each entry expiring with its token"""
+
+    def __init__(self, max_entries: int = JWT_CLAIMS_CACHE_SIZE, max_ttl: float = JWT_CLAIMS_CACHE_MAX_TTL):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        # digest -> (expires_at epoch seconds, user data)
+        self.entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0}
+        metrics.gauge("jwt_claims_cache_entries", "Entries in the verified-claims cache",
+                      callback=lambda: {(): len(self.entries)})
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached user data, or None if absent or expired"""
+        if not self.enabled:
+            return None
+        digest = token_digest(token)
+        entry = self.entries.get(digest)
+        if entry is not None and entry[0] <= time.time():
+            del self.entries[digest]
+            self.stats["expired"] += 1
+            entry = None
+        if entry is None:
+            self.stats["misses"] += 1
+            cache_lookups.labels("miss").inc()
+            return None
+
+        self.entries.move_to_end(digest)
+        self.stats["hits"] += 1
+        cache_lookups.labels("hit").inc()
+        user_data = dict(entry[1])
+        user_data["permissions"] = list(user_data["permissions"])
+        return user_data
+
+    def put(self, token: str, user_data: Dict[str, Any], exp: Optional[float] = None):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        cached = dict(user_data)
+        cached["permissions"] = tuple(user_data.get("permissions", ()))
+        digest = token_digest(token)
+        self.entries[digest] = (expires_at, cached)
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def invalidate(self, token: str):
+        """Forget a token (logout / blacklist) so the next request re-checks it"""
+        if self.entries.pop(token_digest(token), None) is not None:
+            self.stats["invalidated"] += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def status(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "max_ttl_seconds": self.max_ttl,
+            "hit_rate": round(self.stats["hits"] / lookups, 4) if lookups else 0.0,
+            **self.stats
+        }
+
+
+# Singleton instance
+claims_cache = ClaimsCache()
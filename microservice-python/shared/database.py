@@ -1,16 +1,31 @@
 import asyncio
 import os
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
 from pymongo.errors import ConnectionFailure
 from typing import Optional, Dict, Any
 import logging
 import urllib.parse
+from .metrics import metrics
 # Database security imports removed
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Record MongoDB command timings and failures in the metrics registry"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics.mongo_latency.labels(event.command_name).observe(event.duration_micros / 1_000_000)
+
+    def failed(self, event):
+        metrics.mongo_latency.labels(event.command_name).observe(event.duration_micros / 1_000_000)
+        metrics.mongo_failures.labels(event.command_name).inc()
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None
     databases = {}
@@ -26,7 +41,8 @@ class Database:
                 minPoolSize=1,
                 connectTimeoutMS=5000,
                 serverSelectionTimeoutMS=5000,
-                retryWrites=True
+                retryWrites=True,
+                event_listeners=[MongoCommandMetrics()]
             )
             
             # Test the connection
@@ -6,6 +6,7 @@ from datetime import datetime
 import aio_pika
 from aio_pika.abc import AbstractConnection, AbstractChannel, AbstractQueue
 import os
+from .metrics import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -51,7 +52,7 @@ class EventManager:
             await self.connection.close()
             logger.info("🔌 Disconnected from RabbitMQ")
     
-    async def publish_event(self, event_type: str, event_data: Dict[str, Any]):
+    async def publish_event(self, event_type: str, event_data: Dict[str, Any], source_service: str = "auth-service"):
         """Publish event to RabbitMQ"""
         try:
             if not self.exchange:
@@ -62,7 +63,7 @@ class EventManager:
                 "event_type": event_type,
                 "event_data": event_data,
                 "timestamp": datetime.utcnow().isoformat(),
-                "source_service": "auth-service"
+                "source_service": source_service
             }
             
             message = aio_pika.Message(
@@ -75,10 +76,12 @@ class EventManager:
             await self.exchange.publish(message, routing_key=event_type)
             
             logger.info(f"📤 Published event: {event_type}")
+            metrics.events_published.labels(event_type, "success").inc()
             return True
             
         except Exception as e:
             logger.error(f"❌ Failed to publish event {event_type}: {e}")
+            metrics.events_published.labels(event_type, "error").inc()
             return False
     
     async def consume_events(self, queue_name: str, routing_keys: list, callback: Callable):
@@ -103,6 +106,7 @@ class EventManager:
             
             # Set up consumer with better error handling
             async def message_handler(message: aio_pika.IncomingMessage):
+                body = {}
                 try:
                     async with message.process():
                         # Parse message
@@ -112,17 +116,21 @@ class EventManager:
                         
                         # Call callback function with timeout
                         await asyncio.wait_for(callback(body), timeout=30.0)
+                        metrics.events_consumed.labels(body.get("event_type", "unknown"), "success").inc()
                         
                 except asyncio.TimeoutError:
                     logger.error(f"⏰ Message processing timeout for event: {body.get('event_type', 'unknown')}")
+                    metrics.events_consumed.labels(body.get("event_type", "unknown"), "timeout").inc()
                     # Message will be requeued
                     raise
                 except json.JSONDecodeError as e:
                     logger.error(f"❌ Invalid JSON in message: {e}")
+                    metrics.events_consumed.labels("unknown", "invalid_json").inc()
                     # Don't requeue invalid JSON
                     return
                 except Exception as e:
                     logger.error(f"❌ Error processing message: {e}")
+                    metrics.events_consumed.labels(body.get("event_type", "unknown"), "error").inc()
                     # Message will be requeued due to exception
                     raise
             
@@ -0,0 +1,76 @@
+import os
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+from typing import Dict, Any, Optional
+
+from .rbac import encode_permission_mask, decode_permission_mask
+
+logger = logging.getLogger(__name__)
+
+# Header carrying the identity the API gateway verified at the edge.
+# The gateway always strips it from client requests before adding its own.
+INTERNAL_IDENTITY_HEADER = "x-internal-identity"
+IDENTITY_VERSION = "v1"
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class InternalIdentity:
+    """Sign and verify the gateway -> service identity header (HMAC-SHA256)"""
+
+    def __init__(self, key: Optional[str] = None, ttl_seconds: Optional[int] = None):
+        key = key if key is not None else os.getenv("INTERNAL_IDENTITY_KEY", "")
+        self.key = key.encode("utf-8")
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(os.getenv("INTERNAL_IDENTITY_TTL", 60))
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.key)
+
+    def _sign(self, payload: str) -> str:
+        return _b64encode(hmac.new(self.key, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def encode(self, user_id: str, username: str, rbac_role: str, permission_mask: int, token_exp: Optional[int] = None) -> str:
+        """Build a header value for a verified user"""
+        exp = int(time.time()) + self.ttl_seconds
+        if token_exp is not None:
+            exp = min(exp, int(token_exp))
+        claims = {"uid": user_id, "usr": username, "role": rbac_role, "perm": encode_permission_mask(permission_mask), "exp": exp}
+        payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return f"{IDENTITY_VERSION}.{payload}.{self._sign(payload)}"
+
+    def decode(self, value: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Return the user dict for a valid, unexpired header value, else None"""
+        if not value or not self.configured:
+            return None
+        try:
+            version, payload, signature = value.split(".")
+            if version != IDENTITY_VERSION or not hmac.compare_digest(signature, self._sign(payload)):
+                return None
+            claims = json.loads(_b64decode(payload))
+            if claims["exp"] < time.time():
+                return None
+            return {
+                "id": claims["uid"],
+                "username": claims["usr"],
+                "rbac_role": claims["role"],
+                "permission_mask": decode_permission_mask(claims["perm"]),
+                "auth_type": "gateway"
+            }
+        except Exception as e:
+            logger.warning(f"Rejected internal identity header: {e}")
+            return None
+
+
+# Singleton instance
+internal_identity = InternalIdentity()
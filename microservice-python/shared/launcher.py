@@ -0,0 +1,258 @@
+import os
+import sys
+import time
+import signal
+import socket
+import random
+import asyncio
+import logging
+import multiprocessing
+from typing import Dict, Any, List, Optional
+
+import uvicorn
+
+# Setup logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+spawn = multiprocessing.get_context("spawn")
+
+
+def _env_flag(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _available(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+class LaunchSettings:
+    """Server process settings for one service (read from environment)"""
+
+    def __init__(self, port: int):
+        self.host = os.getenv("HOST", "0.0.0.0")
+        self.port = port
+        self.reload = _env_flag("RELOAD", os.getenv("ENVIRONMENT") == "development")
+
+        workers = os.getenv("WORKERS", os.getenv("WEB_CONCURRENCY", "1")).strip().lower()
+        self.workers = (os.cpu_count() or 1) if workers == "auto" else max(1, int(workers))
+        # Each worker binds its own listening socket and the kernel spreads connections across them
+        self.reuse_port = _env_flag("REUSE_PORT", self.workers > 1) and hasattr(socket, "SO_REUSEPORT")
+
+        self.loop = os.getenv("UVICORN_LOOP") or ("uvloop" if sys.platform != "win32" and _available("uvloop") else "asyncio")
+        self.http = os.getenv("UVICORN_HTTP") or ("httptools" if _available("httptools") else "h11")
+        self.log_level = os.getenv("LOG_LEVEL", "info")
+        self.access_log = _env_flag("ACCESS_LOG", True)
+        self.backlog = int(os.getenv("BACKLOG", 2048))
+        self.keepalive_timeout = int(os.getenv("KEEPALIVE_TIMEOUT", 5))
+        self.graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+        # How long a replacement worker may take to start during a rolling restart
+        self.start_timeout = int(os.getenv("WORKER_START_TIMEOUT", 60))
+        # Recycle a worker after this many requests (0 = never); jittered so workers do not restart together
+        self.max_requests = int(os.getenv("MAX_REQUESTS", 0))
+        self.max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 0))
+        limit_concurrency = int(os.getenv("LIMIT_CONCURRENCY", 0))
+        self.limit_concurrency = limit_concurrency or None
+        self.forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+    def uvicorn_options(self) -> Dict[str, Any]:
+        max_requests = None
+        if self.max_requests:
+            max_requests = self.max_requests + random.randint(0, self.max_requests_jitter)
+        return {
+            "app": "main:app",
+            "host": self.host,
+            "port": self.port,
+            "loop": self.loop,
+            "http": self.http,
+            "lifespan": "on",
+            "log_level": self.log_level,
+            "access_log": self.access_log,
+            "backlog": self.backlog,
+            "timeout_keep_alive": self.keepalive_timeout,
+            "timeout_graceful_shutdown": self.graceful_timeout,
+            "limit_max_requests": max_requests,
+            "limit_concurrency": self.limit_concurrency,
+            "proxy_headers": True,
+            "forwarded_allow_ips": self.forwarded_allow_ips,
+        }
+
+
+def bind_socket(host: str, port: int, backlog: int, reuse_port: bool) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve_worker(settings: LaunchSettings, shared_socket: Optional[socket.socket], ready):
+    """Worker process: run one uvicorn server and report once it accepts connections"""
+    if hasattr(signal, "SIGHUP"):
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    sock = shared_socket or bind_socket(settings.host, settings.port, settings.backlog, reuse_port=True)
+    config = uvicorn.Config(**settings.uvicorn_options())
+    server = uvicorn.Server(config)
+    config.setup_event_loop()
+
+    async def serve():
+        task = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started and not task.done():
+            await asyncio.sleep(0.05)
+        if server.started:
+            ready.set()
+        await task
+
+    asyncio.run(serve())
+    if not server.started:
+        sys.exit(3)
+
+
+class WorkerSupervisor:
+    """Keep N worker processes running; SIGHUP restarts them one by one without dropping the port"""
+
+    def __init__(self, name: str, settings: LaunchSettings):
+        self.name = name
+        self.settings = settings
+        self.workers: List[Any] = []
+        self.shared_socket: Optional[socket.socket] = None
+        self.stopping = False
+        self.restart_requested = False
+        self.exit_code = 0
+
+    def spawn_worker(self):
+        ready = spawn.Event()
+        process = spawn.Process(target=_serve_worker, args=(self.settings, self.shared_socket, ready))
+        process.start()
+        process.ready = ready
+        self.workers.append(process)
+        return process
+
+    def stop_worker(self, process):
+        """Ask a worker to finish in-flight requests and exit, then reap it"""
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+        process.join(self.settings.graceful_timeout + 5)
+        if process.is_alive():
+            logger.warning(f"⚠️ Worker {process.pid} did not stop in time - killing it")
+            process.kill()
+            process.join()
+        if process in self.workers:
+            self.workers.remove(process)
+
+    def wait_ready(self, process) -> bool:
+        """Wait until a new worker is serving; False if it exits or times out first"""
+        deadline = time.monotonic() + self.settings.start_timeout
+        while time.monotonic() < deadline:
+            if process.ready.wait(timeout=0.5):
+                return True
+            if not process.is_alive():
+                return False
+        return process.ready.is_set()
+
+    def rolling_restart(self):
+        """Replace workers one at a time, starting each replacement before stopping the old one"""
+        old_workers = list(self.workers)
+        logger.info(f"🔄 Restarting {len(old_workers)} {self.name} workers")
+        for index, old in enumerate(old_workers):
+            new = self.spawn_worker()
+            if not self.wait_ready(new):
+                # Bad deploy or a dependency down: keep the old workers serving
+                logger.error(f"❌ Replacement {self.name} worker failed to start - restart aborted, "
+                             f"{index} of {len(old_workers)} workers replaced")
+                self.stop_worker(new)
+                return
+            self.stop_worker(old)
+        logger.info(f"✅ {self.name} workers restarted")
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def _handle_restart(self, signum, frame):
+        self.restart_requested = True
+
+    def run(self):
+        settings = self.settings
+        if not settings.reuse_port:
+            # All workers accept on one socket bound here
+            self.shared_socket = bind_socket(settings.host, settings.port, settings.backlog, reuse_port=False)
+
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._handle_restart)
+
+        logger.info(
+            f"🚀 Starting {self.name} on {settings.host}:{settings.port} "
+            f"({settings.workers} workers, loop={settings.loop}, http={settings.http}, "
+            f"reuse_port={settings.reuse_port})"
+        )
+        for _ in range(settings.workers):
+            self.spawn_worker()
+
+        while not self.stopping:
+            time.sleep(0.5)
+            if self.restart_requested:
+                self.restart_requested = False
+                self.rolling_restart()
+                continue
+            # Replace workers that crashed or were recycled after MAX_REQUESTS
+            for process in list(self.workers):
+                if not process.is_alive():
+                    if not process.ready.is_set():
+                        # Failed during startup (e.g. database unreachable): respawning would just loop
+                        logger.error(f"❌ {self.name} worker {process.pid} failed to start - shutting down")
+                        self.workers.remove(process)
+                        self.stopping = True
+                        self.exit_code = 1
+                        break
+                    logger.warning(f"⚠️ {self.name} worker {process.pid} exited ({process.exitcode}) - replacing it")
+                    self.workers.remove(process)
+                    self.spawn_worker()
+
+        logger.info(f"🛑 Stopping {self.name} workers...")
+        for process in list(self.workers):
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        for process in list(self.workers):
+            self.stop_worker(process)
+        if self.shared_socket:
+            self.shared_socket.close()
+        return self.exit_code
+
+
+def run_service(service_dir: str, port: int):
+    """Run a service (or the gateway) from its directory with production server settings"""
+    service_path = os.path.join(ROOT_DIR, service_dir)
+    os.chdir(service_path)
+    for path in (ROOT_DIR, service_path):
+        if path not in sys.path:
+            sys.path.insert(0, path)
+
+    settings = LaunchSettings(port)
+    if settings.reload:
+        # Development: single process with auto-reload
+        uvicorn.run(
+            "main:app",
+            host=settings.host,
+            port=port,
+            reload=True,
+            reload_dirs=[service_path, os.path.join(ROOT_DIR, "shared")],
+            log_level=settings.log_level
+        )
+        return
+
+    sys.exit(WorkerSupervisor(service_dir, settings).run())
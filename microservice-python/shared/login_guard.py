@@ -0,0 +1,286 @@
+import os
+import math
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+LOGIN_GUARD_ENABLED = os.getenv("LOGIN_GUARD_ENABLED", "true").lower() == "true"
+# Failed logins allowed before backoff starts, per username and per client IP
+LOGIN_GUARD_USER_FREE_FAILURES = int(os.getenv("LOGIN_GUARD_USER_FREE_FAILURES", 5))
+LOGIN_GUARD_IP_FREE_FAILURES = int(os.getenv("LOGIN_GUARD_IP_FREE_FAILURES", 20))
+# First lockout in seconds, doubled on every further failure up to the maximum
+LOGIN_GUARD_BASE_DELAY = float(os.getenv("LOGIN_GUARD_BASE_DELAY", 1.0))
+LOGIN_GUARD_MAX_DELAY = float(os.getenv("LOGIN_GUARD_MAX_DELAY", 900.0))
+# Failures are forgotten after this long without a new one (never shorter than the maximum lockout)
+LOGIN_GUARD_WINDOW = max(float(os.getenv("LOGIN_GUARD_WINDOW", 900.0)), LOGIN_GUARD_MAX_DELAY)
+# Hard cap on tracked usernames + IPs per worker; the longest-quiet keys are dropped first
+LOGIN_GUARD_MAX_KEYS = int(os.getenv("LOGIN_GUARD_MAX_KEYS", 100000))
+
+# "memory" (per worker) or "redis" (shared by every worker and node)
+LOGIN_GUARD_BACKEND = os.getenv("LOGIN_GUARD_BACKEND", "memory").strip().lower()
+LOGIN_GUARD_REDIS_URL = os.getenv("LOGIN_GUARD_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+LOGIN_GUARD_REDIS_PREFIX = os.getenv("LOGIN_GUARD_REDIS_PREFIX", "loginguard")
+LOGIN_GUARD_REDIS_TIMEOUT = float(os.getenv("LOGIN_GUARD_REDIS_TIMEOUT", 0.1))
+LOGIN_GUARD_REDIS_RETRY_INTERVAL = float(os.getenv("LOGIN_GUARD_REDIS_RETRY_INTERVAL", 5.0))
+
+guard_rejections = metrics.counter(
+    "login_guard_rejected_total", "Logins rejected before the user lookup and bcrypt", ("scope",))
+guard_failures = metrics.counter(
+    "login_guard_failures_total", "Failed logins recorded by the login guard")
+
+
+def guard_key(scope: str, value: str) -> bytes:
+    """8-byte digest per username / IP: fixed size whatever the attacker sends"""
+    return hashlib.blake2b(f"{scope}:{value}".encode("utf-8"), digest_size=8).digest()
+
+
+def backoff(failures: int, free_failures: int) -> float:
+    """Lockout after this many failures: none for the free ones, then base, 2x base, 4x base, ..."""
+    if failures <= free_failures:
+        return 0.0
+    return min(LOGIN_GUARD_MAX_DELAY, LOGIN_GUARD_BASE_DELAY * 2 ** min(failures - free_failures - 1, 32))
+
+
+class FailureRecord:
+    """Failure count and lockout of one username or IP"""
+
+    __slots__ = ("failures", "locked_until", "last_failure")
+
+    def __init__(self):
+        self.failures = 0
+        self.locked_until = 0.0
+        self.last_failure = 0.0
+
+
+class MemoryLoginGuardBackend:
+    """Records in process memory, ordered by last failure so expired ones are always at the front"""
+
+    name = "memory"
+
+    def __init__(self, max_keys: int = LOGIN_GUARD_MAX_KEYS):
+        self.max_keys = max_keys
+        self.records: "OrderedDict[bytes, FailureRecord]" = OrderedDict()
+        self.stats = {"expired": 0, "evicted": 0}
+        metrics.gauge("login_guard_tracked_keys", "Usernames and IPs with recent failed logins",
+                      callback=lambda: {(): len(self.records)})
+
+    def _expire(self, now: float):
+        horizon = now - LOGIN_GUARD_WINDOW
+        while self.records:
+            record = next(iter(self.records.values()))
+            if record.last_failure > horizon:
+                break
+            self.records.popitem(last=False)
+            self.stats["expired"] += 1
+
+    async def locked_for(self, keys: List[bytes]) -> List[float]:
+        now = time.monotonic()
+        self._expire(now)
+        remaining = []
+        for key in keys:
+            record = self.records.get(key)
+            remaining.append(max(0.0, record.locked_until - now) if record is not None else 0.0)
+        return remaining
+
+    async def fail(self, key: bytes, free_failures: int) -> float:
+        now = time.monotonic()
+        self._expire(now)
+        record = self.records.get(key)
+        if record is None:
+            if len(self.records) >= self.max_keys:
+                self.records.popitem(last=False)
+                self.stats["evicted"] += 1
+            record = self.records[key] = FailureRecord()
+        else:
+            self.records.move_to_end(key)
+        record.failures += 1
+        record.last_failure = now
+        delay = backoff(record.failures, free_failures)
+        if delay:
+            record.locked_until = now + delay
+        return delay
+
+    async def reset(self, key: bytes):
+        self.records.pop(key, None)
+
+    async def close(self):
+        pass
+
+    def status(self) -> Dict[str, Any]:
+        return {"tracked_keys": len(self.records), "max_keys": self.max_keys, **self.stats}
+
+
+# KEYS[1] failure count, KEYS[2] lockout flag (same hash slot)
+# ARGV: free failures, base delay ms, max delay ms, window ms
+RECORD_FAILURE_SCRIPT = """
+local failures = redis.call('INCR', KEYS[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[4])
+local free = tonumber(ARGV[1])
+if failures <= free then return 0 end
+local delay = math.floor(math.min(tonumber(ARGV[3]), tonumber(ARGV[2]) * 2 ^ math.min(failures - free - 1, 32)))
+redis.call('SET', KEYS[2], 1, 'PX', delay)
+return delay
+"""
+
+
+class RedisLoginGuardBackend:
+    """Counters and lockouts in Redis: one round trip per check, one script call per failure"""
+
+    name = "redis"
+
+    def __init__(self, url: str = LOGIN_GUARD_REDIS_URL):
+        self.url = url
+        self.client = None
+        self.script = None
+        self.unavailable_until = 0.0
+        self.stats = {"store_errors": 0, "skipped": 0}
+
+    def _connect(self):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(
+            self.url,
+            socket_timeout=LOGIN_GUARD_REDIS_TIMEOUT,
+            socket_connect_timeout=LOGIN_GUARD_REDIS_TIMEOUT,
+            health_check_interval=30
+        )
+        self.script = self.client.register_script(RECORD_FAILURE_SCRIPT)
+
+    @staticmethod
+    def _keys(key: bytes):
+        base = f"{LOGIN_GUARD_REDIS_PREFIX}:{{{key.hex()}}}"
+        return f"{base}:failures", f"{base}:lock"
+
+    def _available(self) -> bool:
+        if time.monotonic() < self.unavailable_until:
+            self.stats["skipped"] += 1
+            return False
+        if self.client is None:
+            self._connect()
+        return True
+
+    def _failed(self, error: Exception):
+        self.stats["store_errors"] += 1
+        if time.monotonic() >= self.unavailable_until:
+            logger.error(f"❌ Login guard store unavailable ({type(error).__name__}: {error}) - not blocking logins")
+        self.unavailable_until = time.monotonic() + LOGIN_GUARD_REDIS_RETRY_INTERVAL
+
+    async def locked_for(self, keys: List[bytes]) -> List[float]:
+        # The guard only saves work: while the store is down every login goes through
+        try:
+            if not self._available():
+                return [0.0] * len(keys)
+            async with self.client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.pttl(self._keys(key)[1])
+                remaining = await pipe.execute()
+        except Exception as e:
+            self._failed(e)
+            return [0.0] * len(keys)
+        return [max(0, ttl) / 1000 for ttl in remaining]
+
+    async def fail(self, key: bytes, free_failures: int) -> float:
+        try:
+            if not self._available():
+                return 0.0
+            delay_ms = await self.script(
+                keys=list(self._keys(key)),
+                args=[free_failures, int(LOGIN_GUARD_BASE_DELAY * 1000), int(LOGIN_GUARD_MAX_DELAY * 1000),
+                      int(LOGIN_GUARD_WINDOW * 1000)]
+            )
+        except Exception as e:
+            self._failed(e)
+            return 0.0
+        return int(delay_ms) / 1000
+
+    async def reset(self, key: bytes):
+        try:
+            if self._available():
+                await self.client.delete(*self._keys(key))
+        except Exception as e:
+            self._failed(e)
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "url": self.url.split("@")[-1],
+            "available": time.monotonic() >= self.unavailable_until,
+            **self.stats
+        }
+
+
+def create_backend(name: str = LOGIN_GUARD_BACKEND):
+    if name == "redis":
+        return RedisLoginGuardBackend()
+    if name != "memory":
+        logger.warning(f"⚠️ Unknown LOGIN_GUARD_BACKEND '{name}' - using memory")
+    return MemoryLoginGuardBackend()
+
+
+class LoginGuard:
+    """Per-username and per-IP failed-login backoff, checked before the user lookup and bcrypt"""
+
+    def __init__(self, enabled: bool = LOGIN_GUARD_ENABLED):
+        self.enabled = enabled
+        self.backend = create_backend()
+        self.stats = {"checked": 0, "rejected_user": 0, "rejected_ip": 0, "failures": 0, "lockouts": 0}
+
+    async def check(self, username: str, client_ip: str) -> int:
+        """Seconds until this login may be attempted again, 0 if it may go ahead"""
+        if not self.enabled:
+            return 0
+        self.stats["checked"] += 1
+        user_wait, ip_wait = await self.backend.locked_for([guard_key("user", username), guard_key("ip", client_ip)])
+        if not user_wait and not ip_wait:
+            return 0
+        scope = "user" if user_wait >= ip_wait else "ip"
+        self.stats[f"rejected_{scope}"] += 1
+        guard_rejections.labels(scope).inc()
+        return max(1, math.ceil(max(user_wait, ip_wait)))
+
+    async def record_failure(self, username: str, client_ip: str):
+        if not self.enabled:
+            return
+        self.stats["failures"] += 1
+        guard_failures.inc()
+        user_delay = await self.backend.fail(guard_key("user", username), LOGIN_GUARD_USER_FREE_FAILURES)
+        ip_delay = await self.backend.fail(guard_key("ip", client_ip), LOGIN_GUARD_IP_FREE_FAILURES)
+        if user_delay or ip_delay:
+            self.stats["lockouts"] += 1
+
+    async def record_success(self, username: str):
+        """A correct password clears the username's failures (the IP's decay on their own)"""
+        if self.enabled:
+            await self.backend.reset(guard_key("user", username))
+
+    async def close(self):
+        await self.backend.close()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "backend": self.backend.name,
+            "user_free_failures": LOGIN_GUARD_USER_FREE_FAILURES,
+            "ip_free_failures": LOGIN_GUARD_IP_FREE_FAILURES,
+            "base_delay_seconds": LOGIN_GUARD_BASE_DELAY,
+            "max_delay_seconds": LOGIN_GUARD_MAX_DELAY,
+            "window_seconds": LOGIN_GUARD_WINDOW,
+            # Each rejection is a user lookup and a bcrypt verification that did not run
+            "saved_verifications": self.stats["rejected_user"] + self.stats["rejected_ip"],
+            "store": self.backend.status(),
+            **self.stats
+        }
+
+
+# Singleton instance
+login_guard = LoginGuard()
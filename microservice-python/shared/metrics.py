@@ -0,0 +1,353 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from typing import Dict, Any, List, Tuple, Optional, Callable
+
+from fastapi import FastAPI
+from fastapi.responses import Response
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PATH = os.getenv("METRICS_PATH", "/metrics")
+LOOP_LAG_INTERVAL = float(os.getenv("METRICS_LOOP_LAG_INTERVAL", 0.5))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class for a metric family with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], Any] = {}
+        self.lock = threading.Lock()
+        if not self.labelnames:
+            self.children[()] = self._new_child()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """Return the child for one combination of label values"""
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self.lock:
+                child = self.children.setdefault(key, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self.children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"]
+
+
+class _Value:
+    __slots__ = ("value", "lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self.lock:
+            self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    """Monotonic counter"""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be read from a callback at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self.children[()].inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self.children[()].dec(amount)
+
+    def set(self, value: float):
+        self.children[()].set(value)
+
+    def render(self) -> List[str]:
+        if self.callback is None:
+            return super().render()
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        try:
+            samples = self.callback()
+        except Exception as e:
+            logger.error(f"❌ Metric callback for {self.name} failed: {e}")
+            samples = {}
+        for values, value in samples.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(value)}")
+        return lines
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count", "lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self.lock:
+            self.sum += value
+            self.count += 1
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+
+class Histogram(_Metric):
+    """Cumulative histogram with fixed upper bounds"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self.children[()].observe(value)
+
+    def _render_child(self, values: Tuple[str, ...], child) -> List[str]:
+        lines = []
+        cumulative = 0
+        for bound, count in zip(child.buckets, child.counts):
+            cumulative += count
+            le = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{le} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        inf = _format_labels(self.labelnames, values, 'le="+Inf"')
+        lines.append(f"{self.name}_bucket{inf} {child.count}")
+        lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+        lines.append(f"{self.name}_count{labels} {child.count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-wide metric families rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, _Metric] = {}
+        self.service_name = "unknown"
+        self.started_at = time.time()
+        self.loop_lag_task: Optional[asyncio.Task] = None
+        self.route_templates: Dict[Any, str] = {}
+
+        # HTTP server side (every service)
+        self.http_requests = self.counter(
+            "http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+        self.http_latency = self.histogram(
+            "http_request_duration_seconds", "Time until response headers were sent", ("method", "route"))
+        self.http_in_flight = self.gauge(
+            "http_requests_in_flight", "HTTP requests currently being handled")
+
+        # MongoDB
+        self.mongo_latency = self.histogram(
+            "mongodb_command_duration_seconds", "MongoDB command round-trip time", ("command",))
+        self.mongo_failures = self.counter(
+            "mongodb_command_failures_total", "MongoDB commands that failed", ("command",))
+
+        # RabbitMQ
+        self.events_published = self.counter(
+            "rabbitmq_events_published_total", "Events published to RabbitMQ", ("event_type", "result"))
+        self.events_consumed = self.counter(
+            "rabbitmq_events_consumed_total", "Events consumed from RabbitMQ", ("event_type", "result"))
+
+        # Runtime
+        self.loop_lag = self.histogram(
+            "event_loop_lag_seconds", "Delay between a scheduled wake-up and the actual one",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+        self.gauge("process_uptime_seconds", "Seconds since the service started",
+                   callback=lambda: {(): time.time() - self.started_at})
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+              callback: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def uptime_seconds(self) -> float:
+        return time.time() - self.started_at
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    # Event loop lag
+
+    def start_loop_monitor(self):
+        """Sample event loop lag in the background (call from a running loop)"""
+        if self.loop_lag_task is None or self.loop_lag_task.done():
+            self.loop_lag_task = asyncio.create_task(self._monitor_loop_lag())
+
+    async def stop_loop_monitor(self):
+        if self.loop_lag_task:
+            self.loop_lag_task.cancel()
+            try:
+                await self.loop_lag_task
+            except asyncio.CancelledError:
+                pass
+            self.loop_lag_task = None
+
+    async def _monitor_loop_lag(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + LOOP_LAG_INTERVAL
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.loop_lag.observe(max(0.0, loop.time() - expected))
+
+    # HTTP
+
+    def route_template(self, scope) -> str:
+        """Matched route path (e.g. /api/vouchers/{voucher_id}) to keep label cardinality bounded"""
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        template = self.route_templates.get(endpoint)
+        if template is None:
+            template = "unmatched"
+            for route in scope["app"].routes:
+                if getattr(route, "endpoint", None) is endpoint:
+                    template = route.path
+                    break
+            self.route_templates[endpoint] = template
+        return template
+
+    def setup(self, app: FastAPI, service_name: str):
+        """Mount /metrics and the request-tracking middleware on a service"""
+        self.service_name = service_name
+        if not METRICS_ENABLED:
+            return
+        # Each worker process keeps its own registry; the pid label tells scrapes apart
+        self.gauge("service_info", "Service metadata", ("service", "pid"),
+                   callback=lambda: {(self.service_name, os.getpid()): 1})
+        app.add_middleware(RequestMetricsMiddleware, registry=self)
+
+        @app.get(METRICS_PATH, include_in_schema=False)
+        async def prometheus_metrics():
+            """Prometheus scrape endpoint"""
+            return Response(content=self.render(), media_type=CONTENT_TYPE)
+
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware recording request counts, latency and in-flight requests"""
+
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] == METRICS_PATH:
+            await self.app(scope, receive, send)
+            return
+
+        registry = self.registry
+        start_time = time.perf_counter()
+        latency = None
+        status_code = 500
+
+        async def send_tracking_status(message):
+            nonlocal latency, status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                latency = time.perf_counter() - start_time
+            await send(message)
+
+        registry.http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_tracking_status)
+        finally:
+            registry.http_in_flight.dec()
+            if latency is None:
+                latency = time.perf_counter() - start_time
+            route = registry.route_template(scope)
+            registry.http_latency.labels(scope["method"], route).observe(latency)
+            registry.http_requests.labels(scope["method"], route, status_code).inc()
+
+
+# Singleton instances
+metrics = MetricsRegistry()
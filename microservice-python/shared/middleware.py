@@ -9,8 +9,12 @@ from datetime import datetime, timedelta
 import os
 import jwt
 from .models.user import User
-from .session_manager import session_manager
-from .rbac import RBACManager, Permission
+from .session_manager import session_manager, ACCESS_TOKEN_TTL
+from .rbac import RBACManager, Permission, mask_to_permissions
+from .identity import internal_identity, INTERNAL_IDENTITY_HEADER
+from .rate_limiter import get_rate_limiter, RateLimitUnavailable
+from .claims_cache import claims_cache
+from .audit import audit_pipeline
 
 # Setup logging
 logger = logging.getLogger(__name__)
@@ -18,8 +22,14 @@ logger = logging.getLogger(__name__)
 # Security
 security = HTTPBearer(auto_error=False)
 
-# Rate limiting storage (in production, use Redis)
-rate_limit_storage: Dict[str, List[float]] = {}
+# Accept identities already verified by the API gateway (requires INTERNAL_IDENTITY_KEY)
+TRUST_GATEWAY_IDENTITY = os.getenv("TRUST_GATEWAY_IDENTITY", "false").lower() == "true" and internal_identity.configured
+
+def get_gateway_identity(request: Optional[Request]) -> Optional[Dict[str, Any]]:
+    """Return the user verified by the gateway for this request, if trusted"""
+    if not TRUST_GATEWAY_IDENTITY or request is None:
+        return None
+    return internal_identity.decode(request.headers.get(INTERNAL_IDENTITY_HEADER))
 
 class SecurityMiddleware:
     """Security headers and general security middleware"""
@@ -39,41 +49,45 @@ class RateLimitMiddleware:
     """Rate limiting middleware"""
     
     @staticmethod
-    def create_rate_limiter(max_requests: int = 100, window_minutes: int = 15, message: str = "Rate limit exceeded"):
-        """Create a rate limiter function"""
+    def create_rate_limiter(max_requests: int = 100, window_minutes: int = 15, message: str = "Rate limit exceeded", namespace: Optional[str] = None):
+        """Create a rate limiter function (each namespace counts requests separately)"""
+        limiter = get_rate_limiter(namespace or f"{max_requests}/{window_minutes}m", max_requests, window_minutes * 60)
         
-        def rate_limiter(request: Request) -> bool:
-            client_ip = request.client.host
-            
-            current_time = time.time()
-            window_start = current_time - (window_minutes * 60)
-            
-            # Initialize storage for key if not exists
-            if client_ip not in rate_limit_storage:
-                rate_limit_storage[client_ip] = []
-            
-            # Remove old requests outside the window
-            rate_limit_storage[client_ip] = [
-                req_time for req_time in rate_limit_storage[client_ip] 
-                if req_time > window_start
-            ]
+        async def rate_limiter(request: Request) -> bool:
+            client_ip = request.client.host if request.client else "unknown"
             
-            # Check if limit exceeded
-            if len(rate_limit_storage[client_ip]) >= max_requests:
-                raise HTTPException(
-                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                    detail={
-                        "success": False,
-                        "message": message,
-                        "retry_after": window_minutes * 60
-                    }
-                )
-            
-            # Add current request
-            rate_limit_storage[client_ip].append(current_time)
+            rejection = await RateLimitMiddleware.check(limiter, client_ip, message)
+            if rejection is not None:
+                raise rejection
             return True
             
         return rate_limiter
+    
+    @staticmethod
+    async def check(limiter, client_ip: str, message: str) -> Optional[HTTPException]:
+        """Count a request; return the error to answer with, or None if it may proceed"""
+        try:
+            allowed, remaining, retry_after = await limiter.hit(client_ip)
+        except RateLimitUnavailable:
+            return HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail={
+                    "success": False,
+                    "message": "Rate limiting temporarily unavailable"
+                },
+                headers={"Retry-After": "1"}
+            )
+        if not allowed:
+            return HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail={
+                    "success": False,
+                    "message": message,
+                    "retry_after": retry_after
+                },
+                headers={"Retry-After": str(retry_after)}
+            )
+        return None
 
 class AuthMiddleware:
     """Enhanced JWT Authentication middleware with session management"""
@@ -84,6 +98,13 @@ class AuthMiddleware:
     
     async def verify_jwt_token(self, request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)):
         """Verify JWT token with blacklist checking"""
+        # The gateway already verified the token and checked the blacklist
+        identity = get_gateway_identity(request)
+        if identity is not None:
+            identity["rbac_role"] = RBACManager.get_user_role(identity)
+            identity["permissions"] = list(mask_to_permissions(identity.pop("permission_mask")))
+            return identity
+        
         try:
             if not credentials or not credentials.credentials:
                 raise HTTPException(
@@ -97,7 +118,7 @@ class AuthMiddleware:
             token = credentials.credentials
             
             # Check if token is blacklisted
-            if session_manager.is_access_token_blacklisted(token):
+            if await session_manager.is_access_token_blacklisted(token):
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail={
@@ -109,26 +130,7 @@ class AuthMiddleware:
                 )
             
             try:
-                # Decode JWT token
-                payload = jwt.decode(token, self.jwt_secret, algorithms=[self.jwt_algorithm])
-                
-                # Check token expiration
-                if "exp" in payload:
-                    if datetime.utcfromtimestamp(payload["exp"]) < datetime.utcnow():
-                        raise jwt.ExpiredSignatureError()
-                
-                user_data = {
-                    "id": payload.get("user_id"),
-                    "username": payload.get("username"),
-                    "rbac_role": payload.get("rbac_role", "USER"),
-                    "auth_type": "jwt"
-                }
-                
-                # Add RBAC info
-                user_data["rbac_role"] = RBACManager.get_user_role(user_data)
-                user_data["permissions"] = list(RBACManager.get_user_permissions(user_data))
-                
-                return user_data
+                return self.decode_access_token(token)
                 
             except jwt.ExpiredSignatureError:
                 raise HTTPException(
@@ -165,13 +167,42 @@ class AuthMiddleware:
                 }
             )
     
+    def decode_access_token(self, token: str, cache: bool = True) -> Dict[str, Any]:
+        """Verify an access token and build its user data (cached until the token expires)"""
+        user_data = claims_cache.get(token)
+        if user_data is not None:
+            return user_data
+        
+        # Decode JWT token
+        payload = jwt.decode(token, self.jwt_secret, algorithms=[self.jwt_algorithm])
+        
+        # Check token expiration
+        if "exp" in payload:
+            if datetime.utcfromtimestamp(payload["exp"]) < datetime.utcnow():
+                raise jwt.ExpiredSignatureError()
+        
+        user_data = {
+            "id": payload.get("user_id"),
+            "username": payload.get("username"),
+            "rbac_role": payload.get("rbac_role", "USER"),
+            "auth_type": "jwt"
+        }
+        
+        # Add RBAC info
+        user_data["rbac_role"] = RBACManager.get_user_role(user_data)
+        user_data["permissions"] = RBACManager.get_user_permission_list(user_data)
+        
+        if cache:
+            claims_cache.put(token, user_data, payload.get("exp"))
+        return user_data
+    
     def generate_jwt_token(self, user_data: Dict[str, Any], expires_delta: Optional[timedelta] = None) -> str:
         """Generate JWT token"""
         try:
             if expires_delta:
                 expire = datetime.utcnow() + expires_delta
             else:
-                expire = datetime.utcnow() + timedelta(seconds=45)  # Default to 45 seconds (30s + 15s grace)
+                expire = datetime.utcnow() + timedelta(seconds=ACCESS_TOKEN_TTL)  # Session prompt + grace for user decision
             
             payload = {
                 "user_id": user_data.get("user_id"),
@@ -258,10 +289,8 @@ class AuditMiddleware:
     """Enhanced audit logging middleware"""
     
     @staticmethod
-    async def audit_logger(request: Request, call_next):
-        """Log requests for audit purposes with RBAC info"""
-        start_time = time.time()
-        
+    def user_info(request: Request) -> Dict[str, Any]:
+        """Who made the request, as far as the audit log is concerned"""
         # Extract user info if available
         user_info = {
             "type": "anonymous",
@@ -271,55 +300,159 @@ class AuditMiddleware:
         }
         
         try:
+            identity = get_gateway_identity(request)
             auth_header = request.headers.get("authorization")
-            if auth_header and auth_header.startswith("Bearer "):
+            if identity is not None:
+                user_info = {
+                    "type": "authenticated",
+                    "id": identity["id"],
+                    "username": identity["username"],
+                    "rbac_role": identity["rbac_role"]
+                }
+            elif auth_header and auth_header.startswith("Bearer "):
                 token = auth_header.split(" ")[1]
                 
-                # Try to decode token for audit purposes (don't fail if invalid)
+                # Try to decode token for audit purposes (don't fail if invalid).
+                # Shares the verified-claims cache, so the auth dependency does not decode it again.
                 try:
-                    payload = jwt.decode(
-                        token, 
-                        os.getenv("JWT_ACCESS_KEY", "your-secret-key"), 
-                        algorithms=["HS256"]
+                    user_data = auth_middleware.decode_access_token(
+                        token,
+                        cache=not session_manager.blacklisted_tokens.might_contain(token)
                     )
                     user_info = {
                         "type": "authenticated",
-                        "id": payload.get("user_id"),
-                        "username": payload.get("username"),
-                        "rbac_role": payload.get("rbac_role", "USER")
+                        "id": user_data["id"],
+                        "username": user_data["username"],
+                        "rbac_role": user_data["rbac_role"]
                     }
                 except:
                     user_info["type"] = "invalid_token"
         except:
             pass
         
-        log_data = {
-            "timestamp": datetime.utcnow().isoformat(),
+        return user_info
+    
+    @staticmethod
+    def build_event(request: Request, timestamp: datetime, status_code: int, process_time: float) -> Dict[str, Any]:
+        return {
+            "timestamp": timestamp,
             "method": request.method,
-            "path": str(request.url.path),
+            "path": request.scope["path"],
             "query_params": dict(request.query_params),
-            "ip": request.client.host,
+            "ip": request.client.host if request.client else None,
             "user_agent": request.headers.get("user-agent"),
-            "user": user_info
+            "user": AuditMiddleware.user_info(request),
+            "status_code": status_code,
+            "process_time": round(process_time, 4)
         }
+    
+    @staticmethod
+    async def audit_logger(request: Request, call_next):
+        """Queue an audit event with RBAC info for every request"""
+        timestamp = datetime.utcnow()
+        start_time = time.perf_counter()
         
         response = await call_next(request)
         
-        # Add response info
-        process_time = time.time() - start_time
-        log_data.update({
-            "status_code": response.status_code,
-            "process_time": round(process_time, 4)
-        })
-        
-        # Log with different levels based on status
-        if response.status_code >= 400:
-            logger.warning(f"🚨 [AUDIT] {log_data}")
-        else:
-            logger.info(f"📝 [AUDIT] {log_data}")
+        # Sampled-out and dropped events are never built; the rest are serialized off the request path
+        if audit_pipeline.admit(response.status_code):
+            audit_pipeline.enqueue(
+                AuditMiddleware.build_event(request, timestamp, response.status_code, time.perf_counter() - start_time)
+            )
         
         return response
 
+# Pure ASGI middleware: no BaseHTTPMiddleware task/stream wrapping, streaming responses pass through
+
+# Precomputed raw headers added to every response by SecurityASGIMiddleware
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+    (b"x-session-security", b"jwt-authentication-with-refresh"),
+]
+SECURITY_HEADER_NAMES = frozenset(name for name, _ in SECURITY_HEADERS)
+
+class SecurityASGIMiddleware:
+    """Security headers (same as SecurityMiddleware.add_security_headers) as pure ASGI middleware"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = [header for header in message.get("headers", ()) if header[0].lower() not in SECURITY_HEADER_NAMES]
+                headers.extend(SECURITY_HEADERS)
+                message["headers"] = headers
+            await send(message)
+        
+        await self.app(scope, receive, send_with_headers)
+
+class AuditASGIMiddleware:
+    """Audit events (same as AuditMiddleware.audit_logger) as pure ASGI middleware"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        timestamp = datetime.utcnow()
+        start_time = time.perf_counter()
+        status_code = 500
+        
+        async def send_tracking_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_tracking_status)
+        finally:
+            # Timed until the handler finished sending; the body itself is never buffered.
+            # Sampled-out and dropped events are never built (no Request, no token decode)
+            if audit_pipeline.admit(status_code):
+                audit_pipeline.enqueue(
+                    AuditMiddleware.build_event(Request(scope), timestamp, status_code, time.perf_counter() - start_time)
+                )
+
+class RateLimitASGIMiddleware:
+    """One named rate limit applied to every request before routing, as pure ASGI middleware"""
+    
+    def __init__(self, app, max_requests: int = 100, window_minutes: int = 15, message: str = "Rate limit exceeded",
+                 namespace: str = "global", exempt_paths: tuple = ("/health", "/metrics")):
+        self.app = app
+        self.limiter = get_rate_limiter(namespace, max_requests, window_minutes * 60)
+        self.message = message
+        self.exempt_paths = tuple(exempt_paths)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exempt_paths):
+            await self.app(scope, receive, send)
+            return
+        
+        client = scope.get("client")
+        rejection = await RateLimitMiddleware.check(self.limiter, client[0] if client else "unknown", self.message)
+        if rejection is None:
+            await self.app(scope, receive, send)
+            return
+        
+        response = JSONResponse(
+            status_code=rejection.status_code,
+            content={"detail": rejection.detail},
+            headers=rejection.headers
+        )
+        await response(scope, receive, send)
+
 # Dependency functions
 auth_middleware = AuthMiddleware()
 
@@ -328,13 +461,12 @@ async def get_current_user(user: Dict[str, Any] = Depends(auth_middleware.verify
     """Get current authenticated user with RBAC info"""
     return user
 
-async def get_current_user_optional(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[Dict[str, Any]]:
+async def get_current_user_optional(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[Dict[str, Any]]:
     """Get current user if authenticated, None otherwise"""
     if not credentials:
         return None
     
     try:
-        request = None  # Mock request for now
         return await auth_middleware.verify_jwt_token(request, credentials)
     except:
         return None
@@ -373,7 +505,7 @@ def require_permission_dep(permission: Permission):
     return check_permission
 
 # Rate limiting dependencies with different levels
-strict_rate_limit = RateLimitMiddleware.create_rate_limiter(10, 15, "Strict API rate limit exceeded")
-normal_rate_limit = RateLimitMiddleware.create_rate_limiter(50, 15, "API rate limit exceeded")
-public_rate_limit = RateLimitMiddleware.create_rate_limiter(100, 15, "Public API rate limit exceeded")
-auth_rate_limit = RateLimitMiddleware.create_rate_limiter(5, 15, "Authentication rate limit exceeded")
\ No newline at end of file
+strict_rate_limit = RateLimitMiddleware.create_rate_limiter(10, 15, "Strict API rate limit exceeded", "strict")
+normal_rate_limit = RateLimitMiddleware.create_rate_limiter(50, 15, "API rate limit exceeded", "normal")
+public_rate_limit = RateLimitMiddleware.create_rate_limiter(100, 15, "Public API rate limit exceeded", "public")
+auth_rate_limit = RateLimitMiddleware.create_rate_limiter(5, 15, "Authentication rate limit exceeded", "auth")
\ No newline at end of file
@@ -30,6 +30,12 @@ class RefreshToken(BaseModel):
     is_revoked: bool = Field(default=False, alias="isRevoked")
     device_info: Optional[str] = Field(None, alias="deviceInfo")
     ip_address: Optional[str] = Field(None, alias="ipAddress")
+    # Embedded at login so rotation does not need the users collection
+    username: Optional[str] = None
+    rbac_role: Optional[str] = Field(None, alias="rbacRole")
+    rotated_at: Optional[datetime] = Field(None, alias="rotatedAt")
+    # Token this one replaced, still answered with this one for REFRESH_GRACE_SECONDS
+    previous_token: Optional[str] = Field(None, alias="previousToken")
 
 class RefreshTokenCreate(BaseModel):
     token: str
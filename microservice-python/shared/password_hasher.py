@@ -0,0 +1,260 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+import bcrypt
+from fastapi import HTTPException, status
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# "thread" (bcrypt releases the GIL while hashing) or "process"
+PASSWORD_HASH_POOL = os.getenv("PASSWORD_HASH_POOL", "thread").strip().lower()
+# Hashes running at once; more than the CPU count only makes each one slower
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+# Hashes allowed to wait for a worker; beyond this requests are rejected with 503 straight away
+PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 16))
+# bcrypt cost for new hashes, or "auto" to calibrate against PASSWORD_HASH_TARGET_MS at startup
+PASSWORD_HASH_ROUNDS = os.getenv("PASSWORD_HASH_ROUNDS", "12").strip().lower()
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", 250))
+PASSWORD_HASH_MIN_ROUNDS = int(os.getenv("PASSWORD_HASH_MIN_ROUNDS", 10))
+PASSWORD_HASH_MAX_ROUNDS = int(os.getenv("PASSWORD_HASH_MAX_ROUNDS", 16))
+# Stored hashes above the current cost are only re-hashed down when this is enabled
+PASSWORD_HASH_ALLOW_DOWNGRADE = os.getenv("PASSWORD_HASH_ALLOW_DOWNGRADE", "false").lower() == "true"
+
+DEFAULT_ROUNDS = 12
+CALIBRATION_BASE_ROUNDS = 8
+
+HASH_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+hash_queue_wait = metrics.histogram(
+    "password_hash_queue_wait_seconds", "Time a password hash waited for a worker", ("operation",),
+    buckets=(0.001,) + HASH_BUCKETS)
+hash_duration = metrics.histogram(
+    "password_hash_duration_seconds", "bcrypt time per password hash", ("operation",), buckets=HASH_BUCKETS)
+hash_rejections = metrics.counter(
+    "password_hash_rejected_total", "Password hashes rejected because the pool was saturated", ("operation",))
+
+
+class PasswordHasherBusy(HTTPException):
+    """Every worker is busy and the wait queue is full"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail={
+                "success": False,
+                "message": "Hệ thống đang bận, vui lòng thử lại sau!"
+            },
+            headers={"Retry-After": "1"}
+        )
+
+
+# Module-level so a process pool can pickle them; each returns (started, finished, result)
+
+def _hash(password: bytes, rounds: int):
+    started = time.monotonic()
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+    return started, time.monotonic(), hashed
+
+
+def _check(password: bytes, hashed: bytes):
+    started = time.monotonic()
+    matches = bcrypt.checkpw(password, hashed)
+    return started, time.monotonic(), matches
+
+
+def measure_cost(rounds: int, samples: int = 1) -> float:
+    """Fastest of `samples` hashes at this cost, in seconds"""
+    best = float("inf")
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.hashpw(b"calibration-password", bcrypt.gensalt(rounds=rounds))
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def calibrate_rounds(target_ms: float = PASSWORD_HASH_TARGET_MS, min_rounds: int = PASSWORD_HASH_MIN_ROUNDS,
+                     max_rounds: int = PASSWORD_HASH_MAX_ROUNDS) -> Dict[str, Any]:
+    """Highest cost whose hash time stays within target_ms on this host (each extra round doubles it)"""
+    base = measure_cost(CALIBRATION_BASE_ROUNDS, samples=3)
+    rounds = CALIBRATION_BASE_ROUNDS
+    while rounds < max_rounds and base * 2 ** (rounds + 1 - CALIBRATION_BASE_ROUNDS) * 1000 <= target_ms:
+        rounds += 1
+    rounds = max(min_rounds, rounds)
+    return {
+        "rounds": rounds,
+        "target_ms": target_ms,
+        "measured_ms": round(measure_cost(rounds) * 1000, 1),
+        "base_rounds": CALIBRATION_BASE_ROUNDS,
+        "base_ms": round(base * 1000, 2),
+        "calibrated_at": time.time()
+    }
+
+
+def hash_cost(hashed: str) -> Optional[int]:
+    """Cost of a $2a$/$2b$/$2y$ bcrypt hash, None for anything else"""
+    parts = hashed.split("$")
+    if len(parts) != 4 or parts[1] not in ("2a", "2b", "2y") or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """bcrypt on a bounded worker pool, so hashing never blocks the event loop"""
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_QUEUE_SIZE,
+                 rounds: str = PASSWORD_HASH_ROUNDS, pool: str = PASSWORD_HASH_POOL):
+        if pool not in ("thread", "process"):
+            logger.warning(f"⚠️ Unknown PASSWORD_HASH_POOL '{pool}' - using thread")
+            pool = "thread"
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        self.auto_rounds = str(rounds) == "auto"
+        self.rounds = DEFAULT_ROUNDS if self.auto_rounds else int(rounds)
+        self.calibration: Optional[Dict[str, Any]] = None
+        self.pool = pool
+        self.executor: Optional[Executor] = None
+        # Submitted and not finished yet (running + waiting)
+        self.in_flight = 0
+        self.rehash_tasks = set()
+        self.stats = {"hashed": 0, "verified": 0, "rejected": 0, "errors": 0,
+                      "rehashed": 0, "rehash_skipped": 0, "rehash_failed": 0}
+        metrics.gauge("password_hash_in_flight", "Password hashes running or waiting for a worker",
+                      callback=lambda: {(): self.in_flight})
+
+    @property
+    def queued(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    def _executor(self) -> Executor:
+        if self.executor is None:
+            if self.pool == "process":
+                self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self.executor
+
+    def _release(self):
+        self.in_flight -= 1
+
+    def _released_from(self, loop: asyncio.AbstractEventLoop):
+        def callback(_):
+            try:
+                loop.call_soon_threadsafe(self._release)
+            except RuntimeError:
+                # Loop already closed (shutdown)
+                pass
+        return callback
+
+    async def _run(self, operation: str, function, *args):
+        if self.in_flight >= self.workers + self.max_queue:
+            self.stats["rejected"] += 1
+            hash_rejections.labels(operation).inc()
+            raise PasswordHasherBusy()
+
+        loop = asyncio.get_running_loop()
+        submitted = time.monotonic()
+        future = self._executor().submit(function, *args)
+        self.in_flight += 1
+        # Released when the worker is done, even if the request was cancelled meanwhile
+        future.add_done_callback(self._released_from(loop))
+        try:
+            started, finished, result = await asyncio.wrap_future(future)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        hash_queue_wait.labels(operation).observe(max(0.0, started - submitted))
+        hash_duration.labels(operation).observe(finished - started)
+        return result
+
+    async def hash_password(self, password: str) -> str:
+        hashed = await self._run("hash", _hash, password.encode("utf-8"), self.rounds)
+        self.stats["hashed"] += 1
+        return hashed.decode("utf-8")
+
+    async def verify_password(self, password: str, hashed: str) -> bool:
+        matches = await self._run("verify", _check, password.encode("utf-8"), hashed.encode("utf-8"))
+        self.stats["verified"] += 1
+        return matches
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Stored with an older bcrypt variant or a cost other than the current one"""
+        cost = hash_cost(hashed)
+        if cost is None:
+            return False
+        if not hashed.startswith("$2b$") or cost < self.rounds:
+            return True
+        return cost > self.rounds and PASSWORD_HASH_ALLOW_DOWNGRADE
+
+    def rehash_in_background(self, password: str, store: Callable[[str], Awaitable[Any]]):
+        """Hash again with the current parameters and hand the result to store(); uses idle workers only"""
+        if self.in_flight >= self.workers:
+            # Next successful login tries again
+            self.stats["rehash_skipped"] += 1
+            return
+        task = asyncio.create_task(self._rehash(password, store))
+        self.rehash_tasks.add(task)
+        task.add_done_callback(self.rehash_tasks.discard)
+
+    async def _rehash(self, password: str, store: Callable[[str], Awaitable[Any]]):
+        try:
+            await store(await self.hash_password(password))
+            self.stats["rehashed"] += 1
+        except Exception as e:
+            self.stats["rehash_failed"] += 1
+            logger.warning(f"⚠️ Background password rehash failed: {e}")
+
+    async def start(self):
+        """Calibrate the cost on this host when PASSWORD_HASH_ROUNDS=auto (call from the service lifespan)"""
+        if not self.auto_rounds:
+            return
+        loop = asyncio.get_running_loop()
+        self.calibration = await loop.run_in_executor(self._executor(), calibrate_rounds)
+        self.rounds = self.calibration["rounds"]
+        logger.info(f"🔐 bcrypt cost calibrated to {self.rounds} "
+                    f"({self.calibration['measured_ms']} ms, target {self.calibration['target_ms']} ms)")
+
+    async def stop(self):
+        for task in list(self.rehash_tasks):
+            task.cancel()
+        if self.executor is not None:
+            await asyncio.to_thread(self.executor.shutdown, wait=True, cancel_futures=True)
+            self.executor = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "pool": self.pool,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "rounds": self.rounds,
+            "rounds_source": "calibrated" if self.calibration else ("auto (pending)" if self.auto_rounds else "env"),
+            "calibration": self.calibration,
+            "allow_downgrade": PASSWORD_HASH_ALLOW_DOWNGRADE,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            **self.stats
+        }
+
+
+# Singleton instance
+password_hasher = PasswordHasher()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pick a bcrypt cost for this host")
+    parser.add_argument("--target-ms", type=float, default=PASSWORD_HASH_TARGET_MS)
+    parser.add_argument("--min-rounds", type=int, default=PASSWORD_HASH_MIN_ROUNDS)
+    parser.add_argument("--max-rounds", type=int, default=PASSWORD_HASH_MAX_ROUNDS)
+    args = parser.parse_args()
+
+    result = calibrate_rounds(args.target_ms, args.min_rounds, args.max_rounds)
+    print(f"🔐 cost {result['base_rounds']}: {result['base_ms']} ms per hash")
+    print(f"🔐 cost {result['rounds']}: {result['measured_ms']} ms per hash (target {result['target_ms']} ms)")
+    print(f"PASSWORD_HASH_ROUNDS={result['rounds']}")
@@ -0,0 +1,296 @@
+import os
+import math
+import time
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Hard cap on tracked keys per limiter; least recently seen keys are dropped first
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# How often idle keys are swept out
+RATE_LIMIT_SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", 60.0))
+
+# "memory" (per worker) or "redis" (shared by every worker and node)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+RATE_LIMIT_REDIS_PREFIX = os.getenv("RATE_LIMIT_REDIS_PREFIX", "ratelimit")
+# Per-command timeout; a slow store must not add more than this to a request
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", 0.1))
+# After a store failure, skip it for this long instead of paying the timeout on every request
+RATE_LIMIT_REDIS_RETRY_INTERVAL = float(os.getenv("RATE_LIMIT_REDIS_RETRY_INTERVAL", 5.0))
+# "open" lets requests through while the store is unreachable, "closed" rejects them with 503
+RATE_LIMIT_FAIL_MODE = os.getenv("RATE_LIMIT_FAIL_MODE", "open").strip().lower()
+
+
+class RateLimitUnavailable(Exception):
+    """The shared store could not be reached and the limiter is configured to fail closed"""
+
+
+class WindowCounter:
+    """Request counts for the current and previous fixed window of one key"""
+
+    __slots__ = ("window_start", "current", "previous", "last_seen")
+
+    def __init__(self, window_start: float, now: float):
+        self.window_start = window_start
+        self.current = 0
+        self.previous = 0
+        self.last_seen = now
+
+
+class RateLimiter:
+    """Sliding-window-counter limiter: O(1) time and memory per key, one namespace per limiter"""
+
+    def __init__(self, namespace: str, max_requests: int, window_seconds: float, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.namespace = namespace
+        self.max_requests = max_requests
+        self.window = float(window_seconds)
+        self.max_keys = max_keys
+        # Ordered by last access, so idle keys are always at the front
+        self.counters: "OrderedDict[str, WindowCounter]" = OrderedDict()
+        self.next_sweep = time.monotonic() + RATE_LIMIT_SWEEP_INTERVAL
+        self.stats = {"allowed": 0, "limited": 0, "evicted_idle": 0, "evicted_cap": 0}
+
+    def _roll(self, counter: WindowCounter, window_start: float):
+        elapsed_windows = round((window_start - counter.window_start) / self.window)
+        if elapsed_windows >= 1:
+            counter.previous = counter.current if elapsed_windows == 1 else 0
+            counter.current = 0
+            counter.window_start = window_start
+
+    def hit(self, key: str, now: Optional[float] = None) -> Tuple[bool, int, int]:
+        """Count one request for key; return (allowed, remaining, retry_after_seconds)"""
+        now = time.monotonic() if now is None else now
+        if now >= self.next_sweep:
+            self.sweep(now)
+
+        window_start = now - (now % self.window)
+        counter = self.counters.get(key)
+        if counter is None:
+            if len(self.counters) >= self.max_keys:
+                self.counters.popitem(last=False)
+                self.stats["evicted_cap"] += 1
+            counter = self.counters[key] = WindowCounter(window_start, now)
+        else:
+            self.counters.move_to_end(key)
+            self._roll(counter, window_start)
+        counter.last_seen = now
+
+        # Previous window's count weighted by how much of it the sliding window still covers
+        overlap = 1.0 - (now - window_start) / self.window
+        estimated = counter.previous * overlap + counter.current
+        if estimated >= self.max_requests:
+            self.stats["limited"] += 1
+            return False, 0, self._retry_after(counter, now, window_start)
+
+        counter.current += 1
+        self.stats["allowed"] += 1
+        return True, max(0, int(self.max_requests - estimated - 1)), 0
+
+    def _retry_after(self, counter: WindowCounter, now: float, window_start: float) -> int:
+        """Seconds until the estimated count drops below the limit again"""
+        window_end = window_start + self.window
+        if counter.current >= self.max_requests or counter.previous <= 0:
+            return max(1, math.ceil(window_end - now))
+        # previous * (1 - t / window) + current < max_requests, solved for t
+        fraction = 1.0 - (self.max_requests - counter.current) / counter.previous
+        return max(1, math.ceil(window_start + fraction * self.window - now))
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Drop keys idle for two windows (their counts can no longer matter)"""
+        now = time.monotonic() if now is None else now
+        horizon = now - 2 * self.window
+        removed = 0
+        while self.counters:
+            counter = next(iter(self.counters.values()))
+            if counter.last_seen > horizon:
+                break
+            self.counters.popitem(last=False)
+            removed += 1
+        self.stats["evicted_idle"] += removed
+        self.next_sweep = now + RATE_LIMIT_SWEEP_INTERVAL
+        return removed
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_requests": self.max_requests,
+            "window_seconds": self.window,
+            "tracked_keys": len(self.counters),
+            "max_keys": self.max_keys,
+            **self.stats
+        }
+
+
+# Same sliding-window-counter algorithm as RateLimiter, run atomically inside Redis.
+# KEYS[1] = counter hash, ARGV = max_requests, window (ms). Uses the server clock so
+# every node agrees on window boundaries. Returns {allowed, remaining, retry_after_ms}.
+SLIDING_WINDOW_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + math.floor(tonumber(clock[2]) / 1000)
+local window_start = now - (now % window)
+
+local state = redis.call('HMGET', KEYS[1], 'start', 'current', 'previous')
+local start = tonumber(state[1]) or window_start
+local current = tonumber(state[2]) or 0
+local previous = tonumber(state[3]) or 0
+if window_start > start then
+    if window_start - start == window then previous = current else previous = 0 end
+    current = 0
+    start = window_start
+end
+
+local estimated = previous * (1 - (now - window_start) / window) + current
+if estimated >= limit then
+    local retry_at = window_start + window
+    if current < limit and previous > 0 then
+        retry_at = window_start + (1 - (limit - current) / previous) * window
+    end
+    return {0, 0, math.max(1000, math.ceil(retry_at - now))}
+end
+
+current = current + 1
+redis.call('HSET', KEYS[1], 'start', start, 'current', current, 'previous', previous)
+redis.call('PEXPIRE', KEYS[1], window * 2)
+return {1, math.max(0, math.floor(limit - estimated - 1)), 0}
+"""
+
+
+class MemoryRateLimitBackend:
+    """Counters in process memory: fastest, but every worker counts separately"""
+
+    name = "memory"
+
+    def __init__(self):
+        self.limiters: Dict[str, RateLimiter] = {}
+
+    async def hit(self, namespace: str, key: str, max_requests: int, window_seconds: float) -> Tuple[bool, int, int]:
+        limiter = self.limiters.get(namespace)
+        if limiter is None:
+            limiter = self.limiters[namespace] = RateLimiter(namespace, max_requests, window_seconds)
+        return limiter.hit(key)
+
+    async def close(self):
+        pass
+
+    def status(self) -> Dict[str, Any]:
+        return {namespace: limiter.status() for namespace, limiter in self.limiters.items()}
+
+
+class RedisRateLimitBackend:
+    """Counters in Redis (or any server speaking its protocol): one script call per request"""
+
+    name = "redis"
+
+    def __init__(self, url: str = RATE_LIMIT_REDIS_URL, fail_mode: str = RATE_LIMIT_FAIL_MODE):
+        self.url = url
+        self.fail_open = fail_mode != "closed"
+        self.client = None
+        self.script = None
+        self.unavailable_until = 0.0
+        self.stats = {"allowed": 0, "limited": 0, "store_errors": 0, "failed_open": 0, "failed_closed": 0}
+
+    def _connect(self):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(
+            self.url,
+            socket_timeout=RATE_LIMIT_REDIS_TIMEOUT,
+            socket_connect_timeout=RATE_LIMIT_REDIS_TIMEOUT,
+            health_check_interval=30
+        )
+        # EVALSHA, falling back to EVAL (which caches the script) on NOSCRIPT
+        self.script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+
+    async def hit(self, namespace: str, key: str, max_requests: int, window_seconds: float) -> Tuple[bool, int, int]:
+        now = time.monotonic()
+        if now < self.unavailable_until:
+            return self._store_down(max_requests)
+        try:
+            if self.client is None:
+                self._connect()
+            allowed, remaining, retry_after_ms = await self.script(
+                keys=[f"{RATE_LIMIT_REDIS_PREFIX}:{namespace}:{key}"],
+                args=[max_requests, int(window_seconds * 1000)]
+            )
+        except Exception as e:
+            self.stats["store_errors"] += 1
+            if now >= self.unavailable_until:
+                logger.error(f"❌ Rate limit store unavailable ({type(e).__name__}: {e}) - failing {'open' if self.fail_open else 'closed'}")
+            self.unavailable_until = now + RATE_LIMIT_REDIS_RETRY_INTERVAL
+            return self._store_down(max_requests)
+
+        if allowed:
+            self.stats["allowed"] += 1
+            return True, int(remaining), 0
+        self.stats["limited"] += 1
+        return False, 0, math.ceil(int(retry_after_ms) / 1000)
+
+    def _store_down(self, max_requests: int) -> Tuple[bool, int, int]:
+        if self.fail_open:
+            self.stats["failed_open"] += 1
+            return True, max_requests, 0
+        self.stats["failed_closed"] += 1
+        raise RateLimitUnavailable("Rate limit store unavailable")
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "url": self.url.split("@")[-1],
+            "fail_mode": "open" if self.fail_open else "closed",
+            "available": time.monotonic() >= self.unavailable_until,
+            **self.stats
+        }
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND):
+    if name == "redis":
+        return RedisRateLimitBackend()
+    if name != "memory":
+        logger.warning(f"⚠️ Unknown RATE_LIMIT_BACKEND '{name}' - using memory")
+    return MemoryRateLimitBackend()
+
+
+class RateLimit:
+    """One named limit (max_requests per window) checked against the configured backend"""
+
+    def __init__(self, namespace: str, max_requests: int, window_seconds: float):
+        self.namespace = namespace
+        self.max_requests = max_requests
+        self.window = float(window_seconds)
+
+    async def hit(self, key: str) -> Tuple[bool, int, int]:
+        """Count one request for key; return (allowed, remaining, retry_after_seconds)"""
+        return await rate_limit_backend.hit(self.namespace, key, self.max_requests, self.window)
+
+
+# Singleton backend shared by every limit in this process
+rate_limit_backend = create_backend()
+
+# Limits by namespace (one per create_rate_limiter call)
+rate_limiters: Dict[str, RateLimit] = {}
+
+
+def get_rate_limiter(namespace: str, max_requests: int, window_seconds: float) -> RateLimit:
+    limiter = rate_limiters.get(namespace)
+    if limiter is None:
+        limiter = rate_limiters[namespace] = RateLimit(namespace, max_requests, window_seconds)
+    return limiter
+
+
+def rate_limit_status() -> Dict[str, Any]:
+    return {
+        "backend": rate_limit_backend.name,
+        "limits": {
+            namespace: {"max_requests": limiter.max_requests, "window_seconds": limiter.window}
+            for namespace, limiter in rate_limiters.items()
+        },
+        "store": rate_limit_backend.status()
+    }
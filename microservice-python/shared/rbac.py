@@ -1,7 +1,7 @@
 from enum import Enum
-from typing import Dict, List, Set, Optional, Callable
+from typing import Dict, List, Optional, Callable, Iterable, Union, FrozenSet, Tuple
+from functools import lru_cache
 from fastapi import HTTPException, status, Depends
-from enum import Enum
 import logging
 
 logger = logging.getLogger(__name__)
@@ -122,48 +122,126 @@ ROLE_PERMISSIONS = {
     }
 }
 
+# Compiled policy: ROLE_PERMISSIONS turned into integer bitmasks once at import time.
+# Bit positions follow Permission declaration order, so only ever append new permissions.
+PERMISSION_BITS: Dict[Permission, int] = {permission: 1 << index for index, permission in enumerate(Permission)}
+ROLE_MASKS: Dict[Role, int] = {
+    role: sum(PERMISSION_BITS[permission] for permission in permissions)
+    for role, permissions in ROLE_PERMISSIONS.items()
+}
+ROLE_PERMISSION_SETS: Dict[Role, FrozenSet[Permission]] = {
+    role: frozenset(permissions) for role, permissions in ROLE_PERMISSIONS.items()
+}
+# Same permissions in declaration order, ready to copy into a user dict
+ROLE_PERMISSION_LISTS: Dict[Role, Tuple[Permission, ...]] = {
+    role: tuple(permission for permission in Permission if permission in permissions)
+    for role, permissions in ROLE_PERMISSIONS.items()
+}
+
+# Every spelling of a role seen in tokens and the database ("USER", "user", Role.USER, ...)
+ROLE_ALIASES: Dict[str, Role] = {}
+for _role in Role:
+    for _alias in (_role.value, _role.name, _role.value.lower(), _role.name.lower()):
+        ROLE_ALIASES[_alias] = _role
+# Same keys straight to the role's mask: one dict lookup per permission check
+ROLE_ALIAS_MASKS: Dict[str, int] = {alias: ROLE_MASKS.get(role, 0) for alias, role in ROLE_ALIASES.items()}
+
+
+@lru_cache(maxsize=256)
+def _normalize_unknown_role(value: str) -> Role:
+    # Default to USER if invalid role
+    return ROLE_ALIASES.get(value.strip().lower(), Role.USER)
+
+
+def normalize_role(value: Union[str, Role, None]) -> Role:
+    """Map any spelling of a role to its Role member (unknown roles become USER)"""
+    if isinstance(value, Role):
+        return value
+    role = ROLE_ALIASES.get(value) if isinstance(value, str) else None
+    if role is not None:
+        return role
+    return _normalize_unknown_role(str(value or ""))
+
+
+def _user_mask(user: Dict) -> int:
+    rbac_role = user.get("rbac_role", "USER")
+    mask = ROLE_ALIAS_MASKS.get(rbac_role) if isinstance(rbac_role, str) else None
+    if mask is None:
+        mask = ROLE_MASKS.get(normalize_role(rbac_role), 0)
+    return mask
+
+
+def permissions_to_mask(permissions: Iterable[Permission]) -> int:
+    mask = 0
+    for permission in permissions:
+        mask |= PERMISSION_BITS[Permission(permission)]
+    return mask
+
+
+@lru_cache(maxsize=256)
+def mask_to_permissions(mask: int) -> Tuple[Permission, ...]:
+    return tuple(permission for permission, bit in PERMISSION_BITS.items() if mask & bit)
+
+
+@lru_cache(maxsize=256)
+def _any_mask(permissions: Tuple[Permission, ...]) -> int:
+    return permissions_to_mask(permissions)
+
+
+def encode_permission_mask(mask: int) -> str:
+    """Compact string form of a permission mask for a JWT claim or internal header (hex)"""
+    return format(mask, "x")
+
+
+def decode_permission_mask(value: Union[str, int]) -> int:
+    """Inverse of encode_permission_mask; plain integers are accepted as well"""
+    return value if isinstance(value, int) else int(value, 16)
+
+
 class RBACManager:
     """Role-Based Access Control Manager"""
     
     @staticmethod
     def get_user_role(user: Dict) -> Role:
         """Determine user role based on rbac_role field only"""
-        rbac_role = user.get("rbac_role", "USER")
-        try:
-            return Role(rbac_role)
-        except ValueError:
-            # Default to USER if invalid role
-            return Role.USER
+        return normalize_role(user.get("rbac_role", "USER"))
+    
+    @staticmethod
+    def get_permission_mask(user: Dict) -> int:
+        """Bitmask of every permission the user's role grants"""
+        return _user_mask(user)
     
     @staticmethod
-    def get_user_permissions(user: Dict) -> Set[Permission]:
+    def get_user_permissions(user: Dict) -> FrozenSet[Permission]:
         """Get all permissions for a user"""
-        role = RBACManager.get_user_role(user)
-        return ROLE_PERMISSIONS.get(role, set())
+        return ROLE_PERMISSION_SETS.get(RBACManager.get_user_role(user), frozenset())
+    
+    @staticmethod
+    def get_user_permission_list(user: Dict) -> List[Permission]:
+        """Get all permissions for a user as a new list (for user dicts and responses)"""
+        return list(ROLE_PERMISSION_LISTS.get(RBACManager.get_user_role(user), ()))
     
     @staticmethod
     def has_permission(user: Dict, permission: Permission) -> bool:
         """Check if user has specific permission"""
-        user_permissions = RBACManager.get_user_permissions(user)
-        return permission in user_permissions
+        return bool(_user_mask(user) & PERMISSION_BITS[permission])
     
     @staticmethod
     def has_any_permission(user: Dict, permissions: List[Permission]) -> bool:
         """Check if user has any of the specified permissions"""
-        user_permissions = RBACManager.get_user_permissions(user)
-        return any(perm in user_permissions for perm in permissions)
+        return bool(_user_mask(user) & _any_mask(tuple(permissions)))
     
     @staticmethod
     def can_access_resource(user: Dict, resource_owner_id: Optional[str], required_permission: Permission, ownership_permission: Optional[Permission] = None) -> bool:
         """Check if user can access a resource (considering ownership)"""
-        user_permissions = RBACManager.get_user_permissions(user)
+        mask = _user_mask(user)
         
         # Check if user has general permission
-        if required_permission in user_permissions:
+        if mask & PERMISSION_BITS[required_permission]:
             return True
         
         # Check ownership-based permission
-        if ownership_permission and ownership_permission in user_permissions:
+        if ownership_permission and mask & PERMISSION_BITS[ownership_permission]:
             return user.get("id") == resource_owner_id
         
         return False
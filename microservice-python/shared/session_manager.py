@@ -1,29 +1,67 @@
+import os
+import random
 import secrets
 import logging
-from typing import Dict, Any, Optional, Set
-from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
 from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
 from .database import AuthDatabase
 from .models.refresh_token import RefreshToken, RefreshTokenCreate
+from .claims_cache import claims_cache
+from .token_blacklist import token_blacklist, TokenBlacklist
+from .metrics import metrics
 
 logger = logging.getLogger(__name__)
 
+# Access-token lifetime in seconds; clients are told SESSION_PROMPT_SECONDS so they refresh (or ask
+# the user) before it runs out
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", 45))
+SESSION_PROMPT_SECONDS = min(int(os.getenv("SESSION_PROMPT_SECONDS", 30)), ACCESS_TOKEN_TTL)
+# Refresh-token lifetime in seconds (10 minutes để đủ thời gian user thao tác), renewed by every refresh
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", 600))
+# The suggested refresh time is drawn from the last REFRESH_JITTER fraction of the prompt, so sessions
+# started together stop refreshing together
+REFRESH_JITTER = min(max(float(os.getenv("REFRESH_JITTER", 0.2)), 0.0), 1.0)
+# A just-rotated refresh token still returns its successor for this many seconds (0 disables), so
+# concurrent tabs share one rotation
+REFRESH_GRACE_SECONDS = float(os.getenv("REFRESH_GRACE_SECONDS", 10))
+
+REFRESH_TOKEN_LIFETIME = timedelta(seconds=REFRESH_TOKEN_TTL)
+
+refresh_results = metrics.counter(
+    "refresh_token_rotations_total", "Refresh-token refreshes by outcome", ("result",))
+refresh_rotated = refresh_results.labels("rotated")
+refresh_reused = refresh_results.labels("grace")
+refresh_rejected = refresh_results.labels("rejected")
+
+
+def session_lifetimes() -> Dict[str, Any]:
+    """Token lifetimes for login/refresh responses, with a jittered suggested refresh time"""
+    refresh_in = SESSION_PROMPT_SECONDS * (1 - random.uniform(0, REFRESH_JITTER))
+    return {
+        "expires_in": SESSION_PROMPT_SECONDS,
+        "actual_token_expiry": ACCESS_TOKEN_TTL,
+        "refresh_in": round(refresh_in, 1),
+        "refresh_expires_in": REFRESH_TOKEN_TTL
+    }
+
 class SessionManager:
     """Session management with refresh tokens and blacklisting"""
     
     def __init__(self):
-        # In-memory blacklist for immediate token invalidation
-        # In production, use Redis for distributed systems
-        self.blacklisted_tokens: Set[str] = set()
+        # Revoked access/refresh tokens until they expire (TOKEN_BLACKLIST_BACKEND=redis shares them)
+        self.blacklisted_tokens: TokenBlacklist = token_blacklist
     
-    async def create_refresh_token(self, user_id: str, device_info: Optional[str] = None, ip_address: Optional[str] = None) -> str:
-        """Create new refresh token"""
+    async def create_refresh_token(self, user_id: str, device_info: Optional[str] = None, ip_address: Optional[str] = None,
+                                   username: Optional[str] = None, rbac_role: Optional[str] = None) -> str:
+        """Create new refresh token (username/rbac_role are embedded so rotation can skip the user lookup)"""
         try:
             # Generate secure refresh token
             refresh_token = secrets.token_urlsafe(64)
             
-            # Set expiration (10 minutes để đủ thời gian user thao tác)
-            expires_at = datetime.utcnow() + timedelta(minutes=10)
+            # Set expiration
+            expires_at = datetime.utcnow() + REFRESH_TOKEN_LIFETIME
             
             refresh_tokens_collection = AuthDatabase.get_collection("refresh_tokens")
             
@@ -48,6 +86,9 @@ class SessionManager:
                 "deviceInfo": device_info,
                 "ipAddress": ip_address
             }
+            if username is not None:
+                token_data["username"] = username
+                token_data["rbacRole"] = rbac_role or "USER"
             
             try:
                 await refresh_tokens_collection.insert_one(token_data)
@@ -66,7 +107,7 @@ class SessionManager:
         """Validate refresh token and return user info"""
         try:
             # Check if token is blacklisted
-            if refresh_token in self.blacklisted_tokens:
+            if await self.blacklisted_tokens.is_revoked(refresh_token):
                 return None
             
             refresh_tokens_collection = AuthDatabase.get_collection("refresh_tokens")
@@ -106,11 +147,90 @@ class SessionManager:
             logger.error(f"Error validating refresh token: {error}")
             return None
     
+    async def rotate_refresh_token(self, refresh_token: str, device_info: Optional[str] = None,
+                                   ip_address: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Validate, revoke and reissue a refresh token in one atomic find_one_and_update"""
+        try:
+            if await self.blacklisted_tokens.is_revoked(refresh_token):
+                refresh_rejected.inc()
+                return None
+            
+            refresh_tokens_collection = AuthDatabase.get_collection("refresh_tokens")
+            new_token = secrets.token_urlsafe(64)
+            now = datetime.utcnow()
+            
+            # The session document is rewritten in place: the old token stops matching in the same
+            # operation, so two concurrent refreshes with it cannot both rotate
+            token_record = await refresh_tokens_collection.find_one_and_update(
+                {"token": refresh_token, "isRevoked": False, "expiresAt": {"$gt": now}},
+                {"$set": {
+                    "token": new_token,
+                    "previousToken": refresh_token,
+                    "expiresAt": now + REFRESH_TOKEN_LIFETIME,
+                    "rotatedAt": now,
+                    "deviceInfo": device_info,
+                    "ipAddress": ip_address
+                }},
+                projection={"userId": 1, "username": 1, "rbacRole": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            grace = False
+            
+            if not token_record and REFRESH_GRACE_SECONDS > 0:
+                # Rotated a moment ago by another tab: hand out the successor it already got
+                token_record = await refresh_tokens_collection.find_one(
+                    {
+                        "previousToken": refresh_token,
+                        "isRevoked": False,
+                        "rotatedAt": {"$gt": now - timedelta(seconds=REFRESH_GRACE_SECONDS)},
+                        "expiresAt": {"$gt": now}
+                    },
+                    {"token": 1, "userId": 1, "username": 1, "rbacRole": 1}
+                )
+                if token_record:
+                    new_token = token_record["token"]
+                    grace = True
+            
+            if not token_record:
+                refresh_rejected.inc()
+                return None
+            
+            username = token_record.get("username")
+            rbac_role = token_record.get("rbacRole", "USER")
+            if username is None:
+                # Issued before user fields were embedded: look the user up once and embed them
+                users_collection = AuthDatabase.get_collection("users")
+                user = await users_collection.find_one({"_id": token_record["userId"]}, {"username": 1, "rbac_role": 1})
+                if not user:
+                    await refresh_tokens_collection.delete_one({"_id": token_record["_id"]})
+                    refresh_rejected.inc()
+                    return None
+                username = user["username"]
+                rbac_role = user.get("rbac_role", "USER")
+                await refresh_tokens_collection.update_one(
+                    {"_id": token_record["_id"]},
+                    {"$set": {"username": username, "rbacRole": rbac_role}}
+                )
+            
+            (refresh_reused if grace else refresh_rotated).inc()
+            return {
+                "user_id": str(token_record["userId"]),
+                "username": username,
+                "rbac_role": rbac_role,
+                "token_id": str(token_record["_id"]),
+                "refresh_token": new_token,
+                "grace": grace
+            }
+            
+        except Exception as error:
+            logger.error(f"Error rotating refresh token: {error}")
+            return None
+    
     async def revoke_refresh_token(self, refresh_token: str) -> bool:
         """Revoke a specific refresh token"""
         try:
             # Add to blacklist for immediate effect
-            self.blacklisted_tokens.add(refresh_token)
+            await self.blacklisted_tokens.revoke(refresh_token)
             
             # Mark as revoked in database
             refresh_tokens_collection = AuthDatabase.get_collection("refresh_tokens")
@@ -138,7 +258,8 @@ class SessionManager:
             
             # Add all tokens to blacklist
             for token_record in user_tokens:
-                self.blacklisted_tokens.add(token_record["token"])
+                expires_at = token_record["expiresAt"].replace(tzinfo=timezone.utc).timestamp()
+                await self.blacklisted_tokens.revoke(token_record["token"], expires_at)
             
             # Mark all as revoked in database
             result = await refresh_tokens_collection.update_many(
@@ -152,6 +273,38 @@ class SessionManager:
             logger.error(f"Error revoking user tokens: {error}")
             return False
     
+    async def ensure_indexes(self):
+        """Indexes behind token lookups and per-user revocation (idempotent, call from the lifespan)"""
+        try:
+            refresh_tokens_collection = AuthDatabase.get_collection("refresh_tokens")
+            await refresh_tokens_collection.create_index([("token", ASCENDING)], unique=True)
+            await refresh_tokens_collection.create_index([("userId", ASCENDING), ("isRevoked", ASCENDING)])
+            await refresh_tokens_collection.create_index([("previousToken", ASCENDING)], sparse=True)
+            logger.info("📇 Refresh token indexes ready")
+        except Exception as error:
+            logger.warning(f"⚠️ Could not create refresh token indexes: {error}")
+    
+    async def update_session_user(self, user_id: str, username: Optional[str] = None,
+                                  rbac_role: Optional[str] = None) -> bool:
+        """Update the user fields embedded in a user's sessions (call wherever username or role changes)"""
+        fields = {}
+        if username is not None:
+            fields["username"] = username
+        if rbac_role is not None:
+            fields["rbacRole"] = rbac_role
+        if not fields:
+            return True
+        try:
+            refresh_tokens_collection = AuthDatabase.get_collection("refresh_tokens")
+            await refresh_tokens_collection.update_many(
+                {"userId": ObjectId(user_id), "isRevoked": False},
+                {"$set": fields}
+            )
+            return True
+        except Exception as error:
+            logger.error(f"Error updating sessions of user {user_id}: {error}")
+            return False
+    
     async def cleanup_expired_tokens(self):
         """Clean up expired refresh tokens"""
         try:
@@ -167,13 +320,14 @@ class SessionManager:
         except Exception as error:
             logger.error(f"Error cleaning up expired tokens: {error}")
     
-    def blacklist_access_token(self, access_token: str):
-        """Blacklist an access token (for logout)"""
-        self.blacklisted_tokens.add(access_token)
+    async def blacklist_access_token(self, access_token: str):
+        """Blacklist an access token (for logout) until its exp"""
+        await self.blacklisted_tokens.revoke(access_token)
+        claims_cache.invalidate(access_token)
     
-    def is_access_token_blacklisted(self, access_token: str) -> bool:
+    async def is_access_token_blacklisted(self, access_token: str) -> bool:
         """Check if access token is blacklisted"""
-        return access_token in self.blacklisted_tokens
+        return await self.blacklisted_tokens.is_revoked(access_token)
     
     async def get_user_sessions(self, user_id: str) -> list:
         """Get all active sessions for a user"""
@@ -0,0 +1,445 @@
+import os
+import sys
+import math
+import time
+import heapq
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+import jwt
+
+from .metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Hard cap on revoked tokens kept per worker; the ones closest to expiry are dropped first
+TOKEN_BLACKLIST_MAX_ENTRIES = int(os.getenv("TOKEN_BLACKLIST_MAX_ENTRIES", 100000))
+# Lifetime for revoked tokens without an exp claim (opaque refresh tokens)
+TOKEN_BLACKLIST_DEFAULT_TTL = float(os.getenv("TOKEN_BLACKLIST_DEFAULT_TTL", 600))
+
+# "memory" (per worker) or "redis" (authoritative in Redis, Bloom filter of revocations per worker)
+TOKEN_BLACKLIST_BACKEND = os.getenv("TOKEN_BLACKLIST_BACKEND", "memory").strip().lower()
+TOKEN_BLACKLIST_REDIS_URL = os.getenv("TOKEN_BLACKLIST_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+TOKEN_BLACKLIST_REDIS_PREFIX = os.getenv("TOKEN_BLACKLIST_REDIS_PREFIX", "blacklist")
+# Per-command timeout; a filter hit must not add more than this to a request
+TOKEN_BLACKLIST_REDIS_TIMEOUT = float(os.getenv("TOKEN_BLACKLIST_REDIS_TIMEOUT", 0.1))
+# After a store failure, skip it for this long (and between subscriber reconnects)
+TOKEN_BLACKLIST_REDIS_RETRY_INTERVAL = float(os.getenv("TOKEN_BLACKLIST_REDIS_RETRY_INTERVAL", 5.0))
+# "closed" treats a filter hit as revoked while the store is unreachable, "open" lets it through
+TOKEN_BLACKLIST_FAIL_MODE = os.getenv("TOKEN_BLACKLIST_FAIL_MODE", "closed").strip().lower()
+# Filter sizing: revocations expected within one token lifetime and the target false-positive rate
+TOKEN_BLACKLIST_BLOOM_CAPACITY = int(os.getenv("TOKEN_BLACKLIST_BLOOM_CAPACITY", 100000))
+TOKEN_BLACKLIST_BLOOM_FP_RATE = float(os.getenv("TOKEN_BLACKLIST_BLOOM_FP_RATE", 0.001))
+# The filter is rebuilt from Redis this often, dropping expired revocations
+TOKEN_BLACKLIST_SYNC_INTERVAL = float(os.getenv("TOKEN_BLACKLIST_SYNC_INTERVAL", 60.0))
+
+ENTRY_BYTES = sys.getsizeof(bytes(16)) + sys.getsizeof(0.0)
+HEAP_SLOT_BYTES = sys.getsizeof((0.0, b""))
+
+blacklist_lookups = metrics.counter(
+    "token_blacklist_lookups_total", "Token blacklist lookups", ("result",))
+# Resolved once: lookups run on every authenticated request
+lookup_revoked = blacklist_lookups.labels("revoked")
+lookup_clear = blacklist_lookups.labels("clear")
+lookup_store = blacklist_lookups.labels("store_check")
+
+
+def blacklist_key(token: str) -> bytes:
+    """128-bit sha256 prefix: a quarter of the memory of the raw JWT, same lookup cost"""
+    return hashlib.sha256(token.encode("utf-8")).digest()[:16]
+
+
+def token_expiry(token: str, default_ttl: float = TOKEN_BLACKLIST_DEFAULT_TTL) -> float:
+    """exp claim of a JWT (read without verification), or now + default_ttl for opaque tokens"""
+    try:
+        exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+    except jwt.InvalidTokenError:
+        exp = None
+    return float(exp) if exp is not None else time.time() + default_ttl
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over token digests; probe positions come from the digest by double hashing"""
+
+    def __init__(self, capacity: int = TOKEN_BLACKLIST_BLOOM_CAPACITY, fp_rate: float = TOKEN_BLACKLIST_BLOOM_FP_RATE):
+        self.capacity = max(1, capacity)
+        self.fp_rate = min(max(fp_rate, 1e-9), 0.5)
+        self.size = max(64, math.ceil(-self.capacity * math.log(self.fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.hashes))
+
+    def add(self, digest: bytes):
+        if digest in self:
+            return
+        bits = self.bits
+        for position in self._positions(digest):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, digest: bytes) -> bool:
+        # Inlined probe loop: a miss usually stops at the first or second bit
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:16], "little") | 1
+        size, bits = self.size, self.bits
+        for i in range(self.hashes):
+            position = (h1 + i * h2) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def estimated_fp_rate(self) -> float:
+        return (1 - math.exp(-self.hashes * self.count / self.size)) ** self.hashes
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "items": self.count,
+            "bits": self.size,
+            "hashes": self.hashes,
+            "bytes": len(self.bits),
+            "target_fp_rate": self.fp_rate,
+            "estimated_fp_rate": round(self.estimated_fp_rate(), 6)
+        }
+
+
+class TokenBlacklist:
+    """Revoked tokens by digest until they expire: bounded, swept by an expiry heap, optionally shared through Redis"""
+
+    def __init__(self, max_entries: int = TOKEN_BLACKLIST_MAX_ENTRIES, backend: str = TOKEN_BLACKLIST_BACKEND,
+                 url: str = TOKEN_BLACKLIST_REDIS_URL, prefix: str = TOKEN_BLACKLIST_REDIS_PREFIX,
+                 fail_mode: str = TOKEN_BLACKLIST_FAIL_MODE):
+        if backend not in ("memory", "redis"):
+            logger.warning(f"⚠️ Unknown TOKEN_BLACKLIST_BACKEND '{backend}' - using memory")
+            backend = "memory"
+        self.max_entries = max(1, max_entries)
+        self.backend = backend
+        self.url = url
+        self.prefix = prefix
+        self.channel = f"{prefix}:revoked"
+        self.fail_open = fail_mode == "open"
+        # digest -> expires_at epoch seconds. With redis: revocations made or confirmed by this worker
+        self.entries: Dict[bytes, float] = {}
+        # (expires_at, digest) min-heap; entries replaced by a later expiry are skipped when popped
+        self.expiries: List[Tuple[float, bytes]] = []
+        # With redis: every revocation known to the store, until the next rebuild
+        self.filter: Optional[BloomFilter] = BloomFilter() if self.shared else None
+        # Filter hits the store said are not revoked (false positives): digest -> recheck after (epoch)
+        self.cleared: "OrderedDict[bytes, float]" = OrderedDict()
+        self.last_sync: Optional[float] = None
+        self.sync_seconds = 0.0
+        self.message_lag = 0.0
+        self.client = None
+        self.subscriber = None
+        self.task: Optional[asyncio.Task] = None
+        self.unavailable_until = 0.0
+        self.lookup_ns = 0
+        self.store_ns = 0
+        self.stats = {"revoked": 0, "received": 0, "lookups": 0, "hits": 0, "expired": 0, "evicted": 0,
+                      "store_checks": 0, "false_positives": 0, "syncs": 0, "store_errors": 0,
+                      "failed_open": 0, "failed_closed": 0}
+        metrics.gauge("token_blacklist_entries", "Revoked tokens held by this worker",
+                      callback=lambda: {(): len(self.entries)})
+        metrics.gauge("token_blacklist_memory_bytes", "Approximate memory used by the token blacklist",
+                      callback=lambda: {(): self.memory_bytes()})
+        if self.shared:
+            metrics.gauge("token_blacklist_sync_age_seconds", "Seconds since the revocation filter was rebuilt",
+                          callback=lambda: {(): self.sync_age()} if self.last_sync is not None else {})
+            metrics.gauge("token_blacklist_filter_fp_rate", "Estimated false-positive rate of the revocation filter",
+                          callback=lambda: {(): self.filter.estimated_fp_rate()})
+
+    @property
+    def shared(self) -> bool:
+        return self.backend == "redis"
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return (digest.hex() for digest in list(self.entries))
+
+    def _local(self, digest: bytes, now: float) -> Optional[bool]:
+        """True/False when this worker can answer alone, None when the store has to decide"""
+        if self.expiries and self.expiries[0][0] <= now:
+            self._expire(now)
+        expires_at = self.entries.get(digest)
+        if expires_at is not None and expires_at > now:
+            return True
+        if self.filter is None:
+            return False
+        if self.last_sync is not None and digest not in self.filter:
+            return False
+        cleared_until = self.cleared.get(digest)
+        if cleared_until is not None and cleared_until > now:
+            return False
+        return None
+
+    def might_contain(self, token: str) -> bool:
+        """Local answer only: exact with the memory backend, may be a false positive with redis"""
+        return self._local(blacklist_key(token), time.time()) is not False
+
+    async def is_revoked(self, token: str) -> bool:
+        """Local filter first; only filter hits (or an unsynced filter) cost a store round trip"""
+        started = time.perf_counter_ns()
+        digest = blacklist_key(token)
+        now = time.time()
+        revoked = self._local(digest, now)
+        if revoked is None:
+            lookup_store.inc()
+            revoked = await self._confirm(digest, now)
+            self.store_ns += time.perf_counter_ns() - started
+        self.stats["lookups"] += 1
+        if revoked:
+            self.stats["hits"] += 1
+            lookup_revoked.inc()
+        else:
+            lookup_clear.inc()
+        self.lookup_ns += time.perf_counter_ns() - started
+        return revoked
+
+    async def revoke(self, token: str, expires_at: Optional[float] = None) -> bool:
+        """Blacklist a token until it expires and publish it to the other workers; False if already blacklisted"""
+        digest = blacklist_key(token)
+        if expires_at is None:
+            expires_at = token_expiry(token)
+        if not self._insert(digest, float(expires_at), time.time()):
+            return False
+        self.stats["revoked"] += 1
+        if self.shared:
+            self.filter.add(digest)
+            self.cleared.pop(digest, None)
+            await self._publish(digest, float(expires_at))
+        return True
+
+    def _insert(self, digest: bytes, expires_at: float, now: float) -> bool:
+        if expires_at <= now:
+            return False
+        current = self.entries.get(digest)
+        if current is not None and current >= expires_at:
+            return False
+        self.entries[digest] = expires_at
+        heapq.heappush(self.expiries, (expires_at, digest))
+        self._expire(now)
+        while len(self.entries) > self.max_entries:
+            self._evict_soonest()
+        if len(self.expiries) > 2 * len(self.entries) + 1024:
+            self.expiries = [(expiry, key) for key, expiry in self.entries.items()]
+            heapq.heapify(self.expiries)
+        return True
+
+    def _expire(self, now: float):
+        while self.expiries and self.expiries[0][0] <= now:
+            expires_at, digest = heapq.heappop(self.expiries)
+            if self.entries.get(digest) == expires_at:
+                del self.entries[digest]
+                self.stats["expired"] += 1
+
+    def _evict_soonest(self):
+        while self.expiries:
+            expires_at, digest = heapq.heappop(self.expiries)
+            if self.entries.get(digest) == expires_at:
+                del self.entries[digest]
+                self.stats["evicted"] += 1
+                return
+
+    def clear(self):
+        self.entries.clear()
+        self.expiries.clear()
+        self.cleared.clear()
+
+    def memory_bytes(self) -> int:
+        """Both containers plus a 16-byte digest and a float per entry and a tuple per heap slot, plus the filter"""
+        return (sys.getsizeof(self.entries) + sys.getsizeof(self.expiries)
+                + len(self.entries) * ENTRY_BYTES + len(self.expiries) * HEAP_SLOT_BYTES
+                + (sys.getsizeof(self.cleared) + len(self.cleared) * ENTRY_BYTES if self.cleared else 0)
+                + (len(self.filter.bits) if self.filter is not None else 0))
+
+    def sync_age(self) -> float:
+        return time.time() - self.last_sync if self.last_sync is not None else -1.0
+
+    # Shared backend
+
+    def _connect(self):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(
+            self.url,
+            socket_timeout=TOKEN_BLACKLIST_REDIS_TIMEOUT,
+            socket_connect_timeout=TOKEN_BLACKLIST_REDIS_TIMEOUT,
+            health_check_interval=30
+        )
+        # Blocking reads: the subscriber connection must not inherit the command timeout
+        self.subscriber = redis.from_url(self.url, socket_connect_timeout=TOKEN_BLACKLIST_REDIS_TIMEOUT)
+
+    def _store_failed(self, action: str, error: Exception):
+        self.stats["store_errors"] += 1
+        if time.monotonic() >= self.unavailable_until:
+            logger.error(f"❌ Token blacklist store unavailable while {action} ({type(error).__name__}: {error})")
+        self.unavailable_until = time.monotonic() + TOKEN_BLACKLIST_REDIS_RETRY_INTERVAL
+
+    def _store_down(self, digest: bytes) -> bool:
+        if digest not in self.filter:
+            # Not synced yet: every lookup asks the store, but only real filter hits are in doubt
+            return False
+        if self.fail_open:
+            self.stats["failed_open"] += 1
+            return False
+        self.stats["failed_closed"] += 1
+        return True
+
+    async def _confirm(self, digest: bytes, now: float) -> bool:
+        """Ask the store about a filter hit and remember the answer locally"""
+        self.stats["store_checks"] += 1
+        if time.monotonic() < self.unavailable_until:
+            return self._store_down(digest)
+        try:
+            if self.client is None:
+                self._connect()
+            expires_at = await self.client.get(f"{self.prefix}:{digest.hex()}")
+        except Exception as e:
+            self._store_failed("checking a token", e)
+            return self._store_down(digest)
+
+        if expires_at is not None:
+            self._insert(digest, float(expires_at), now)
+            return True
+        if self.last_sync is not None:
+            self.stats["false_positives"] += 1
+        # Until the next rebuild; a revocation message for the digest clears this early
+        self.cleared[digest] = now + TOKEN_BLACKLIST_SYNC_INTERVAL
+        self.cleared.move_to_end(digest)
+        while len(self.cleared) > self.max_entries:
+            self.cleared.popitem(last=False)
+        return False
+
+    async def _publish(self, digest: bytes, expires_at: float):
+        """Key with the token's own expiry (the authoritative record) plus a message for running workers"""
+        if time.monotonic() < self.unavailable_until:
+            return
+        try:
+            if self.client is None:
+                self._connect()
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(f"{self.prefix}:{digest.hex()}", repr(expires_at), pxat=int(expires_at * 1000))
+                pipe.publish(self.channel, f"{digest.hex()} {expires_at!r} {time.time()!r}")
+                await pipe.execute()
+        except Exception as e:
+            self._store_failed("publishing a revocation (revoked on this worker only)", e)
+
+    def _receive(self, message: str):
+        try:
+            digest_hex, expires_at, published_at = message.split(" ")
+            digest = bytes.fromhex(digest_hex)
+        except ValueError:
+            return
+        self.filter.add(digest)
+        self.cleared.pop(digest, None)
+        self.message_lag = max(0.0, time.time() - float(published_at))
+        self.stats["received"] += 1
+
+    async def _sync(self):
+        """Rebuild the filter from the keys in Redis; expired revocations fall out"""
+        started = time.monotonic()
+        digests = []
+        async for key in self.client.scan_iter(match=f"{self.prefix}:*", count=1000):
+            digest_hex = key.decode().rsplit(":", 1)[-1]
+            if len(digest_hex) == 32:
+                digests.append(bytes.fromhex(digest_hex))
+        rebuilt = BloomFilter(max(TOKEN_BLACKLIST_BLOOM_CAPACITY, 2 * len(digests)))
+        for digest in digests:
+            rebuilt.add(digest)
+        self._expire(time.time())
+        for digest in self.entries:
+            rebuilt.add(digest)
+        self.filter = rebuilt
+        self.cleared.clear()
+        self.last_sync = time.time()
+        self.sync_seconds = time.monotonic() - started
+        self.stats["syncs"] += 1
+
+    async def _listen(self):
+        while True:
+            pubsub = None
+            try:
+                if self.client is None:
+                    self._connect()
+                pubsub = self.subscriber.pubsub()
+                await pubsub.subscribe(self.channel)
+                # Subscribed first, so nothing published during the rebuild is missed
+                await self._sync()
+                next_sync = time.monotonic() + TOKEN_BLACKLIST_SYNC_INTERVAL
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None and message.get("type") == "message":
+                        self._receive(message["data"].decode())
+                    if time.monotonic() >= next_sync:
+                        await self._sync()
+                        next_sync = time.monotonic() + TOKEN_BLACKLIST_SYNC_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["store_errors"] += 1
+                logger.error(f"❌ Token revocation subscriber failed ({type(e).__name__}: {e}) - retrying in {TOKEN_BLACKLIST_REDIS_RETRY_INTERVAL}s")
+                await asyncio.sleep(TOKEN_BLACKLIST_REDIS_RETRY_INTERVAL)
+            finally:
+                if pubsub is not None:
+                    await pubsub.aclose()
+
+    def start(self):
+        """Subscribe to revocations from other workers (call from the service lifespan)"""
+        if not self.shared or (self.task is not None and not self.task.done()):
+            return
+        self.task = asyncio.create_task(self._listen())
+        logger.info(f"🔒 Token blacklist subscribed to {self.url.split('@')[-1]} ({self.channel})")
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+        if self.client is not None:
+            await self.client.aclose()
+            await self.subscriber.aclose()
+            self.client = None
+            self.subscriber = None
+
+    def status(self) -> Dict[str, Any]:
+        lookups = self.stats["lookups"]
+        store_checks = self.stats["store_checks"]
+        shared = {}
+        if self.shared:
+            shared = {
+                "subscribed": self.task is not None and not self.task.done(),
+                "fail_mode": "open" if self.fail_open else "closed",
+                "filter": self.filter.status(),
+                "observed_fp_rate": round(self.stats["false_positives"] / lookups, 6) if lookups else 0.0,
+                "sync_age_seconds": round(self.sync_age(), 3),
+                "last_sync_ms": round(self.sync_seconds * 1000, 3),
+                "message_lag_ms": round(self.message_lag * 1000, 3),
+                "avg_store_check_ms": round(self.store_ns / store_checks / 1e6, 3) if store_checks else 0.0
+            }
+        return {
+            "backend": self.backend,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "memory_bytes": self.memory_bytes(),
+            "avg_lookup_us": round(self.lookup_ns / lookups / 1000, 3) if lookups else 0.0,
+            **shared,
+            **self.stats
+        }
+
+
+# Singleton instance
+token_blacklist = TokenBlacklist()
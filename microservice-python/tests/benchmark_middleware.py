@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark: BaseHTTPMiddleware (app.middleware("http")) vs pure ASGI shared middleware
+
+Runs in-process (no server, no database): each request is driven straight through the
+ASGI app so the numbers show middleware overhead only.
+
+    python tests/benchmark_middleware.py --requests 5000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Audit events are queued and serialized but not written anywhere
+os.environ.setdefault("AUDIT_SINKS", "")
+os.environ.setdefault("RATE_LIMIT_BACKEND", "memory")
+
+from fastapi import FastAPI, Depends
+from fastapi.responses import StreamingResponse
+
+from shared.audit import audit_pipeline
+from shared.middleware import (
+    SecurityMiddleware, AuditMiddleware, RateLimitMiddleware,
+    SecurityASGIMiddleware, AuditASGIMiddleware, RateLimitASGIMiddleware
+)
+
+BENCH_LIMIT = 10 ** 9
+STREAM_CHUNKS = 20
+
+
+def add_routes(app: FastAPI, dependencies=()):
+    @app.get("/json", dependencies=list(dependencies))
+    async def json_endpoint():
+        return {"success": True, "data": {"id": 1, "name": "voucher"}}
+
+    @app.get("/stream", dependencies=list(dependencies))
+    async def stream_endpoint():
+        async def chunks():
+            for _ in range(STREAM_CHUNKS):
+                yield b"x" * 1024
+                await asyncio.sleep(0)
+        return StreamingResponse(chunks(), media_type="application/octet-stream")
+
+
+def build_apps():
+    """Same routes and behaviour, two middleware implementations"""
+    legacy = FastAPI()
+    legacy_limit = RateLimitMiddleware.create_rate_limiter(BENCH_LIMIT, 15, "Rate limit exceeded", "bench-legacy")
+    add_routes(legacy, [Depends(legacy_limit)])
+    legacy.middleware("http")(SecurityMiddleware.add_security_headers)
+    legacy.middleware("http")(AuditMiddleware.audit_logger)
+
+    asgi = FastAPI()
+    add_routes(asgi)
+    asgi.add_middleware(RateLimitASGIMiddleware, max_requests=BENCH_LIMIT, namespace="bench-asgi")
+    asgi.add_middleware(SecurityASGIMiddleware)
+    asgi.add_middleware(AuditASGIMiddleware)
+
+    return {"BaseHTTPMiddleware": legacy, "Pure ASGI": asgi}
+
+
+async def call(app, path: str):
+    """Send one GET through the ASGI app; return (status, seconds to first body byte, seconds total)"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"bench"), (b"user-agent", b"benchmark")],
+        "client": ("127.0.0.1", 50000), "server": ("bench", 80),
+    }
+    start = time.perf_counter()
+    first_byte = None
+    status = None
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        nonlocal first_byte, status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and message.get("body") and first_byte is None:
+            first_byte = time.perf_counter() - start
+
+    await app(scope, receive, send)
+    return status, first_byte, time.perf_counter() - start
+
+
+async def run_case(app, path: str, requests: int):
+    for _ in range(min(200, requests)):
+        await call(app, path)
+    totals, first_bytes = [], []
+    started = time.perf_counter()
+    for _ in range(requests):
+        status, first_byte, total = await call(app, path)
+        assert status == 200, status
+        totals.append(total)
+        first_bytes.append(first_byte)
+    elapsed = time.perf_counter() - started
+    totals.sort()
+    return {
+        "rps": requests / elapsed,
+        "mean_us": statistics.mean(totals) * 1e6,
+        "p99_us": totals[int(len(totals) * 0.99) - 1] * 1e6,
+        "ttfb_us": statistics.mean(first_bytes) * 1e6,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Shared middleware benchmark")
+    parser.add_argument("--requests", type=int, default=3000)
+    args = parser.parse_args()
+
+    audit_pipeline.start("benchmark")
+    apps = build_apps()
+
+    print("🧪 Shared middleware benchmark (security headers + audit + rate limit)")
+    print("=" * 78)
+    print(f"{'Stack':<20} {'Path':<8} {'req/s':>10} {'mean µs':>10} {'p99 µs':>10} {'first byte µs':>15}")
+    results = {}
+    for path in ("/json", "/stream"):
+        for name, app in apps.items():
+            result = results[(name, path)] = await run_case(app, path, args.requests)
+            print(f"{name:<20} {path:<8} {result['rps']:>10.0f} {result['mean_us']:>10.1f} "
+                  f"{result['p99_us']:>10.1f} {result['ttfb_us']:>15.1f}")
+
+    print("-" * 78)
+    for path in ("/json", "/stream"):
+        speedup = results[("Pure ASGI", path)]["rps"] / results[("BaseHTTPMiddleware", path)]["rps"]
+        print(f"📈 {path}: pure ASGI handles {speedup:.2f}x the requests per second")
+
+    await audit_pipeline.stop()
+    print(f"📝 Audit events queued: {audit_pipeline.stats['queued']}, dropped: {audit_pipeline.stats['dropped']}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark: refresh-token rotation, validate + create + revoke vs one atomic find_one_and_update
+
+Needs a MongoDB server; benchmark users and their refresh tokens are created in the given
+database and removed afterwards. Each client refreshes its own session in a chain, always
+with the token the previous refresh returned.
+
+    python tests/benchmark_refresh_rotation.py --db-uri mongodb://localhost:27017/voux_auth_bench --refreshes 2000
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Revocations stay in process memory; only MongoDB round trips are measured
+os.environ.setdefault("TOKEN_BLACKLIST_BACKEND", "memory")
+
+from bson import ObjectId
+from pymongo import monitoring
+
+from shared.database import Database, AuthDatabase
+from shared.session_manager import session_manager
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands sent (every one is a round trip)"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+commands = CommandCounter()
+monitoring.register(commands)
+
+
+async def legacy_refresh(token: str) -> str:
+    """The previous AuthController.refresh_token sequence"""
+    user_data = await session_manager.validate_refresh_token(token)
+    assert user_data, "legacy refresh rejected a valid token"
+    new_token = await session_manager.create_refresh_token(
+        user_data["user_id"], device_info="benchmark", ip_address="127.0.0.1")
+    await session_manager.revoke_refresh_token(token)
+    return new_token
+
+
+async def atomic_refresh(token: str) -> str:
+    user_data = await session_manager.rotate_refresh_token(token, device_info="benchmark", ip_address="127.0.0.1")
+    assert user_data, "atomic refresh rejected a valid token"
+    return user_data["refresh_token"]
+
+
+async def refresh_chain(refresh, token: str, refreshes: int, latencies: list):
+    for _ in range(refreshes):
+        started = time.perf_counter()
+        token = await refresh(token)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run_case(refresh, user_ids: list, refreshes: int, embed: bool):
+    tokens = []
+    for user_id in user_ids:
+        extra = {"username": f"bench-{user_id}", "rbac_role": "USER"} if embed else {}
+        tokens.append(await session_manager.create_refresh_token(user_id, "benchmark", "127.0.0.1", **extra))
+
+    per_client = max(1, refreshes // len(user_ids))
+    latencies = []
+    commands_before = commands.count
+    started = time.perf_counter()
+    await asyncio.gather(*(refresh_chain(refresh, token, per_client, latencies) for token in tokens))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "rps": len(latencies) / elapsed,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p99_ms": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000,
+        "round_trips": (commands.count - commands_before) / len(latencies),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Refresh-token rotation benchmark")
+    parser.add_argument("--db-uri", default=os.getenv("AUTH_DB_URI", "mongodb://localhost:27017/voux_auth_bench"))
+    parser.add_argument("--refreshes", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=1, help="Clients refreshing at the same time")
+    args = parser.parse_args()
+
+    if not await Database.connect_to_mongo("auth", args.db_uri):
+        print(f"❌ Could not connect to {args.db_uri}")
+        return
+    await session_manager.ensure_indexes()
+    users = AuthDatabase.get_collection("users")
+    refresh_tokens = AuthDatabase.get_collection("refresh_tokens")
+
+    user_ids = [ObjectId() for _ in range(args.concurrency)]
+    await users.insert_many([{"_id": user_id, "username": f"bench-{user_id}", "rbac_role": "USER"}
+                             for user_id in user_ids])
+    user_ids = [str(user_id) for user_id in user_ids]
+
+    print(f"🧪 Refresh-token rotation benchmark ({args.refreshes} refreshes, {args.concurrency} concurrent)")
+    print("=" * 72)
+    print(f"{'Path':<28} {'refresh/s':>10} {'mean ms':>10} {'p99 ms':>10} {'round trips':>12}")
+    results = {}
+    try:
+        cases = (
+            ("validate + create + revoke", legacy_refresh, False),
+            ("find_one_and_update", atomic_refresh, True),
+        )
+        for name, refresh, embed in cases:
+            result = results[name] = await run_case(refresh, user_ids, args.refreshes, embed)
+            print(f"{name:<28} {result['rps']:>10.0f} {result['mean_ms']:>10.2f} "
+                  f"{result['p99_ms']:>10.2f} {result['round_trips']:>12.1f}")
+    finally:
+        object_ids = [ObjectId(user_id) for user_id in user_ids]
+        await refresh_tokens.delete_many({"userId": {"$in": object_ids}})
+        await users.delete_many({"_id": {"$in": object_ids}})
+        await Database.close_mongo_connection()
+
+    print("-" * 72)
+    speedup = results["find_one_and_update"]["rps"] / results["validate + create + revoke"]["rps"]
+    print(f"📈 Atomic rotation handles {speedup:.2f}x the refreshes per second")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -45,7 +45,7 @@ def debug_token_validation():
     
     # Check 1: Token blacklist
     print("1️⃣ Kiểm tra blacklist...")
-    is_blacklisted = session_manager.is_access_token_blacklisted(token)
+    is_blacklisted = asyncio.run(session_manager.is_access_token_blacklisted(token))
     if is_blacklisted:
         print("❌ Token đã bị blacklist (đã logout)")
         return
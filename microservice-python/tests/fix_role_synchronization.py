@@ -3,6 +3,7 @@ import os
 from dotenv import load_dotenv
 from shared.database import Database, AuthDatabase
 from shared.rbac import Role, RBACManager
+from shared.session_manager import session_manager
 import logging
 
 # Load environment variables
@@ -164,6 +165,8 @@ async def standardize_role_storage():
                 
                 if result.modified_count > 0:
                     updates_made += 1
+                    # Active sessions carry the role too; refreshes must not keep issuing the old one
+                    await session_manager.update_session_user(str(user_id), rbac_role=current_role)
                     print(f"  ✅ Updated {username}: role={current_role}, roles=[{standardized_role}], admin={update_data['admin']}")
                 else:
                     print(f"  ❌ Failed to update {username}")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Redis rate-limit backend against a local Redis-compatible stand-in (fakeredis with Lua)
+
+Checks that separate backend instances (= separate workers / nodes) share one counter,
+that requests are rejected after max_requests, and both RATE_LIMIT_FAIL_MODE settings
+against an unreachable store. No Redis server needed.
+
+Usage:
+    pip install "fakeredis[lua]"
+    python tests/test_rate_limiter_redis.py      # or: pytest tests/test_rate_limiter_redis.py
+"""
+
+import os
+import sys
+import uuid
+import asyncio
+
+import pytest
+import fakeredis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.rate_limiter import RedisRateLimitBackend, RateLimitUnavailable, SLIDING_WINDOW_SCRIPT
+
+pytestmark = pytest.mark.asyncio
+
+# Long enough that no window boundary is crossed while a test runs
+WINDOW_SECONDS = 60
+UNREACHABLE_URL = "redis://127.0.0.1:1/0"
+
+
+class StandInRedisBackend(RedisRateLimitBackend):
+    """Real backend code, connected to an in-process fakeredis server instead of a socket"""
+
+    def __init__(self, server: fakeredis.FakeServer, **kwargs):
+        super().__init__(url="redis://stand-in/0", **kwargs)
+        self.server = server
+
+    def _connect(self):
+        self.client = fakeredis.aioredis.FakeRedis(server=self.server)
+        self.script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+
+
+def namespace() -> str:
+    return f"test-{uuid.uuid4().hex[:8]}"
+
+
+async def test_instances_share_one_counter():
+    """Hits from two backends (two workers) land on the same counter"""
+    server = fakeredis.FakeServer()
+    first, second = StandInRedisBackend(server), StandInRedisBackend(server)
+    ns = namespace()
+
+    allowed, remaining, _ = await first.hit(ns, "10.0.0.1", 10, WINDOW_SECONDS)
+    assert allowed and remaining == 9
+    allowed, remaining, _ = await second.hit(ns, "10.0.0.1", 10, WINDOW_SECONDS)
+    assert allowed and remaining == 8
+    allowed, remaining, _ = await first.hit(ns, "10.0.0.1", 10, WINDOW_SECONDS)
+    assert allowed and remaining == 7
+
+    # Other keys have their own counter
+    allowed, remaining, _ = await second.hit(ns, "10.0.0.2", 10, WINDOW_SECONDS)
+    assert allowed and remaining == 9
+
+    await first.close()
+    await second.close()
+
+
+async def test_rejects_after_max_requests():
+    """The limit holds across instances and rejections carry a Retry-After"""
+    server = fakeredis.FakeServer()
+    backends = [StandInRedisBackend(server), StandInRedisBackend(server)]
+    ns = namespace()
+    max_requests = 5
+
+    for i in range(max_requests):
+        allowed, _, _ = await backends[i % 2].hit(ns, "10.0.0.1", max_requests, WINDOW_SECONDS)
+        assert allowed, f"request {i + 1} of {max_requests} was rejected"
+
+    for backend in backends:
+        allowed, remaining, retry_after = await backend.hit(ns, "10.0.0.1", max_requests, WINDOW_SECONDS)
+        assert not allowed and remaining == 0
+        assert 1 <= retry_after <= WINDOW_SECONDS
+
+    assert sum(b.stats["allowed"] for b in backends) == max_requests
+    assert sum(b.stats["limited"] for b in backends) == 2
+    for backend in backends:
+        await backend.close()
+
+
+async def test_unreachable_store_fails_open():
+    backend = RedisRateLimitBackend(url=UNREACHABLE_URL, fail_mode="open")
+
+    allowed, remaining, retry_after = await backend.hit(namespace(), "10.0.0.1", 3, WINDOW_SECONDS)
+    assert allowed and remaining == 3 and retry_after == 0
+    # The store is skipped for the retry interval instead of timing out on every request
+    allowed, _, _ = await backend.hit(namespace(), "10.0.0.1", 3, WINDOW_SECONDS)
+    assert allowed
+
+    assert backend.stats["store_errors"] == 1
+    assert backend.stats["failed_open"] == 2
+    assert not backend.status()["available"]
+    await backend.close()
+
+
+async def test_unreachable_store_fails_closed():
+    backend = RedisRateLimitBackend(url=UNREACHABLE_URL, fail_mode="closed")
+
+    for _ in range(2):
+        with pytest.raises(RateLimitUnavailable):
+            await backend.hit(namespace(), "10.0.0.1", 3, WINDOW_SECONDS)
+
+    assert backend.stats["store_errors"] == 1
+    assert backend.stats["failed_closed"] == 2
+    assert backend.status()["fail_mode"] == "closed"
+    await backend.close()
+
+
+async def main():
+    print("🧪 Redis rate-limit backend (fakeredis stand-in)")
+    print("=" * 50)
+    failed = 0
+    for test in (test_instances_share_one_counter, test_rejects_after_max_requests,
+                 test_unreachable_store_fails_open, test_unreachable_store_fails_closed):
+        try:
+            await test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {type(e).__name__}: {e}")
+    print("=" * 50)
+    print("🎉 All checks passed" if not failed else f"❌ {failed} check(s) failed")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
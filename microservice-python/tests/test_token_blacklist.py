@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Token blacklist (memory and Redis backends) against a local Redis-compatible stand-in (fakeredis)
+
+A false negative here means a revoked token is accepted, so these checks cover every path that
+can answer "not revoked": the local entries, the Bloom filter, the store check behind a filter
+hit, revocations arriving from other workers, the periodic rebuild and the fail modes.
+
+Usage:
+    pip install "fakeredis[lua]"
+    python tests/test_token_blacklist.py      # or: pytest tests/test_token_blacklist.py
+"""
+
+import os
+import sys
+import time
+import uuid
+import asyncio
+
+import pytest
+import fakeredis
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.token_blacklist import TokenBlacklist, blacklist_key
+
+pytestmark = pytest.mark.asyncio
+
+UNREACHABLE_URL = "redis://127.0.0.1:1/0"
+
+
+class StandInTokenBlacklist(TokenBlacklist):
+    """Real blacklist code, connected to an in-process fakeredis server instead of a socket"""
+
+    def __init__(self, server: fakeredis.FakeServer, prefix: str, **kwargs):
+        super().__init__(backend="redis", url="redis://stand-in/0", prefix=prefix, **kwargs)
+        self.server = server
+
+    def _connect(self):
+        self.client = fakeredis.aioredis.FakeRedis(server=self.server)
+        self.subscriber = fakeredis.aioredis.FakeRedis(server=self.server)
+
+
+def new_token() -> str:
+    return f"token-{uuid.uuid4().hex}"
+
+
+def shared_pair():
+    """Two workers of one service sharing a store"""
+    server = fakeredis.FakeServer()
+    prefix = f"test-{uuid.uuid4().hex[:8]}"
+    return StandInTokenBlacklist(server, prefix), StandInTokenBlacklist(server, prefix)
+
+
+async def wait_for(condition, timeout: float = 3.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.02)
+
+
+async def test_revoke_then_lookup():
+    """Revoked until expiry on the worker that revoked, in both backends"""
+    memory = TokenBlacklist(backend="memory")
+    worker, _ = shared_pair()
+    for blacklist in (memory, worker):
+        token, other = new_token(), new_token()
+        expires_at = time.time() + 60
+        assert await blacklist.revoke(token, expires_at)
+        assert not await blacklist.revoke(token, expires_at), "second revoke is a no-op"
+        assert await blacklist.is_revoked(token)
+        assert not await blacklist.is_revoked(other)
+
+        short_lived = new_token()
+        await blacklist.revoke(short_lived, time.time() + 0.2)
+        assert await blacklist.is_revoked(short_lived)
+        await asyncio.sleep(0.3)
+        assert not await blacklist.is_revoked(short_lived)
+        assert blacklist_key(short_lived).hex() not in list(blacklist)
+        assert blacklist.stats["expired"] >= 1
+    await worker.stop()
+
+
+async def test_filter_miss_skips_store():
+    """Once synced, tokens that were never revoked are answered locally"""
+    worker, other = shared_pair()
+    revoked = new_token()
+    await other.revoke(revoked, time.time() + 60)
+    worker._connect()
+    await worker._sync()
+
+    for _ in range(200):
+        assert not await worker.is_revoked(new_token())
+    assert worker.stats["store_checks"] <= 1, "at most a rare false positive goes to the store"
+
+    # The other worker's revocation is in the filter and confirmed by the store
+    assert await worker.is_revoked(revoked)
+    await worker.stop()
+    await other.stop()
+
+
+async def test_false_positive_is_cleared():
+    """A filter hit the store denies is cached as clear, until a real revocation arrives"""
+    worker, other = shared_pair()
+    worker._connect()
+    await worker._sync()
+    token = new_token()
+    # Same bits as a colliding revocation
+    worker.filter.add(blacklist_key(token))
+
+    assert not await worker.is_revoked(token)
+    assert worker.stats["store_checks"] == 1
+    assert worker.stats["false_positives"] == 1
+    assert not await worker.is_revoked(token)
+    assert worker.stats["store_checks"] == 1, "cleared digests do not go back to the store"
+
+    # Revoked for real afterwards (message from another worker): the clear entry must not hide it
+    await other.revoke(token, time.time() + 60)
+    worker._receive(f"{blacklist_key(token).hex()} {time.time() + 60!r} {time.time()!r}")
+    assert await worker.is_revoked(token)
+    await worker.stop()
+    await other.stop()
+
+
+async def test_revocation_reaches_other_worker():
+    """Pub/sub carries a revocation to a running worker that had never seen the token"""
+    first, second = shared_pair()
+    first.start()
+    second.start()
+    await wait_for(lambda: first.last_sync is not None and second.last_sync is not None)
+
+    token = new_token()
+    assert not await second.is_revoked(token)
+    await first.revoke(token, time.time() + 60)
+    await wait_for(lambda: second.stats["received"] >= 1)
+
+    assert second.might_contain(token)
+    assert await second.is_revoked(token)
+    await first.stop()
+    await second.stop()
+
+
+async def test_rebuild_drops_expired_revocations():
+    """The periodic rebuild empties the filter of revocations whose keys expired in Redis"""
+    worker, other = shared_pair()
+    token = new_token()
+    await other.revoke(token, time.time() + 0.5)
+    worker._connect()
+    await worker._sync()
+    assert blacklist_key(token) in worker.filter
+    assert await worker.is_revoked(token)
+
+    await asyncio.sleep(0.7)
+    await worker._sync()
+    assert blacklist_key(token) not in worker.filter
+    checks = worker.stats["store_checks"]
+    assert not await worker.is_revoked(token)
+    assert worker.stats["store_checks"] == checks, "answered from the rebuilt filter"
+    await worker.stop()
+    await other.stop()
+
+
+async def test_unreachable_store_fail_modes():
+    """Filter hits are revoked (closed) or let through (open); filter misses are never in doubt"""
+    for fail_mode, expected in (("closed", True), ("open", False)):
+        blacklist = TokenBlacklist(backend="redis", url=UNREACHABLE_URL, prefix=f"test-{fail_mode}",
+                                   fail_mode=fail_mode)
+        in_doubt, never_revoked = new_token(), new_token()
+        # Learned from a revocation message before the store went away
+        blacklist.filter.add(blacklist_key(in_doubt))
+
+        assert await blacklist.is_revoked(in_doubt) is expected
+        assert await blacklist.is_revoked(in_doubt) is expected, "still answered while the store is skipped"
+        assert not await blacklist.is_revoked(never_revoked)
+        assert blacklist.stats[f"failed_{fail_mode}"] == 2
+        assert blacklist.stats["store_errors"] == 1
+
+        # A revocation made on this worker holds whatever the store does
+        local = new_token()
+        await blacklist.revoke(local, time.time() + 60)
+        assert await blacklist.is_revoked(local)
+        await blacklist.stop()
+
+
+async def main():
+    print("🧪 Token blacklist (fakeredis stand-in)")
+    print("=" * 50)
+    failed = 0
+    for test in (test_revoke_then_lookup, test_filter_miss_skips_store, test_false_positive_is_cleared,
+                 test_revocation_reaches_other_worker, test_rebuild_drops_expired_revocations,
+                 test_unreachable_store_fail_modes):
+        try:
+            await test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {type(e).__name__}: {e}")
+    print("=" * 50)
+    print("🎉 All checks passed" if not failed else f"❌ {failed} check(s) failed")
+    return failed
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(main()) else 0)
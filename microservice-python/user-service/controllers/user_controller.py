@@ -11,6 +11,7 @@ try:
     from shared.models.user import User, UserUpdate, UserResponse
     # Secure DB middleware imports removed
     from shared.rbac import RBACManager, Permission, Role
+    from shared.event_manager import event_manager
     
     logging.info("✅ Successfully imported shared modules in user_controller")
 except Exception as e:
@@ -344,6 +345,15 @@ class UserController:
                     }
                 )
             
+            # Auth Service revokes the user's refresh tokens on this event (awaited: sessions must not outlive the user)
+            published = await event_manager.publish_event(
+                "user.deleted",
+                {"user_id": user_id, "username": user["username"], "deleted_at": datetime.utcnow().isoformat()},
+                source_service="user-service"
+            )
+            if not published:
+                logger.error(f"❌ user.deleted not published for {user_id} - revoke their sessions in Auth Service manually")
+            
             return {
                 "success": True,
                 "message": f"Đã xóa người dùng {user['username']} thành công!"
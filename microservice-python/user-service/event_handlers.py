@@ -89,6 +89,10 @@ class UserEventHandler:
         """Route events to appropriate handlers"""
         event_type = message_body.get("event_type")
         
+        if message_body.get("source_service") == "user-service":
+            # Our own event (e.g. user.deleted for Auth Service) - nothing to sync
+            return
+        
         if event_type == "user.registered":
             await self.handle_user_registered(message_body)
         else:
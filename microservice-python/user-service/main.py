@@ -23,7 +23,11 @@ try:
     from controllers.user_controller import user_controller
     from routes.user_routes import router as user_router
     from shared.database import UserDatabase
-    from shared.middleware import SecurityMiddleware, AuditMiddleware
+    from shared.middleware import SecurityASGIMiddleware, AuditASGIMiddleware
+    from shared.metrics import metrics
+    from shared.audit import audit_pipeline
+    from shared.token_blacklist import token_blacklist
+    from shared.rate_limiter import rate_limit_backend
     from event_handlers import start_event_consumer
     
     logger.info("✅ Successfully imported modules")
@@ -52,12 +56,19 @@ async def lifespan(app: FastAPI):
         logger.warning(f"⚠️ Event consumer failed to start: {e}")
         logger.info("🚀 User Service will continue without event processing")
     
+    metrics.start_loop_monitor()
+    audit_pipeline.start("user")
+    token_blacklist.start()
     logger.info("✅ User Service started successfully")
     
     yield
     
     # Shutdown
     logger.info("🛑 Shutting down User Service...")
+    await metrics.stop_loop_monitor()
+    await audit_pipeline.stop()
+    await token_blacklist.stop()
+    await rate_limit_backend.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -82,8 +93,11 @@ app.add_middleware(
 )
 
 # Security middleware
-app.middleware("http")(SecurityMiddleware.add_security_headers)
-app.middleware("http")(AuditMiddleware.audit_logger)
+app.add_middleware(SecurityASGIMiddleware)
+app.add_middleware(AuditASGIMiddleware)
+
+# Prometheus metrics (/metrics)
+metrics.setup(app, "user")
 
 # Include routers
 app.include_router(user_router, prefix="/api/users", tags=["users"])
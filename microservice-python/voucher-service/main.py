@@ -23,7 +23,11 @@ try:
     from controllers.voucher_controller import voucher_controller
     from routes.voucher_routes import router as voucher_router
     from shared.database import VoucherDatabase
-    from shared.middleware import SecurityMiddleware, AuditMiddleware
+    from shared.middleware import SecurityASGIMiddleware, AuditASGIMiddleware
+    from shared.metrics import metrics
+    from shared.audit import audit_pipeline
+    from shared.token_blacklist import token_blacklist
+    from shared.rate_limiter import rate_limit_backend
     
     logger.info("✅ Successfully imported modules")
 except Exception as e:
@@ -42,12 +46,19 @@ async def lifespan(app: FastAPI):
         logger.error("❌ Failed to connect to database")
         raise Exception("Database connection failed")
     
+    metrics.start_loop_monitor()
+    audit_pipeline.start("voucher")
+    token_blacklist.start()
     logger.info("✅ Voucher Service started successfully")
     
     yield
     
     # Shutdown
     logger.info("🛑 Shutting down Voucher Service...")
+    await metrics.stop_loop_monitor()
+    await audit_pipeline.stop()
+    await token_blacklist.stop()
+    await rate_limit_backend.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -72,8 +83,11 @@ app.add_middleware(
 )
 
 # Security middleware
-app.middleware("http")(SecurityMiddleware.add_security_headers)
-app.middleware("http")(AuditMiddleware.audit_logger)
+app.add_middleware(SecurityASGIMiddleware)
+app.add_middleware(AuditASGIMiddleware)
+
+# Prometheus metrics (/metrics)
+metrics.setup(app, "voucher")
 
 # Include routers
 app.include_router(voucher_router, prefix="/api/vouchers", tags=["vouchers"])